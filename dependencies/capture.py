@@ -0,0 +1,140 @@
+import threading
+
+import cv2
+import mss
+import numpy as np
+
+# ─── Capture regions ─────────────────────────────────────────────────────────
+#
+# Regions use mss's dict form: {"left", "top", "width", "height"} in virtual
+# desktop coordinates, which are also the coordinates pyautogui injects into.
+# Monitor 0 is the whole virtual desktop, 1..N are the individual monitors.
+#
+# `display` picks the X display to capture (":1"); None is the default one
+# ($DISPLAY, or the only desktop on other platforms).
+
+DEFAULT_MONITOR = 1
+
+# Called with the display instead of mss.mss when set; remote_machine
+# --synthetic points it at synthetic.SyntheticScreen
+screen_source = None
+
+
+def open_mss(display=None):
+    if screen_source is not None:
+        return screen_source(display)
+    return mss.mss(display=display) if display else mss.mss()
+
+
+def list_monitors(display=None):
+    with open_mss(display) as sct:
+        return [dict(m) for m in sct.monitors]
+
+
+def capture_region(monitors, index=DEFAULT_MONITOR, roi=None):
+    """The region to grab for monitor `index`, optionally narrowed to `roi`
+    (x, y, width, height relative to that monitor, clipped to it)."""
+    if not 0 <= index < len(monitors):
+        raise ValueError(f"no monitor {index} (have 0-{len(monitors) - 1})")
+    mon = monitors[index]
+    if roi is None:
+        return {k: mon[k] for k in ("left", "top", "width", "height")}
+    x, y, w, h = roi
+    x = min(max(0, x), mon["width"] - 1)
+    y = min(max(0, y), mon["height"] - 1)
+    w = max(1, min(w, mon["width"] - x))
+    h = max(1, min(h, mon["height"] - y))
+    return {"left": mon["left"] + x, "top": mon["top"] + y, "width": w, "height": h}
+
+
+class FramePool:
+    """Output buffers for captured frames, reused once given back.
+
+    A frame stays in use for a while after capture (as the encoder's
+    previous frame, in mailboxes, as a session's resume point), so the pool
+    never decides that by itself: whoever owns a frame returns its buffer
+    with release() once nothing uses it any more. Buffers that are never
+    released are simply left to the garbage collector.
+    """
+
+    LIMIT = 8   # free buffers kept per frame shape
+
+    def __init__(self):
+        self._free = {}        # shape -> buffers released and not handed out since
+        self._lock = threading.Lock()   # release() can come from any thread
+        self._scratch = None   # downscaled BGRA, only used inside to_bgr
+
+    def get(self, shape):
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                return free.pop()
+        return np.empty(shape, np.uint8)
+
+    def release(self, buf):
+        with self._lock:
+            free = self._free.setdefault(buf.shape, [])
+            if len(free) < self.LIMIT and not any(b is buf for b in free):
+                free.append(buf)
+
+    def scratch(self, shape):
+        if self._scratch is None or self._scratch.shape != shape:
+            self._scratch = np.empty(shape, np.uint8)
+        return self._scratch
+
+
+def to_bgr(bgra, size=None, pool=None):
+    """Drop the alpha channel of a BGRA frame, downscaling it to `size`
+    (width, height) first if given, into a buffer from `pool`.
+
+    The full-size frame is read once, by whichever of resize or colour
+    conversion comes first; the other one runs on the small image.
+    """
+    h, w = bgra.shape[:2]
+    width, height = size or (w, h)
+    out = pool.get((height, width, 3)) if pool else np.empty((height, width, 3), np.uint8)
+    if (width, height) != (w, h):
+        small = pool.scratch((height, width, 4)) if pool else None
+        bgra = cv2.resize(bgra, (width, height), dst=small, interpolation=cv2.INTER_AREA)
+    cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+    return out
+
+
+class ScreenGrabber:
+    """Grabs regions of one display as BGR frames.
+
+    mss's BGRA buffer is wrapped in place rather than copied into an array,
+    and converted straight into a pooled output buffer.
+    """
+
+    def __init__(self, display=None):
+        self._sct = open_mss(display)
+        self._pool = FramePool()
+
+    def grab(self, region, fit=None):
+        """Capture `region`; `fit(width, height)` gives the size to scale to."""
+        shot = self._sct.grab(region)
+        bgra = np.frombuffer(shot.raw, np.uint8).reshape(shot.height, shot.width, 4)
+        return to_bgr(bgra, fit(shot.width, shot.height) if fit else None, self._pool)
+
+    def release(self, img):
+        """Give back a frame from grab() once nothing uses it any more."""
+        self._pool.release(img)
+
+    def close(self):
+        self._sct.close()
+
+
+def region_key(region):
+    return (region["left"], region["top"], region["width"], region["height"])
+
+
+def parse_roi(text):
+    """Parse "x,y,w,h" (as used in query strings) into a tuple, or None."""
+    if not text:
+        return None
+    try:
+        x, y, w, h = (int(v) for v in text.split(","))
+    except ValueError:
+        raise ValueError(f"bad region {text!r}, expected x,y,width,height")
+    return x, y, w, h
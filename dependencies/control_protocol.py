@@ -0,0 +1,128 @@
+import struct
+
+# ─── Binary control protocol ─────────────────────────────────────────────────
+#
+# A binary control message is a batch of fixed-size records:
+#
+#   type (u8), flags (u8), a (i32), b (i32)
+#
+#   mouse_move      a=x, b=y
+#   mouse_click     flags=button | DOWN
+#   mouse_dblclick  flags=button | HAS_POS, a=x, b=y
+#   mouse_scroll    a=clicks (positive is up)
+#   key             flags=DOWN, a=key code
+#
+# Key codes are the Unicode code point for single characters and
+# NAMED_KEY_BASE + index for entries of NAMED_KEYS. Records with an unknown
+# button or key code are dropped. Text messages are still parsed as one JSON
+# event, which is what older viewers send.
+
+RECORD = struct.Struct("<BBii")
+
+MOUSE_MOVE, MOUSE_CLICK, MOUSE_DBLCLICK, MOUSE_SCROLL, KEY = range(1, 6)
+
+DOWN    = 0x80
+HAS_POS = 0x40
+
+BUTTONS = ["left", "right", "middle"]
+
+NAMED_KEYS = [
+    "space", "enter", "backspace", "tab", "escape", "up", "down", "left",
+    "right", "control", "alt", "shift", "win", "delete", "home", "end",
+    "pageup", "pagedown",
+] + [f"f{i}" for i in range(1, 25)]
+NAMED_KEY_BASE = 0x200000   # above the Unicode range
+_KEY_CODES = {name: NAMED_KEY_BASE + i for i, name in enumerate(NAMED_KEYS)}
+
+# Event types that have a binary record; anything else goes as JSON
+BINARY_TYPES = {"mouse_move", "mouse_click", "mouse_dblclick", "mouse_scroll", "key"}
+
+
+def _key_code(key):
+    code = _KEY_CODES.get(key)
+    if code is None and len(key) == 1:
+        code = ord(key)
+    return code
+
+
+def _key_name(code):
+    if NAMED_KEY_BASE <= code < NAMED_KEY_BASE + len(NAMED_KEYS):
+        return NAMED_KEYS[code - NAMED_KEY_BASE]
+    if 0 <= code < 0x110000:
+        return chr(code)
+    return None
+
+
+def _button(flags):
+    button = flags & 0x3f
+    return BUTTONS[button] if button < len(BUTTONS) else None
+
+
+def encode_event(ev):
+    """Pack one event dict into a record, or None if it has no binary form."""
+    et = ev["type"]
+    if et == "mouse_move":
+        return RECORD.pack(MOUSE_MOVE, 0, ev["x"], ev["y"])
+    if et == "mouse_click":
+        flags = BUTTONS.index(ev["button"]) | (DOWN if ev["action"] == "down" else 0)
+        return RECORD.pack(MOUSE_CLICK, flags, 0, 0)
+    if et == "mouse_dblclick":
+        flags = BUTTONS.index(ev["button"])
+        x, y = ev.get("x"), ev.get("y")
+        if x is not None and y is not None:
+            return RECORD.pack(MOUSE_DBLCLICK, flags | HAS_POS, x, y)
+        return RECORD.pack(MOUSE_DBLCLICK, flags, 0, 0)
+    if et == "mouse_scroll":
+        return RECORD.pack(MOUSE_SCROLL, 0, 1 if ev["direction"] == "up" else -1, 0)
+    if et == "key":
+        code = _key_code(ev["key"])
+        if code is None:
+            return None
+        return RECORD.pack(KEY, DOWN if ev["action"] == "down" else 0, code, 0)
+    return None
+
+
+def _decode_record(kind, flags, a, b):
+    """The event dict for one record, or None if its fields are invalid."""
+    if kind == MOUSE_MOVE:
+        return {"type": "mouse_move", "x": a, "y": b}
+    if kind == MOUSE_CLICK:
+        button = _button(flags)
+        if button is None:
+            return None
+        return {"type": "mouse_click", "button": button,
+                "action": "down" if flags & DOWN else "up"}
+    if kind == MOUSE_DBLCLICK:
+        button = _button(flags)
+        if button is None:
+            return None
+        ev = {"type": "mouse_dblclick", "button": button}
+        if flags & HAS_POS:
+            ev["x"], ev["y"] = a, b
+        return ev
+    if kind == MOUSE_SCROLL:
+        return {"type": "mouse_scroll", "direction": "up" if a > 0 else "down"}
+    if kind == KEY:
+        key = _key_name(a)
+        if key is None:
+            return None
+        return {"type": "key", "key": key, "action": "down" if flags & DOWN else "up"}
+    return {"type": f"unknown:{kind}"}
+
+
+def decode_batch(data):
+    """Unpack a binary control message into event dicts, leaving out
+    invalid records."""
+    usable = len(data) - len(data) % RECORD.size
+    events = (_decode_record(*rec) for rec in RECORD.iter_unpack(data[:usable]))
+    return [ev for ev in events if ev is not None]
+
+
+def coalesce_into(batch, record):
+    """Append `record` to a pending batch (a list of records), replacing a
+    trailing mouse_move with a newer one so drags send only the latest
+    position."""
+    if record[0] == MOUSE_MOVE and batch and batch[-1][0] == MOUSE_MOVE:
+        batch[-1] = record
+    else:
+        batch.append(record)
@@ -0,0 +1,161 @@
+import asyncio
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import cv2
+import numpy as np
+
+from dependencies.capture import open_mss
+
+# ─── Cursor channel ──────────────────────────────────────────────────────────
+#
+# The pointer is not part of the captured frames; its position and shape go
+# to viewers as separate, tiny messages on the video socket so they can draw
+# it themselves. Pointer-only motion then costs a dozen bytes instead of a
+# re-encoded frame, and the viewer can move its copy as soon as the local
+# mouse moves.
+#
+#   "CP" x (i32) y (i32)                       pointer position, desktop coords
+#   "CS" hot_x (u16) hot_y (u16) PNG (BGRA)    pointer shape, when it changes
+#
+# Shapes are read through mss's XFixes support, which only exists on Linux;
+# elsewhere only positions are sent and viewers draw a default arrow.
+
+CURSOR_MAGIC  = b"CP"
+CURSOR_HEADER = struct.Struct("<2sii")
+SHAPE_MAGIC   = b"CS"
+SHAPE_HEADER  = struct.Struct("<2sHH")
+
+CURSOR_HZ      = 60     # position polls per second while anyone watches
+SHAPE_INTERVAL = 0.1    # seconds between shape checks
+
+
+def is_cursor(data):
+    return data[:2] in (CURSOR_MAGIC, SHAPE_MAGIC)
+
+
+def pack_position(x, y):
+    return CURSOR_HEADER.pack(CURSOR_MAGIC, x, y)
+
+
+def pack_shape(image, hot_x, hot_y):
+    ok, png = cv2.imencode(".png", image)
+    if not ok:
+        raise ValueError("cursor shape encode failed")
+    return SHAPE_HEADER.pack(SHAPE_MAGIC, hot_x, hot_y) + png.tobytes()
+
+
+def unpack_cursor(data):
+    """("position", (x, y)) or ("shape", (BGRA image, hot_x, hot_y))."""
+    if data[:2] == CURSOR_MAGIC:
+        _, x, y = CURSOR_HEADER.unpack_from(data, 0)
+        return "position", (x, y)
+    _, hot_x, hot_y = SHAPE_HEADER.unpack_from(data, 0)
+    img = cv2.imdecode(np.frombuffer(data, np.uint8, offset=SHAPE_HEADER.size), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError("bad cursor shape")
+    if img.ndim == 2 or img.shape[2] == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA if img.ndim == 2 else cv2.COLOR_BGR2BGRA)
+    return "shape", (img, hot_x, hot_y)
+
+
+def default_shape():
+    """A plain arrow, for when the remote doesn't provide its shape."""
+    img = np.zeros((19, 12, 4), np.uint8)
+    arrow = np.array([[0, 0], [0, 16], [4, 12], [7, 18], [9, 17], [6, 11], [11, 11]], np.int32)
+    cv2.fillPoly(img, [arrow], (255, 255, 255, 255))
+    cv2.polylines(img, [arrow], True, (0, 0, 0, 255), 1)
+    return img, 0, 0
+
+
+class CursorTracker:
+    """Polls the pointer on its own thread and hands changes to subscribers.
+
+    Like the capture pipelines it only runs while someone is subscribed.
+    Subscribers get a mailbox (anything with put/get, e.g. LatestFrame) that
+    is poked on every change; position and shape hold the latest state, so
+    a slow viewer simply skips intermediate positions.
+    """
+
+    def __init__(self, position, hz=CURSOR_HZ, display=None):
+        self._position_fn = position
+        self.display = display
+        self.interval = 1 / hz
+        self.position = None   # packed "CP" message
+        self.shape = None      # packed "CS" message
+        self.shape_version = 0
+        self.subscribers = set()
+        self._poll = ThreadPoolExecutor(1, thread_name_prefix="cursor")
+        self._sct = None
+        self._shape_key = None
+        self._next_shape = 0.0
+        self._task = None
+
+    def subscribe(self, mailbox):
+        self.subscribers.add(mailbox)
+        if self.position is not None:
+            mailbox.put(True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def unsubscribe(self, mailbox):
+        self.subscribers.discard(mailbox)
+        if not self.subscribers and self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # Runs on the cursor thread
+    def _read(self):
+        x, y = self._position_fn()
+        shape = None
+        now = time.perf_counter()
+        if now >= self._next_shape:
+            self._next_shape = now + SHAPE_INTERVAL
+            shape = self._read_shape(x, y)
+        return pack_position(int(x), int(y)), shape
+
+    def _read_shape(self, x, y):
+        if self._sct is None:
+            self._sct = open_mss(self.display)
+        grab = getattr(self._sct, "_cursor_impl", None)
+        try:
+            cursor = grab() if grab is not None else None
+        except Exception:
+            cursor = None
+        if cursor is None:
+            return None
+        img = np.array(cursor)
+        key = hash(img.tobytes())
+        if key == self._shape_key:
+            return None
+        self._shape_key = key
+        h, w = img.shape[:2]
+        hot_x = min(max(0, x - cursor.left), w - 1)
+        hot_y = min(max(0, y - cursor.top), h - 1)
+        return pack_shape(img, hot_x, hot_y)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                position, shape = await loop.run_in_executor(self._poll, self._read)
+                changed = position != self.position
+                self.position = position
+                if shape is not None:
+                    self.shape = shape
+                    self.shape_version += 1
+                    changed = True
+                if changed:
+                    for mailbox in self.subscribers:
+                        mailbox.put(True)
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[{datetime.now()}] ❌ Cursor tracking failed: {e}")
+            self._task = None   # the next subscriber starts a fresh one
@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import hmac
+import random
+import secrets
+import struct
+import time
+import websockets
+
+from dependencies.encoders import is_keyframe
+from dependencies.metrics import unpack_frame
+
+# ─── Datagram video ──────────────────────────────────────────────────────────
+#
+# Optional video over UDP instead of the /video websocket: on a lossy link a
+# lost packet then costs the frame it belongs to, instead of stalling every
+# frame queued behind it on TCP. Negotiated over the control connection:
+#
+#   viewer  {"type": "udp_video", "params": {the /video query parameters}}
+#   server  {"type": "udp_video", "port", "token", "key"}, or {"error"}
+#   viewer  UDP hellos every HELLO_INTERVAL; the server sends video to
+#           wherever they come from, for as long as they keep coming
+#   viewer  {"type": "udp_loss", "token", "lost", "received"} every
+#           HELLO_INTERVAL, message counts so far
+#
+# Session and region notices and the pointer keep using the control
+# connection. Each video message (exactly what /video would carry) is split
+# into packets of at most PACKET_PAYLOAD bytes:
+#
+#   "DV" message id (u32) index (u16) count (u16), payload, tag (16 bytes)
+#   "DH" token (8 bytes) counter (u64), tag                          hello
+#
+# Video over TLS stays private, so this does too: payloads are XORed with a
+# SHAKE-256 keystream over (stream key, packet header) and every packet
+# carries an HMAC-SHA256 tag. Keys are per stream and handed out over TLS.
+#
+# The viewer drops a message that can no longer complete once a newer one
+# has, or after INCOMPLETE_TIMEOUT. After any loss it only shows keyframes,
+# and asks for one, until the picture is whole again.
+#
+# UDP has no congestion control, so the server paces each stream, BURST
+# packets at a time, to a rate that backs off when the viewer reports more
+# than LOSS_THRESHOLD of messages lost and creeps back up while it doesn't.
+# The pacing waits count as send time, so AutoQuality steps down as well.
+
+VIDEO_MAGIC        = b"DV"
+HELLO_MAGIC        = b"DH"
+PACKET             = struct.Struct("<2sIHH")
+HELLO              = struct.Struct("<2s8sQ")
+TAG                = 16
+PACKET_PAYLOAD     = 1200          # stays under a typical path MTU
+HELLO_INTERVAL     = 1.0
+STREAM_TIMEOUT     = 5.0           # server gives up without hellos for this long
+INCOMPLETE_TIMEOUT = 0.2           # viewer gives up on a message after this long
+UDP_RATE           = 12_500_000    # bytes/s a stream starts at, and its ceiling (100 Mbit/s)
+UDP_MIN_RATE       = 250_000       # floor after backing off (2 Mbit/s)
+UDP_RATE_STEP      = 1_250_000     # bytes/s added per loss-free report
+LOSS_BACKOFF       = 0.7           # rate is multiplied by this on loss
+LOSS_THRESHOLD     = 0.02          # share of messages lost that counts as loss
+BURST              = 8             # packets sent back to back
+
+
+class PacketCipher:
+    def __init__(self, key):
+        self._enc = hashlib.sha256(b"enc" + key).digest()
+        self._mac = hashlib.sha256(b"mac" + key).digest()
+
+    def _keystream(self, header, n):
+        return hashlib.shake_256(self._enc + header).digest(n)
+
+    def seal(self, header, payload):
+        body = header + _xor(payload, self._keystream(header, len(payload)))
+        return body + hmac.digest(self._mac, body, "sha256")[:TAG]
+
+    def open(self, packet, header_size):
+        """The payload of an authentic packet, otherwise None."""
+        if len(packet) < header_size + TAG:
+            return None
+        body, tag = packet[:-TAG], packet[-TAG:]
+        if not hmac.compare_digest(tag, hmac.digest(self._mac, body, "sha256")[:TAG]):
+            return None
+        header, data = body[:header_size], body[header_size:]
+        return _xor(data, self._keystream(header, len(data)))
+
+
+def _xor(data, keystream):
+    n = len(data)
+    return (int.from_bytes(data, "little") ^ int.from_bytes(keystream, "little")).to_bytes(n, "little")
+
+
+class DatagramServer(asyncio.DatagramProtocol):
+    """The server's UDP socket, shared by every datagram video stream.
+
+    `loss` drops that share of outgoing packets, to try the viewer's loss
+    handling on loopback.
+    """
+
+    def __init__(self, loss=0.0):
+        self.loss = loss
+        self.transport = None
+        self.streams = {}   # token -> DatagramVideo
+
+    @property
+    def port(self):
+        return self.transport.get_extra_info("sockname")[1]
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def open(self, control_ws):
+        stream = DatagramVideo(self, secrets.token_bytes(8), secrets.token_bytes(32), control_ws)
+        self.streams[stream.token] = stream
+        return stream
+
+    def close(self, stream):
+        self.streams.pop(stream.token, None)
+        stream.closed = True
+
+    def report(self, token, lost, received):
+        """A viewer's udp_loss report; `token` as hex."""
+        try:
+            stream = self.streams.get(bytes.fromhex(token))
+        except (TypeError, ValueError):
+            return
+        if stream is not None:
+            stream.report(lost, received)
+
+    def sendto(self, packet, addr):
+        if not self.loss or random.random() >= self.loss:
+            self.transport.sendto(packet, addr)
+
+    def datagram_received(self, data, addr):
+        if len(data) != HELLO.size + TAG or data[:2] != HELLO_MAGIC:
+            return
+        _, token, counter = HELLO.unpack_from(data, 0)
+        stream = self.streams.get(token)
+        # Counters only go up, so a replayed hello can't redirect the stream
+        if stream is None or counter <= stream.counter or stream.cipher.open(data, HELLO.size) is None:
+            return
+        stream.counter = counter
+        stream.addr = addr
+        stream.last_hello = time.monotonic()
+        stream.ready.set()
+
+
+class DatagramVideo:
+    """Server end of one viewer's datagram video, usable where stream_handler
+    expects a websocket: binary messages go out as packets, text ones
+    (session and region notices) over the control connection."""
+
+    def __init__(self, server, token, key, control_ws, rate=UDP_RATE):
+        self.server = server
+        self.token = token
+        self.key = key
+        self.cipher = PacketCipher(key)
+        self.control = control_ws
+        self.rate = rate
+        self.max_rate = rate
+        self.addr = None
+        self.counter = 0
+        self.last_hello = None
+        self.ready = asyncio.Event()   # set by the first hello
+        self.closed = False
+        self._msg_id = 0
+        self._next_burst = 0.0   # monotonic time the next burst may go out
+        self._reported = (0, 0)  # (lost, received) at the last report
+
+    async def send(self, data):
+        if isinstance(data, str):
+            await self.control.send(data)
+            return
+        self._msg_id += 1
+        view = memoryview(data)
+        count = max(1, -(-len(view) // PACKET_PAYLOAD))
+        for first in range(0, count, BURST):
+            if self.closed or time.monotonic() - self.last_hello > STREAM_TIMEOUT:
+                raise websockets.ConnectionClosed(None, None)
+            wait = self._next_burst - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            sent = 0
+            for i in range(first, min(first + BURST, count)):
+                header = PACKET.pack(VIDEO_MAGIC, self._msg_id, i, count)
+                chunk = view[i * PACKET_PAYLOAD:(i + 1) * PACKET_PAYLOAD]
+                self.server.sendto(self.cipher.seal(header, chunk), self.addr)
+                sent += len(chunk)
+            # No credit for time spent idle or oversleeping, so a burst is
+            # never more than BURST packets
+            self._next_burst = max(self._next_burst, time.monotonic()) + sent / self.rate
+
+    def report(self, lost, received):
+        """Adjust the rate to the viewer's cumulative message counts:
+        multiplicative decrease on loss, additive increase otherwise."""
+        if not isinstance(lost, int) or not isinstance(received, int):
+            return
+        new_lost, new_received = lost - self._reported[0], received - self._reported[1]
+        self._reported = (lost, received)
+        if new_lost < 0 or new_received < 0 or new_lost + new_received == 0:
+            return
+        if new_lost / (new_lost + new_received) > LOSS_THRESHOLD:
+            self.rate = max(UDP_MIN_RATE, self.rate * LOSS_BACKOFF)
+        else:
+            self.rate = min(self.max_rate, self.rate + UDP_RATE_STEP)
+
+    async def close(self):
+        self.closed = True
+
+
+class DatagramReceiver(asyncio.DatagramProtocol):
+    """Viewer end: reassembles video messages for `on_message(data)` and
+    calls `on_loss()` while it needs a keyframe. Call hello() every
+    HELLO_INTERVAL and check() every so often."""
+
+    def __init__(self, token, key, on_message, on_loss):
+        self.token = token
+        self.cipher = PacketCipher(key)
+        self.on_message = on_message
+        self.on_loss = on_loss
+        self.transport = None
+        self.packets = 0
+        self.last_packet = None  # monotonic time of the newest authentic packet
+        self.received = 0       # messages
+        self.lost = 0           # messages
+        self._counter = 0
+        self._partial = {}      # message id -> [parts, missing, first seen]
+        self._last = 0          # newest message id delivered or given up on
+        self._broken = False    # lost something since the last keyframe
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def hello(self):
+        self._counter += 1
+        header = HELLO.pack(HELLO_MAGIC, self.token, self._counter)
+        self.transport.sendto(self.cipher.seal(header, b""))
+
+    def datagram_received(self, data, addr):
+        if data[:2] != VIDEO_MAGIC:
+            return
+        payload = self.cipher.open(data, PACKET.size)
+        if payload is None:
+            return
+        _, msg_id, index, count = PACKET.unpack_from(data, 0)
+        self.packets += 1
+        self.last_packet = time.monotonic()
+        if msg_id <= self._last or index >= count:
+            return   # too late, or a duplicate
+        entry = self._partial.get(msg_id)
+        if entry is None:
+            entry = self._partial[msg_id] = [[None] * count, count, time.monotonic()]
+        parts = entry[0]
+        if parts[index] is not None:
+            return
+        parts[index] = payload
+        entry[1] -= 1
+        if entry[1]:
+            return
+        del self._partial[msg_id]
+        # Older messages still missing packets are no use any more
+        for stale in [m for m in self._partial if m < msg_id]:
+            del self._partial[stale]
+        if msg_id > self._last + 1:
+            self._lose(msg_id - self._last - 1)
+        self._last = msg_id
+        self.received += 1
+        self._deliver(b"".join(parts))
+
+    def check(self):
+        """Give up on messages that stayed incomplete too long."""
+        now = time.monotonic()
+        expired = [m for m, (_, _, seen) in self._partial.items() if now - seen > INCOMPLETE_TIMEOUT]
+        if not expired:
+            return
+        last = max(expired)
+        for m in [m for m in self._partial if m <= last]:
+            del self._partial[m]
+        if last > self._last:
+            self._lose(last - self._last)
+            self._last = last
+
+    def _lose(self, n):
+        self.lost += n
+        self._broken = True
+        self.on_loss()
+
+    def _deliver(self, data):
+        if self._broken:
+            if not is_keyframe(unpack_frame(data)[2]):
+                self.on_loss()   # deltas against a frame we never got
+                return
+            self._broken = False
+        self.on_message(data)
@@ -0,0 +1,121 @@
+import struct
+import cv2
+import numpy as np
+
+# ─── Tile delta encoding ─────────────────────────────────────────────────────
+#
+# A video message is either a plain image (a keyframe) or a delta:
+#
+#   header : magic "DT", frame width, frame height, tile size, tile count
+#   tiles  : x, y, image length, image bytes   (repeated tile-count times)
+#
+# JPEG, PNG and WebP data never start with "DT", so the two can't be confused.
+
+TILE_SIZE      = 64    # tile edge in pixels
+KEYFRAME_RATIO = 0.5   # above this share of dirty tiles a full frame is cheaper
+
+DELTA_MAGIC = b"DT"
+_HEADER     = struct.Struct("<2sHHHH")
+_TILE       = struct.Struct("<HHI")
+
+
+def is_delta(data):
+    return data[:2] == DELTA_MAGIC
+
+
+def _pixel_diff(prev, cur):
+    # Compare BGRA pixels as single uint32 words instead of per channel
+    if cur.ndim == 3 and cur.shape[2] == 4 and cur.flags.c_contiguous and prev.flags.c_contiguous:
+        return prev.view(np.uint32)[..., 0] != cur.view(np.uint32)[..., 0]
+    if cur.ndim == 3 and cur.shape[2] == 3:
+        # OR the channel planes; np.any over a 3-wide axis is far slower
+        diff = prev != cur
+        return diff[..., 0] | diff[..., 1] | diff[..., 2]
+    if cur.ndim == 3:
+        return np.any(prev != cur, axis=2)
+    return prev != cur
+
+
+def changed_tiles(prev, cur, tile=TILE_SIZE):
+    """Return an (N, 2) array of (row, col) indices of tiles that differ."""
+    h, w = cur.shape[:2]
+    rows, cols = -(-h // tile), -(-w // tile)
+    diff = _pixel_diff(prev, cur)
+    if h % tile or w % tile:
+        diff = np.pad(diff, ((0, rows * tile - h), (0, cols * tile - w)))
+    dirty = diff.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+    return np.argwhere(dirty)
+
+
+def encode_frame(prev, cur, encode, tile=TILE_SIZE, pool=None):
+    """Encode `cur` against `prev`, using `encode(img) -> bytes` for both
+    whole frames and tiles.
+
+    Returns a full keyframe when there is no usable previous frame or most of the
+    screen changed, a delta message otherwise, and None if nothing changed.
+    Dirty tiles are encoded in parallel when an executor `pool` is given
+    (cv2 releases the GIL while encoding).
+    """
+    if prev is None or prev.shape != cur.shape:
+        return encode(cur)
+
+    dirty = changed_tiles(prev, cur, tile)
+    if len(dirty) == 0:
+        return None
+    h, w = cur.shape[:2]
+    total = -(-h // tile) * -(-w // tile)
+    if len(dirty) > total * KEYFRAME_RATIO:
+        return encode(cur)
+
+    coords = [(int(col) * tile, int(row) * tile) for row, col in dirty]
+
+    def encode_tile(xy):
+        x, y = xy
+        return encode(cur[y:y + tile, x:x + tile])
+
+    if pool is not None and len(coords) > 1:
+        jpgs = list(pool.map(encode_tile, coords))
+    else:
+        jpgs = [encode_tile(xy) for xy in coords]
+
+    parts = [_HEADER.pack(DELTA_MAGIC, w, h, tile, len(coords))]
+    for (x, y), jpg in zip(coords, jpgs):
+        if jpg is None:
+            return encode(cur)
+        parts.append(_TILE.pack(x, y, len(jpg)))
+        parts.append(jpg)
+    return b"".join(parts)
+
+
+def apply_deltas(framebuffer, messages):
+    """Patch the tiles of one or more delta messages into `framebuffer`.
+
+    Messages are given oldest first. Where several touch the same tile only
+    the newest copy is decoded. Messages that don't fit the framebuffer
+    (e.g. the remote resolution changed and no keyframe arrived yet) are
+    ignored. Returns the number of messages applied.
+    """
+    if framebuffer is None:
+        return 0
+    covered = set()
+    applied = 0
+    for data in reversed(messages):
+        magic, w, h, tile, count = _HEADER.unpack_from(data, 0)
+        if framebuffer.shape[:2] != (h, w):
+            continue
+        applied += 1
+        off = _HEADER.size
+        for _ in range(count):
+            x, y, size = _TILE.unpack_from(data, off)
+            off += _TILE.size
+            if (x, y) in covered:
+                off += size
+                continue
+            covered.add((x, y))
+            patch = cv2.imdecode(np.frombuffer(data, np.uint8, size, off), cv2.IMREAD_COLOR)
+            off += size
+            if patch is None:
+                continue
+            ph, pw = patch.shape[:2]
+            framebuffer[y:y + ph, x:x + pw] = patch
+    return applied
@@ -0,0 +1,215 @@
+import struct
+import importlib.util
+from fractions import Fraction
+import numpy as np
+
+from dependencies.delta import encode_frame, is_delta
+
+# PyAV is optional (without it only the JPEG backend exists) and slow to
+# import, so it's only loaded once an inter-frame codec is actually used
+_av = None
+
+
+def load_av():
+    """The av module, or None if PyAV is not installed."""
+    global _av
+    if _av is None:
+        try:
+            import av
+        except ImportError:
+            av = False
+        _av = av
+    return _av or None
+
+# ─── Encoder backends ────────────────────────────────────────────────────────
+#
+# A backend turns captured frames into video messages:
+#
+#   encode(img, force_key) -> bytes, or None if the frame needn't be sent
+#   keyframe(img)          -> a standalone keyframe for img, for backends
+#                             with standalone_keyframes; the others can only
+#                             produce one in-stream, via force_key
+#   delta(prev, img)       -> img against an arbitrary earlier frame prev,
+#                             also only with standalone_keyframes
+#   holds(img)             -> whether the backend kept img to encode the
+#                             next frame against
+#
+# "jpeg" is the original per-frame image + dirty-tile path. "h264" and "vp8"
+# are inter-frame codecs through PyAV; their messages are
+#
+#   magic "AV", codec id (u8), flags (u8), encoded packet bytes
+#
+# and the viewer feeds them to a matching AvDecoder.
+
+AV_MAGIC  = b"AV"
+AV_HEADER = struct.Struct("<2sBB")
+AV_KEY    = 0x01
+
+KEYFRAME_INTERVAL = 300   # frames between periodic keyframes on inter codecs
+
+# codec name -> (wire id, encoder name, decoder name, encoder options)
+AV_CODECS = {
+    "h264": (1, "libx264", "h264", {"preset": "ultrafast", "tune": "zerolatency"}),
+    "vp8":  (2, "libvpx", "vp8", {"deadline": "realtime", "cpu-used": "8", "lag-in-frames": "0"}),
+}
+_CODEC_BY_ID = {cid: name for name, (cid, *_) in AV_CODECS.items()}
+
+DEFAULT_CODEC = "jpeg"
+
+
+def available_codecs():
+    has_av = _av or (_av is None and importlib.util.find_spec("av") is not None)
+    return ["jpeg"] + (list(AV_CODECS) if has_av else [])
+
+
+def is_av(data):
+    return data[:2] == AV_MAGIC
+
+
+def is_keyframe(data):
+    """True if a video message can be shown without any earlier message."""
+    if is_av(data):
+        return bool(data[3] & AV_KEY)
+    return not is_delta(data)
+
+
+class JpegTileEncoder:
+    """Whole-frame images, then dirty-tile deltas against the last frame."""
+
+    name = "jpeg"
+    standalone_keyframes = True
+
+    def __init__(self, profile, pool):
+        self.profile = profile
+        self.pool = pool
+        self._prev = None
+
+    def encode(self, img, force_key=False):
+        prev = None if force_key else self._prev
+        data = encode_frame(prev, img, self.profile.encode, pool=self.pool)
+        if data is not None:
+            self._prev = img
+        return data
+
+    def keyframe(self, img):
+        return self.profile.encode(img)
+
+    def holds(self, img):
+        return img is self._prev
+
+    def delta(self, prev, img):
+        return encode_frame(prev, img, self.profile.encode, pool=self.pool)
+
+    def close(self):
+        pass
+
+
+def _crf(quality):
+    # Map the profile's JPEG-style quality (0-100) onto x264/vpx CRF
+    return str(round(18 + (100 - min(quality, 100)) * 0.32))
+
+
+class AvEncoder:
+    """Inter-frame video through PyAV (libx264 / libvpx) in software."""
+
+    standalone_keyframes = False
+
+    def __init__(self, codec, profile, gop=KEYFRAME_INTERVAL):
+        if load_av() is None:
+            raise ValueError("PyAV is not installed, only the jpeg codec is available")
+        self.name = codec
+        self.codec_id, self._encoder_name, _, options = AV_CODECS[codec]
+        self._options = dict(options, crf=_crf(profile.quality))
+        self.gop = gop
+        self._ctx = None
+        self._size = None
+        self._prev = None
+        self._pts = 0
+
+    def _open(self, width, height):
+        av = load_av()
+        ctx = av.CodecContext.create(self._encoder_name, "w")
+        ctx.width, ctx.height = width, height
+        ctx.pix_fmt = "yuv420p"
+        ctx.time_base = Fraction(1, 1000)
+        ctx.gop_size = self.gop
+        ctx.options = self._options
+        ctx.open()
+        self._ctx, self._size = ctx, (width, height)
+
+    def encode(self, img, force_key=False):
+        unchanged = self._prev is not None and self._prev.shape == img.shape and np.array_equal(self._prev, img)
+        if unchanged and not force_key:
+            return None
+        self._prev = img
+
+        # yuv420p needs even dimensions
+        h, w = img.shape[:2]
+        size = (w - w % 2, h - h % 2)
+        if self._size != size:
+            self.close()
+            self._open(*size)
+            force_key = True
+
+        av = load_av()
+        frame = av.VideoFrame.from_ndarray(
+            np.ascontiguousarray(img[:size[1], :size[0]]),
+            format="bgra" if img.shape[2] == 4 else "bgr24")
+        frame.pts = self._pts
+        self._pts += 1
+        if force_key:
+            frame.pict_type = getattr(getattr(av.video.frame, "PictureType", None), "I", "I")
+
+        packets = self._ctx.encode(frame)
+        if not packets:
+            return None
+        key = any(p.is_keyframe for p in packets)
+        flags = AV_KEY if key else 0
+        return AV_HEADER.pack(AV_MAGIC, self.codec_id, flags) + b"".join(bytes(p) for p in packets)
+
+    def keyframe(self, img):
+        return None
+
+    def holds(self, img):
+        return img is self._prev
+
+    def close(self):
+        self._ctx = None
+        self._size = None
+
+
+def create_encoder(codec, profile, pool):
+    if codec == "jpeg":
+        return JpegTileEncoder(profile, pool)
+    if codec in AV_CODECS:
+        return AvEncoder(codec, profile)
+    raise ValueError(f"unknown codec {codec!r}")
+
+
+class AvDecoder:
+    """Viewer side of AvEncoder; one per video connection."""
+
+    def __init__(self):
+        self._ctx = None
+        self._codec_id = None
+
+    def decode(self, messages):
+        """Decode AV messages in order and return the last picture as a BGR
+        image (only that one is converted), or None if there was none.
+        Raises ValueError if the stream is unusable until the next keyframe."""
+        picture = None
+        av = load_av()
+        for data in messages:
+            _, codec_id, flags = AV_HEADER.unpack_from(data, 0)
+            if self._ctx is None or codec_id != self._codec_id:
+                if av is None:
+                    raise ValueError("PyAV is not installed")
+                self._ctx = av.CodecContext.create(AV_CODECS[_CODEC_BY_ID[codec_id]][2], "r")
+                self._codec_id = codec_id
+            try:
+                frames = self._ctx.decode(av.Packet(data[AV_HEADER.size:]))
+            except av.error.FFmpegError as e:
+                raise ValueError(f"decode failed: {e}") from e
+            if frames:
+                picture = frames[-1]
+        return picture.to_ndarray(format="bgr24") if picture is not None else None
@@ -0,0 +1,52 @@
+from dependencies.capture import list_monitors
+from dependencies.cursor import CursorTracker
+from dependencies.injection import InputQueue, MAX_INJECT_RATE
+from dependencies.metrics import Stats
+from dependencies.pacing import IDLE_FPS
+from dependencies.pipeline import VideoHub
+from dependencies.session import SessionStore
+from dependencies.transfer import ClipboardWatcher
+
+# ─── Hosts ───────────────────────────────────────────────────────────────────
+#
+# A host is one desktop served by remote_machine. A plain server has a
+# single host on the default display; with --display it serves one per X
+# display (e.g. a box full of Xvfb desktops), all sharing one event loop and
+# one encode pool. Viewers pick a host by path: /<host>/mux, /<host>/video,
+# /<host>/control.
+
+
+class Host:
+    def __init__(self, name, display, input, encode_pool, max_fps, max_inject_rate=MAX_INJECT_RATE):
+        self.name = name
+        self.display = display
+        self.input = input                 # pyautogui or an XDisplayInput
+        self.injector = InputQueue(max_inject_rate, name=f"inject-{name}")
+        self.video_hub = VideoHub(encode_pool, max_fps, IDLE_FPS, list_monitors(display), display)
+        self.cursor = CursorTracker(input.position, display=display)
+        self.sessions = SessionStore()     # viewer streams kept for reconnects
+        self.video_streams = {}            # client id -> ViewerStream, for control requests
+        self.control_stats = Stats()
+        self.transfer_stats = Stats()
+        # Shared by the host's transfer channels; pyperclip only reaches the
+        # default display
+        self.clipboard = ClipboardWatcher() if display is None else None
+
+    def snapshot(self):
+        return {
+            "pipelines": self.video_hub.snapshot(),
+            "viewers": {client: stream.snapshot() for client, stream in self.video_streams.items()},
+            "control": self.control_stats.snapshot(),
+            "input": self.injector.snapshot(),
+            "transfer": self.transfer_stats.snapshot(),
+        }
+
+
+def parse_display(spec):
+    """--display value: "name=:N", or ":N" which is named "N"."""
+    name, sep, display = spec.partition("=")
+    if not sep:
+        name, display = spec.lstrip(":").split(".")[0], spec
+    if not name or "/" in name or not display:
+        raise ValueError(f"bad display {spec!r}, expected :N or name=:N")
+    return name, display
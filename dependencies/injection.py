@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from dependencies.metrics import Stats
+
+# ─── Input injection queue ───────────────────────────────────────────────────
+#
+# pyautogui calls block (and sleep for pyautogui.PAUSE), so control events
+# are injected on a dedicated thread instead of the event loop. The loop
+# only queues them, however fast a viewer sends.
+
+MAX_INJECT_RATE = 500   # events injected per second, 0 for no limit
+
+
+class InputQueue:
+    """Injects queued calls on its own thread, strictly in arrival order.
+
+    A call queued with coalesce=True (mouse moves) replaces one queued right
+    before it with coalesce=True, so a flood of moves collapses into the
+    latest position without any click or key moving past a move. Paced
+    calls are injected at most `max_rate` per second; while one waits, more
+    moves can collapse into it.
+    """
+
+    def __init__(self, max_rate=MAX_INJECT_RATE, name="inject"):
+        self.interval = 1 / max_rate if max_rate > 0 else 0.0
+        self._items = deque()   # (fn, args, coalesce, paced)
+        self._cond = threading.Condition()
+        self._stats = Stats()   # guarded by _cond
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, fn, *args, coalesce=False, paced=True):
+        with self._cond:
+            if coalesce and self._items and self._items[-1][2]:
+                self._items[-1] = (fn, args, True, paced)
+                self._stats.count("coalesced")
+            else:
+                self._items.append((fn, args, coalesce, paced))
+            self._cond.notify()
+
+    def call_soon(self, loop, callback):
+        """Run `callback` on `loop` once everything queued so far is injected."""
+        self.put(loop.call_soon_threadsafe, callback, paced=False)
+
+    def __len__(self):
+        return len(self._items)
+
+    def snapshot(self):
+        with self._cond:
+            out = self._stats.snapshot()
+            out["queue_depth"] = len(self._items)
+        return out
+
+    def _run(self):
+        next_at = 0.0
+        while True:
+            with self._cond:
+                while True:
+                    if not self._items:
+                        self._cond.wait()
+                        continue
+                    wait = next_at - time.perf_counter() if self._items[0][3] else 0
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                fn, args, _, paced = self._items.popleft()
+            start = time.perf_counter()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[{datetime.now()}] ❌ Input injection failed: {e}")
+            if paced:
+                next_at = start + self.interval
+                with self._cond:
+                    self._stats.count("events")
+                    self._stats.time("inject", time.perf_counter() - start)
@@ -0,0 +1,91 @@
+import struct
+import threading
+import time
+from collections import deque
+
+# ─── Frame metadata ──────────────────────────────────────────────────────────
+#
+# Viewers that connect with `/video?meta=1` get every video message prefixed
+# with a small header: magic "FM", sequence number, capture time (server
+# clock, seconds since the epoch).
+
+FRAME_MAGIC  = b"FM"
+FRAME_HEADER = struct.Struct("<2sId")
+
+
+def pack_frame(seq, captured, data):
+    return FRAME_HEADER.pack(FRAME_MAGIC, seq, captured) + data
+
+
+def unpack_frame(data):
+    """Split a video message into (seq, capture time, payload). Messages
+    without a header come back as (None, None, data)."""
+    if data[:2] != FRAME_MAGIC:
+        return None, None, data
+    _, seq, captured = FRAME_HEADER.unpack_from(data, 0)
+    return seq, captured, data[FRAME_HEADER.size:]
+
+
+# ─── Counters ────────────────────────────────────────────────────────────────
+
+class Stats:
+    """Counters, timings and gauges, reported per interval by snapshot().
+
+    count(name) values become per-second rates, time(name) values become
+    average and max milliseconds, and gauges are reported as last set.
+    Safe to update from one thread while another takes snapshots.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._times = {}
+        self.gauges = {}
+        self._since = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def time(self, name, seconds):
+        with self._lock:
+            total, peak, n = self._times.get(name, (0.0, 0.0, 0))
+            self._times[name] = (total + seconds, max(peak, seconds), n + 1)
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        with self._lock:
+            counts, times, gauges = self._counts, self._times, dict(self.gauges)
+            now = time.perf_counter()
+            elapsed = max(now - self._since, 1e-9)
+            self._counts, self._times, self._since = {}, {}, now
+        out = {f"{name}_per_s": round(n / elapsed, 2) for name, n in counts.items()}
+        for name, (total, peak, n) in times.items():
+            out[f"{name}_ms"] = round(total / n * 1000, 2)
+            out[f"{name}_max_ms"] = round(peak * 1000, 2)
+        out.update(gauges)
+        return out
+
+
+class ClockSync:
+    """Round-trip time and server clock offset from control-channel pings.
+
+    The offset comes from the fastest recent round trip, where the unknown
+    one-way delays are smallest.
+    """
+
+    def __init__(self, window=10):
+        self._samples = deque(maxlen=window)
+        self.rtt = None
+        self.offset = 0.0   # server clock minus our clock, in seconds
+
+    def pong(self, sent, server_time, received=None):
+        received = time.time() if received is None else received
+        rtt = received - sent
+        self._samples.append((rtt, server_time - (sent + received) / 2))
+        self.rtt = rtt
+        self.offset = min(self._samples)[1]
+        return rtt
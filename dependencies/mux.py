@@ -0,0 +1,184 @@
+import asyncio
+import struct
+from collections import deque
+from datetime import datetime
+import websockets
+
+# ─── Multiplexed connection ──────────────────────────────────────────────────
+#
+# Video, cursor, control and transfers over a single websocket (the /mux
+# path), so a viewer pays for one TLS handshake instead of several. Every
+# websocket message is one chunk of one channel's message:
+#
+#   channel (u8), flags (u8), chunk bytes
+#
+# Messages larger than CHUNK_SIZE are split, and the sender always writes
+# the lowest-numbered channel with anything queued first. A big video frame
+# therefore holds up input and pointer updates by at most one chunk, rather
+# than the whole frame.
+#
+# Each end only keeps what arrives on the channels it reads (`inbound`);
+# chunks for any other channel are dropped. A message that grows past
+# MAX_MESSAGE closes the connection, since chunking would otherwise get
+# around the websocket's own size limit.
+
+CONTROL, CURSOR, VIDEO, TRANSFER = 0, 1, 2, 3   # also their priority, highest first
+CHANNELS   = (CONTROL, CURSOR, VIDEO, TRANSFER)
+MUX_HEADER = struct.Struct("<BB")
+FIN        = 0x01   # last chunk of a message
+TEXT       = 0x02   # message was a str
+
+CHUNK_SIZE  = 16 * 1024
+MAX_MESSAGE = 64 * 1024 * 1024   # bytes, reassembled
+TOO_BIG     = 1009               # websocket close code: message too big
+
+
+class Multiplexer:
+    """Both ends of a /mux websocket; use channel() to get per-channel
+    websocket stand-ins. Only the `inbound` channels can be received on."""
+
+    def __init__(self, ws, chunk_size=CHUNK_SIZE, inbound=CHANNELS, max_message=MAX_MESSAGE):
+        self.ws = ws
+        self.chunk_size = chunk_size
+        self.max_message = max_message
+        self.closed = None   # the ConnectionClosed that ended the connection
+        self._outbox = {ch: deque() for ch in CHANNELS}   # (chunk, future or None)
+        self._inbox = {ch: asyncio.Queue() for ch in inbound}
+        self._partial = {ch: [] for ch in inbound}
+        self._partial_size = {ch: 0 for ch in inbound}
+        self._ready = asyncio.Event()
+        self._reader = None
+        self._writer = None
+
+    def start(self):
+        self._reader = asyncio.create_task(self._read())
+        self._writer = asyncio.create_task(self._write())
+
+    async def close(self):
+        self._writer.cancel()
+        await self.ws.close()
+        await asyncio.gather(self._reader, self._writer, return_exceptions=True)
+
+    def channel(self, channel):
+        return MuxChannel(self, channel)
+
+    async def send(self, channel, data):
+        """Queue a message and wait until its last chunk has been written."""
+        if self.closed is not None:
+            raise self.closed
+        text = isinstance(data, str)
+        if text:
+            data = data.encode()
+        view = memoryview(data)
+        starts = range(0, max(len(view), 1), self.chunk_size)
+        done = asyncio.get_running_loop().create_future()
+        outbox = self._outbox[channel]
+        for i in starts:
+            last = i == starts[-1]
+            flags = (FIN if last else 0) | (TEXT if text else 0)
+            chunk = MUX_HEADER.pack(channel, flags) + view[i:i + self.chunk_size]
+            outbox.append((chunk, done if last else None))
+        self._ready.set()
+        await done
+
+    async def recv(self, channel):
+        if channel not in self._inbox:
+            raise ValueError(f"channel {channel} is not inbound on this end")
+        data = await self._inbox[channel].get()
+        if data is None:
+            self._inbox[channel].put_nowait(None)   # stay closed for later calls
+            # The reader can also stop without a ConnectionClosed (cancelled,
+            # or another error)
+            raise self.closed or websockets.ConnectionClosed(None, None)
+        return data
+
+    def _next_chunk(self):
+        for channel in CHANNELS:
+            if self._outbox[channel]:
+                return self._outbox[channel].popleft()
+        return None
+
+    async def _write(self):
+        done = None   # of the chunk being written, which has left the outbox
+        try:
+            while True:
+                await self._ready.wait()
+                item = self._next_chunk()
+                if item is None:
+                    self._ready.clear()
+                    continue
+                chunk, done = item
+                await self.ws.send(chunk)
+                if done is not None and not done.done():
+                    done.set_result(None)
+                done = None
+        except websockets.ConnectionClosed as e:
+            self.closed = self.closed or e
+            self._fail_sends(done, e)
+        except asyncio.CancelledError:
+            # close(): senders still waiting see the connection as closed
+            self._fail_sends(done, self.closed or websockets.ConnectionClosed(None, None))
+            raise
+
+    def _fail_sends(self, current, e):
+        pending = [current] + [done for outbox in self._outbox.values() for _, done in outbox]
+        for done in pending:
+            if done is not None and not done.done():
+                done.set_exception(e)
+        for outbox in self._outbox.values():
+            outbox.clear()
+
+    async def _read(self):
+        try:
+            while True:
+                msg = await self.ws.recv()
+                if isinstance(msg, str) or len(msg) < MUX_HEADER.size:
+                    print(f"[{datetime.now()}] ❌ Ignoring non-mux message on a mux connection")
+                    continue
+                channel, flags = MUX_HEADER.unpack_from(msg, 0)
+                if channel not in self._partial:
+                    continue   # unknown, or nobody reads it on this end
+                parts = self._partial[channel]
+                parts.append(msg[MUX_HEADER.size:])
+                self._partial_size[channel] += len(msg) - MUX_HEADER.size
+                if self._partial_size[channel] > self.max_message:
+                    print(f"[{datetime.now()}] ❌ Mux message on channel {channel} is over "
+                          f"{self.max_message} bytes, closing")
+                    await self.ws.close(TOO_BIG, "message too big")
+                    break
+                if not flags & FIN:
+                    continue
+                data = b"".join(parts) if len(parts) > 1 else parts[0]
+                parts.clear()
+                self._partial_size[channel] = 0
+                self._inbox[channel].put_nowait(data.decode() if flags & TEXT else data)
+        except websockets.ConnectionClosed as e:
+            self.closed = self.closed or e
+        finally:
+            for inbox in self._inbox.values():
+                inbox.put_nowait(None)
+
+
+class MuxChannel:
+    """One channel of a Multiplexer, usable where the handlers expect a
+    websocket: send(), recv(), async iteration and close()."""
+
+    def __init__(self, mux, channel):
+        self.mux = mux
+        self.channel = channel
+
+    async def send(self, data):
+        await self.mux.send(self.channel, data)
+
+    async def recv(self):
+        return await self.mux.recv(self.channel)
+
+    async def __aiter__(self):
+        while True:
+            try:
+                yield await self.recv()
+            except websockets.ConnectionClosed:
+                return
+
+    async def close(self):
+        await self.mux.ws.close()
@@ -0,0 +1,37 @@
+import time
+
+# ─── Adaptive frame pacing ───────────────────────────────────────────────────
+#
+# While the screen changes we aim for `max_fps`, sleeping only for whatever is
+# left of the frame interval after capture + encode + send. Every static frame
+# doubles the interval until it reaches `1 / idle_fps`, so an idle session only
+# polls the screen a couple of times per second. The websocket's own ping
+# frames keep the connection alive while nothing is sent.
+
+MAX_FPS  = 30
+IDLE_FPS = 2
+
+
+class FramePacer:
+    def __init__(self, max_fps=MAX_FPS, idle_fps=IDLE_FPS):
+        self.min_interval = 1 / max_fps
+        self.max_interval = 1 / min(idle_fps, max_fps)
+        self.interval = self.min_interval
+        self.work_time = 0.0   # capture + encode + send time of the last frame
+        self._start = None
+
+    def begin(self):
+        self._start = time.perf_counter()
+
+    def end(self, changed):
+        """Finish a frame and return how long to sleep before the next one."""
+        self.work_time = time.perf_counter() - self._start
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return max(0.0, self.interval - self.work_time)
+
+    @property
+    def fps(self):
+        return 1 / max(self.interval, self.work_time)
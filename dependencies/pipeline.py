@@ -0,0 +1,432 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dependencies.capture import capture_region, region_key, ScreenGrabber, DEFAULT_MONITOR
+from dependencies.encoders import create_encoder, available_codecs, is_keyframe, DEFAULT_CODEC
+from dependencies.metrics import Stats
+from dependencies.pacing import FramePacer
+from dependencies.profiles import PROFILES, DEFAULT_PROFILE, AUTO, AutoQuality
+
+# ─── Capture / encode pipeline ───────────────────────────────────────────────
+#
+# Screen capture and encoding run on a dedicated capture thread (mss handles
+# are not shareable across threads), with the encoder backend fanning work
+# out to a pool of encode workers where it can. The event loop only moves
+# finished frames around, so control events are never stuck behind an
+# encode.
+#
+# One pipeline per (profile, codec, region) is shared by every viewer using
+# it: each frame is captured and encoded once and handed to each
+# subscriber's own mailbox, so a slow viewer only drops its own frames.
+
+ENCODE_WORKERS = min(4, os.cpu_count() or 1)
+KEYFRAME_INTERVAL = 1.0   # min seconds between requested keyframes
+
+
+class LatestFrame:
+    """Single-slot mailbox: a new frame replaces one that hasn't been taken."""
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, frame):
+        if self._event.is_set():
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    def __len__(self):
+        return 1 if self._frame is not None else 0
+
+    def wake(self):
+        """Make a pending get() return, with None if no frame is waiting."""
+        self._event.set()
+
+    async def get(self):
+        await self._event.wait()
+        self._event.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class EncodedFrame:
+    """A captured frame, its encoding against the previous frame and, lazily,
+    a standalone keyframe for receivers that missed that previous frame
+    (when the encoder can make one)."""
+
+    def __init__(self, seq, image, data, encoder, captured):
+        self.seq = seq
+        self.captured = captured   # wall-clock capture time
+        self.image = image
+        self.data = data
+        self.is_key = is_keyframe(data)
+        self.standalone = encoder.standalone_keyframes
+        self._encoder = encoder
+        self._keyframe = data if self.is_key else None
+        self._lock = threading.Lock()
+
+    def keyframe(self):
+        with self._lock:
+            if self._keyframe is None:
+                self._keyframe = self._encoder.keyframe(self.image)
+            return self._keyframe
+
+    def payload_for(self, last_seq):
+        """Bytes to send to a receiver whose last frame was `last_seq`, or
+        None if a keyframe has to be encoded first."""
+        if self.is_key or self.seq == last_seq + 1:
+            return self.data
+        return self._keyframe
+
+
+class Subscriber:
+    """One viewer's view of a pipeline: its own mailbox and sequence state."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.mailbox = LatestFrame()
+        self.last_seq = 0
+        self.base = None   # frame the viewer resumed from, see resume_from
+
+    def resume_from(self, frame):
+        """Continue a viewer that reconnected holding `frame`: the next frame
+        is sent as a delta against it instead of a keyframe, where the
+        encoder can make one."""
+        self.last_seq = frame.seq
+        self.base = frame if frame.standalone else None
+        # Frames sent after it may never have arrived, and an idle screen
+        # won't produce another, so catch up on the newest right away
+        latest = self.pipeline._latest
+        if not self.mailbox and latest is not None and latest.seq > frame.seq:
+            self.mailbox.put(latest)
+
+    async def next_payload(self):
+        """Wait for the next frame and return it with the bytes to send, or
+        (None, None) if the pipeline failed or the mailbox was woken without
+        a frame."""
+        frame = await self.mailbox.get()
+        if frame is None:
+            return None, None
+        base, self.base = self.base, None
+        data = frame.payload_for(self.last_seq)
+        if data is None and base is not None:
+            # Not on the encode pool: the delta fans its tiles out to it
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, self.pipeline.encoder.delta, base.image, frame.image)
+            self.last_seq = frame.seq
+            if data is None:
+                return None, None   # the viewer's picture is already current
+            return frame, data
+        if data is None:
+            if not frame.standalone:
+                # An inter-frame stream can't be joined mid-way: skip frames
+                # until the keyframe we ask for comes round
+                self.pipeline.request_keyframe()
+                return None, None
+            data = await asyncio.get_running_loop().run_in_executor(
+                self.pipeline.encode_pool, frame.keyframe)
+        self.last_seq = frame.seq
+        return frame, data
+
+
+class CapturePipeline:
+    def __init__(self, encode_pool, profile, codec, region, max_fps, idle_fps, display=None):
+        self.encode_pool = encode_pool
+        self.display = display
+        self.profile = profile
+        self.encoder = create_encoder(codec, profile, encode_pool)
+        self.region = region
+        self.pacer = FramePacer(max_fps, idle_fps)
+        self.stats = Stats()
+        self.subscribers = set()
+        self._capture = ThreadPoolExecutor(1, thread_name_prefix="capture")
+        self._grabber = None
+        self._want_key = False
+        self._last_key_request = 0.0
+        self._key_timer = None
+        self._seq = 0
+        self._latest = None
+        self._task = None
+        self.failed = False
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._key_timer is not None:
+            self._key_timer.cancel()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.get_running_loop().run_in_executor(self._capture, self._close)
+        self._capture.shutdown(wait=False)
+
+    def subscribe(self):
+        sub = Subscriber(self)
+        self.subscribers.add(sub)
+        # A late joiner gets the current screen right away, even if it's idle
+        if self._latest is not None:
+            sub.mailbox.put(self._latest)
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.discard(sub)
+
+    def request_keyframe(self):
+        """Make the next frame a keyframe, even if the screen is unchanged.
+
+        Keyframes go to every subscriber, so on an inter-frame codec one
+        lagging or lossy viewer asking on every skipped frame would cost
+        all the others bandwidth. Requests are therefore served at most once
+        per KEYFRAME_INTERVAL; later ones wait for the interval to pass,
+        which can leave that viewer that much longer without a picture.
+        """
+        if self._want_key or self._key_timer is not None:
+            return
+        wait = self._last_key_request + KEYFRAME_INTERVAL - time.monotonic()
+        if wait > 0:
+            self._key_timer = asyncio.get_running_loop().call_later(wait, self._want_keyframe)
+        else:
+            self._want_keyframe()
+
+    def _want_keyframe(self):
+        self._key_timer = None
+        self._last_key_request = time.monotonic()
+        self._want_key = True
+
+    def resync(self, sub):
+        """Get a subscriber whose viewer lost track back to a clean frame."""
+        sub.last_seq = -1
+        if self.encoder.standalone_keyframes and self._latest is not None:
+            sub.mailbox.put(self._latest)
+        else:
+            self.request_keyframe()
+
+    def _publish(self, frame):
+        for sub in self.subscribers:
+            sub.mailbox.put(frame)
+
+    # Runs on the capture thread
+    def _grab_encode(self):
+        if self._grabber is None:
+            self._grabber = ScreenGrabber(self.display)
+        start = time.perf_counter()
+        captured = time.time()
+        img = self._grabber.grab(self.region, self.profile.size_for)
+        grabbed = time.perf_counter()
+        force_key, self._want_key = self._want_key, False
+        data = self.encoder.encode(img, force_key)
+        timings = (grabbed - start, time.perf_counter() - grabbed)
+        if data is None:
+            if not self.encoder.holds(img):
+                self._grabber.release(img)
+            return None, timings
+        self._seq += 1
+        frame = EncodedFrame(self._seq, img, data, self.encoder, captured)
+        # Everything that reads the image afterwards (mailboxes, sessions,
+        # the recorder, the encoder's previous frame via _latest) goes
+        # through the frame, so its buffer is free once the frame is gone
+        weakref.finalize(frame, self._grabber.release, img)
+        return frame, timings
+
+    def _close(self):
+        self.encoder.close()
+        if self._grabber is not None:
+            self._grabber.close()
+            self._grabber = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                self.pacer.begin()
+                frame, (capture_time, encode_time) = await loop.run_in_executor(
+                    self._capture, self._grab_encode)
+                self.stats.time("capture", capture_time)
+                self.stats.time("encode", encode_time)
+                if frame is not None:
+                    self.stats.count("frames")
+                    self.stats.count("bytes", len(frame.data))
+                    if frame.is_key:
+                        self.stats.count("keyframes")
+                    self._latest = frame
+                    self._publish(frame)
+                await asyncio.sleep(self.pacer.end(changed=frame is not None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[{datetime.now()}] ❌ Capture pipeline failed: {e}")
+            self.failed = True
+            self._publish(None)
+
+
+class VideoHub:
+    """Runs one shared CapturePipeline per (profile, codec, region) in use.
+
+    `monitors` is the mss monitor list the viewers choose regions from, on
+    X display `display` (None for the default).
+    """
+
+    def __init__(self, encode_pool, max_fps, idle_fps, monitors, display=None):
+        self._args = (max_fps, idle_fps, display)
+        self.encode_pool = encode_pool
+        self.monitors = monitors
+        self._pipelines = {}
+
+    @staticmethod
+    def _key(profile, codec, region):
+        return (profile, codec) + region_key(region)
+
+    def subscribe(self, profile, codec, region):
+        key = self._key(profile, codec, region)
+        pipeline = self._pipelines.get(key)
+        if pipeline is None or pipeline.failed:
+            pipeline = CapturePipeline(self.encode_pool, PROFILES[profile], codec, region,
+                                       *self._args)
+            pipeline.start()
+            self._pipelines[key] = pipeline
+        return pipeline.subscribe()
+
+    async def unsubscribe(self, sub):
+        pipeline = sub.pipeline
+        pipeline.unsubscribe(sub)
+        if not pipeline.subscribers:
+            key = self._key(pipeline.profile.name, pipeline.encoder.name, pipeline.region)
+            if self._pipelines.get(key) is pipeline:
+                del self._pipelines[key]
+            await pipeline.stop()
+
+    @property
+    def viewers(self):
+        return sum(len(p.subscribers) for p in self._pipelines.values())
+
+    def snapshot(self):
+        """Per-profile pipeline stats, for the periodic stats log."""
+        out = {}
+        for (profile, codec, left, top, width, height), p in self._pipelines.items():
+            name = f"{profile}/{codec}/{width}x{height}+{left}+{top}"
+            out[name] = p.stats.snapshot()
+            out[name].update(fps_target=round(p.pacer.fps, 1), viewers=len(p.subscribers))
+        return out
+
+
+class ViewerStream:
+    """The frames one viewer receives: a subscription to the hub that follows
+    profile and region changes requested over the control channel or by
+    AutoQuality."""
+
+    def __init__(self, hub, profile=DEFAULT_PROFILE, codec=DEFAULT_CODEC,
+                 monitor=DEFAULT_MONITOR, roi=None):
+        if codec not in available_codecs():
+            raise ValueError(f"codec {codec!r} is not available")
+        self.hub = hub
+        self.codec = codec
+        self.auto = None
+        self.sub = None
+        self._want = None
+        self._want_region = None
+        self.set_region(monitor, roi)
+        self._dropped = 0      # drops from earlier subscriptions
+        self._seen_drops = 0
+        self.stats = Stats()
+        self.recorder = None   # set by the server when recording sessions
+        self.set_profile(profile)
+
+    @property
+    def profile(self):
+        return self.sub.pipeline.profile.name if self.sub else None
+
+    @property
+    def region(self):
+        return self.sub.pipeline.region if self.sub else None
+
+    @property
+    def dropped(self):
+        return self._dropped + (self.sub.mailbox.dropped if self.sub else 0)
+
+    def set_profile(self, name):
+        if name == AUTO:
+            self.auto = AutoQuality()
+            name = self.auto.profile
+        elif name in PROFILES:
+            self.auto = None
+        else:
+            raise ValueError(f"unknown profile {name!r}")
+        self._want = name
+        if self.sub is not None:
+            self.sub.mailbox.wake()
+
+    def set_region(self, monitor=DEFAULT_MONITOR, roi=None):
+        """Capture monitor `monitor` (0 for all of them), or only the `roi`
+        rectangle of it."""
+        self._want_region = capture_region(self.hub.monitors, monitor, roi)
+        if self.sub is not None:
+            self.sub.mailbox.wake()
+
+    async def next_payload(self):
+        """Returns (frame, bytes to send), or (None, None) once the pipeline
+        has failed."""
+        while True:
+            if self._want != self.profile or self._want_region != self.region:
+                await self._resubscribe()
+            frame, data = await self.sub.next_payload()
+            if data is not None:
+                return frame, data
+            if self.sub.pipeline.failed:
+                return None, None
+
+    def sent(self, nbytes, send_time):
+        """Account a finished send and feed it into AutoQuality, if enabled."""
+        self.stats.count("frames")
+        self.stats.count("bytes", nbytes)
+        self.stats.time("send", send_time)
+        if self.auto is None:
+            return
+        dropped = self.dropped
+        change = self.auto.record(time.perf_counter(), nbytes, send_time,
+                                  dropped > self._seen_drops)
+        self._seen_drops = dropped
+        if change is not None:
+            self._want = change
+
+    def snapshot(self):
+        out = self.stats.snapshot()
+        out.update(profile=self.profile, region=self.region, dropped=self.dropped,
+                   queued=len(self.sub.mailbox) if self.sub else 0)
+        if self.auto is not None:
+            out["auto_throughput"] = round(self.auto.throughput)
+        return out
+
+    async def close(self):
+        if self.sub is not None:
+            self._dropped += self.sub.mailbox.dropped
+            await self.hub.unsubscribe(self.sub)
+            self.sub = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def request_keyframe(self):
+        if self.sub is not None:
+            self.sub.pipeline.resync(self.sub)
+
+    def resume_from(self, frame):
+        if self.sub is not None:
+            self.sub.resume_from(frame)
+
+    async def _resubscribe(self):
+        old = self.sub
+        # The new pipeline starts the viewer off with a keyframe
+        self.sub = self.hub.subscribe(self._want, self.codec, self._want_region)
+        if old is not None:
+            self._dropped += old.mailbox.dropped
+            await self.hub.unsubscribe(old)
@@ -0,0 +1,145 @@
+import sys
+import time
+from datetime import datetime
+
+import cv2
+
+from dependencies.encoders import is_keyframe, AvDecoder
+from dependencies.recording import Recording, VIDEO, CHECKPOINT, CONTROL
+from dependencies.render import decode_pending, Letterbox
+
+# ─── Recording player ────────────────────────────────────────────────────────
+#
+#   python -m dependencies.player RECORDING.rec
+#
+# Plays a recording written by `remote_machine --record` through the viewer's
+# decode path. Drag the slider to scrub, space pauses, left/right jump
+# SKIP seconds, Esc quits. Control events are printed as they play.
+
+WINDOW_NAME    = "Recording"
+DEFAULT_WINDOW = (1280, 720)
+SKIP           = 5.0
+LEFT_KEYS      = (65361, 2424832)   # GTK, Windows
+RIGHT_KEYS     = (65363, 2555904)
+
+
+class Player:
+    """Decodes a recording up to a given time; seek() restarts from the
+    nearest playback start point at or before it."""
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.framebuffer = None
+        self.seek(recording.start)
+
+    def seek(self, t):
+        self._records = self.recording.records(self.recording.seek(t))
+        self._next = next(self._records, None)
+        self._decoder = AvDecoder()
+        self.framebuffer = None
+
+    def advance(self, t, quiet=False):
+        """Play every record up to time t; returns the new picture, or None
+        if there is nothing new to show."""
+        pending = []
+        while self._next is not None and self._next[1] <= t:
+            kind, rt, payload = self._next
+            if kind in (VIDEO, CHECKPOINT):
+                data = bytes(payload)
+                if is_keyframe(data):
+                    pending.clear()   # nothing before it is needed
+                pending.append(data)
+            elif kind == CONTROL and not quiet and payload.get("type") != "mouse_move":
+                print(f"[{datetime.fromtimestamp(rt)}] {payload}")
+            self._next = next(self._records, None)
+        if not pending:
+            return None
+        try:
+            frame = decode_pending(self.framebuffer, pending, self._decoder)
+        except ValueError as e:
+            print(f"Video {e}, waiting for the next keyframe")
+            return None
+        if frame is not None:
+            self.framebuffer = frame
+        return frame
+
+    @property
+    def done(self):
+        return self._next is None
+
+
+def window_size():
+    try:
+        _, _, w, h = cv2.getWindowImageRect(WINDOW_NAME)
+    except cv2.error:
+        w = h = 0
+    return (w, h) if w > 0 and h > 0 else DEFAULT_WINDOW
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python -m dependencies.player RECORDING.rec")
+        sys.exit(1)
+    try:
+        recording = Recording(sys.argv[1])
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    duration = recording.end - recording.start
+    print(f"{sys.argv[1]}: {duration:.1f} s from {datetime.fromtimestamp(recording.start)}")
+
+    player = Player(recording)
+    letterbox = Letterbox()
+    position = 0.0       # seconds into the recording
+    seek_to = None
+    playing = True
+
+    def on_slider(value):
+        nonlocal seek_to
+        if value != int(position):   # not just the slider following playback
+            seek_to = float(value)
+
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(WINDOW_NAME, *DEFAULT_WINDOW)
+    cv2.createTrackbar("seconds", WINDOW_NAME, 0, max(1, int(duration)), on_slider)
+
+    last = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if playing:
+            position += now - last
+        last = now
+        if seek_to is not None:
+            position, seek_to = min(max(seek_to, 0.0), duration), None
+            player.seek(recording.start + position)
+            frame = player.advance(recording.start + position, quiet=True)
+        else:
+            frame = player.advance(recording.start + position)
+        if player.done and position >= duration:
+            position, playing = duration, False
+
+        win_w, win_h = window_size()
+        if frame is None and player.framebuffer is not None and (win_w, win_h) != letterbox.window:
+            frame = player.framebuffer   # window was resized
+        if frame is not None:
+            cv2.imshow(WINDOW_NAME, letterbox.render(frame, win_w, win_h))
+        if cv2.getTrackbarPos("seconds", WINDOW_NAME) != int(position):
+            cv2.setTrackbarPos("seconds", WINDOW_NAME, int(position))
+
+        key = cv2.waitKeyEx(10)
+        if key == 27:
+            break
+        if key == ord(" "):
+            playing = not playing
+        elif key in LEFT_KEYS:
+            seek_to = position - SKIP
+        elif key in RIGHT_KEYS:
+            seek_to = position + SKIP
+
+    cv2.destroyAllWindows()
+    player = None   # drop the views into the mapped file before unmapping it
+    recording.close()
+
+
+if __name__ == "__main__":
+    main()
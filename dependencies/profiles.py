@@ -0,0 +1,119 @@
+import cv2
+
+# ─── Encoder profiles ────────────────────────────────────────────────────────
+#
+# A profile decides how captured frames are scaled and encoded before they go
+# on the wire. Viewers pick one when they connect (`/video?profile=low`) and
+# can switch at runtime with a {"type": "set_profile"} control event.
+# "auto" walks the AUTO_LADDER based on how fast frames actually leave.
+
+_SAMPLING = {
+    "444": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+    "422": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+    "420": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+}
+
+
+class EncoderProfile:
+    def __init__(self, name, max_size=None, quality=90, sampling="420", fmt=".jpg"):
+        self.name = name
+        self.max_size = max_size   # (width, height) to fit into, None for native
+        self.quality = quality
+        self.sampling = sampling
+        self.fmt = fmt
+        self.params = self._params()
+
+    def _params(self):
+        if self.fmt == ".png":
+            return [int(cv2.IMWRITE_PNG_COMPRESSION), 1]
+        if self.fmt == ".webp":
+            # Quality above 100 makes the WebP encoder lossless
+            return [int(cv2.IMWRITE_WEBP_QUALITY), self.quality]
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        factor = _SAMPLING.get(self.sampling)
+        if factor is not None:
+            params += [int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(factor)]
+        return params
+
+    def size_for(self, w, h):
+        """The size to scale a w x h frame to: fitting max_size, keeping its
+        aspect ratio, never up."""
+        if self.max_size is None:
+            return w, h
+        max_w, max_h = self.max_size
+        factor = min(max_w / w, max_h / h)
+        if factor >= 1:
+            return w, h
+        return max(1, int(w * factor)), max(1, int(h * factor))
+
+    def encode(self, img):
+        ret, buf = cv2.imencode(self.fmt, img, self.params)
+        return buf.tobytes() if ret else None
+
+
+PROFILES = {p.name: p for p in (
+    EncoderProfile("native",   None,         100, "444"),
+    EncoderProfile("high",     (1920, 1080), 90,  "444"),
+    EncoderProfile("balanced", (1600, 900),  75,  "420"),
+    EncoderProfile("low",      (1280, 720),  50,  "420"),
+    EncoderProfile("text",     (1920, 1080), 101, fmt=".webp"),
+)}
+
+DEFAULT_PROFILE = "high"
+AUTO = "auto"
+AUTO_LADDER = ["high", "balanced", "low"]   # best first
+
+
+class AutoQuality:
+    """Picks a profile from AUTO_LADDER based on measured send throughput.
+
+    Over each window we compare the time spent blocked in `ws.send` with the
+    wall time. A sender that is mostly blocked (or dropping frames) can't keep
+    up, so we step down; one that is mostly idle steps back up after a few
+    calm windows.
+    """
+
+    WINDOW  = 2.0    # seconds per measurement window
+    HIGH    = 0.5    # busy share above which we step down
+    LOW     = 0.15   # busy share below which we consider stepping up
+    UP_AFTER = 3     # calm windows required before stepping up
+
+    def __init__(self, start="balanced"):
+        self.level = AUTO_LADDER.index(start)
+        self._window_start = None
+        self._busy = 0.0
+        self._bytes = 0
+        self._calm = 0
+        self.throughput = 0.0   # bytes/s over the last window
+
+    @property
+    def profile(self):
+        return AUTO_LADDER[self.level]
+
+    def record(self, now, nbytes, send_time, dropped):
+        """Account one sent frame; returns the profile to switch to, or None."""
+        if self._window_start is None:
+            self._window_start = now
+        self._busy += send_time
+        self._bytes += nbytes
+        elapsed = now - self._window_start
+        if elapsed < self.WINDOW:
+            return None
+
+        busy = self._busy / elapsed
+        self.throughput = self._bytes / elapsed
+        self._window_start, self._busy, self._bytes = now, 0.0, 0
+
+        if (busy > self.HIGH or dropped) and self.level < len(AUTO_LADDER) - 1:
+            self.level += 1
+            self._calm = 0
+            return self.profile
+        if busy < self.LOW and not dropped and self.level > 0:
+            self._calm += 1
+            if self._calm >= self.UP_AFTER:
+                self.level -= 1
+                self._calm = 0
+                return self.profile
+        else:
+            self._calm = 0
+        return None
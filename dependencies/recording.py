@@ -0,0 +1,264 @@
+import atexit
+import bisect
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+from datetime import datetime
+
+from dependencies.encoders import is_keyframe
+
+# ─── Session recordings ──────────────────────────────────────────────────────
+#
+# A recording is what one viewer was sent, stored as is (no re-encoding):
+#
+#   NAME.rec   "ADRC", version (u8), then records:
+#              kind (u8), time (f64, server clock), length (u32), payload
+#   NAME.idx   (time (f64), offset (u64)) of every record playback can
+#              start from, in time order
+#
+# Video records are the viewer's video messages, so playing them back is the
+# viewer's decode path. Playback can start at keyframes and at checkpoints:
+# standalone keyframes of an otherwise-delta stream, written every
+# CHECKPOINT_INTERVAL seconds (from the frame's shared lazy keyframe, encoded
+# on the writer thread) and skipped during normal playback.
+#
+# Record times never decrease (a time earlier than the last one is moved up
+# to it), so the index stays sorted for seeking.
+#
+# Both files are only ever appended to, by a writer thread, so recording
+# costs the streaming loop a queue put per message. The queue holds at most
+# QUEUE_LIMIT records; when the disk can't keep up, records are dropped and
+# counted, and video resumes at the next keyframe or checkpoint (one is due
+# straight away). A file cut short by a crash just ends at its last complete
+# record.
+
+FILE_HEADER   = struct.Struct("<4sB")
+FILE_MAGIC    = b"ADRC"
+FILE_VERSION  = 1
+RECORD_HEADER = struct.Struct("<BdI")
+INDEX_ENTRY   = struct.Struct("<dQ")
+
+VIDEO, CHECKPOINT, CONTROL, REGION = 1, 2, 3, 4
+
+CHECKPOINT_INTERVAL = 10.0   # max seconds between playback start points
+QUEUE_LIMIT         = 64     # records waiting for the writer thread
+
+
+def recording_path(directory, host, client):
+    name = f"{host}-{datetime.now():%Y%m%d-%H%M%S}-{client[:8]}.rec"
+    return os.path.join(directory, name)
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+
+_open_recorders = set()
+
+
+@atexit.register
+def _drain_all():
+    """The writer threads are daemons: finish their queues before exiting."""
+    for recorder in list(_open_recorders):
+        recorder.close()
+        recorder.join()
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.dropped = 0          # records the writer couldn't keep up with
+        self._last_start = None   # time of the last indexed record
+        self._last_time = None    # time of the last record
+        self._broken = False      # video dropped since the last start point
+        self._closing = False
+        self._queue = queue.Queue(QUEUE_LIMIT)
+        self._data = open(path, "wb", buffering=1 << 20)
+        self._index = open(index_path(path), "wb")
+        self._data.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self._offset = FILE_HEADER.size
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+        _open_recorders.add(self)
+
+    def _time(self, t):
+        if self._last_time is not None and t < self._last_time:
+            t = self._last_time
+        self._last_time = t
+        return t
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def video(self, t, data):
+        t = self._time(t)
+        indexed = is_keyframe(data)
+        if self._broken and not indexed:
+            self.dropped += 1   # a delta against a picture that wasn't recorded
+            return
+        if not self._put((VIDEO, t, data, indexed)):
+            self._broken = True
+            self._last_start = None   # a checkpoint is due right away
+        elif indexed:
+            self._last_start = t
+            self._broken = False
+
+    def checkpoint_due(self, t):
+        return self._last_start is None or t - self._last_start >= CHECKPOINT_INTERVAL
+
+    def checkpoint(self, t, keyframe):
+        """A keyframe of the picture the last video record produced;
+        `keyframe` is called on the writer thread to encode it."""
+        t = self._time(t)
+        if self._put((CHECKPOINT, t, keyframe, True)):
+            self._last_start = t
+            self._broken = False
+
+    def control(self, t, ev):
+        self._put((CONTROL, self._time(t), ev, False))
+
+    def region(self, t, region):
+        self._put((REGION, self._time(t), region, False))
+
+    def close(self):
+        """Stop recording once what's queued is written; doesn't wait."""
+        if self in _open_recorders:
+            _open_recorders.discard(self)
+            self._closing = True
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass   # the writer stops once it has emptied the queue
+            if self.dropped:
+                print(f"[{datetime.now()}] Recording {self.path}: {self.dropped} records "
+                      f"dropped, the disk couldn't keep up")
+
+    def join(self):
+        self._thread.join()
+
+    # Runs on the writer thread
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                kind, t, payload, indexed = item
+                if kind == CHECKPOINT:
+                    payload = self._encode_checkpoint(payload)
+                if payload is not None:
+                    self._write(kind, t, payload, indexed)
+                if self._queue.empty():
+                    self._data.flush()
+                    self._index.flush()
+                    if self._closing:
+                        break
+        except OSError as e:
+            print(f"[{datetime.now()}] ❌ Recording to {self.path} failed: {e}")
+        finally:
+            self._data.close()
+            self._index.close()
+
+    def _encode_checkpoint(self, keyframe):
+        try:
+            return keyframe()
+        except Exception as e:
+            print(f"[{datetime.now()}] ❌ Recording checkpoint failed: {e}")
+            return None
+
+    def _write(self, kind, t, payload, indexed):
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = json.dumps(payload).encode()
+        if indexed:
+            self._index.write(INDEX_ENTRY.pack(t, self._offset))
+        self._data.write(RECORD_HEADER.pack(kind, t, len(payload)))
+        self._data.write(payload)
+        self._offset += RECORD_HEADER.size + len(payload)
+
+
+class _IndexTimes:
+    """The times in an index mmap as a sequence, for bisect."""
+
+    def __init__(self, buf):
+        self._buf = buf
+        self._n = len(buf) // INDEX_ENTRY.size
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        return INDEX_ENTRY.unpack_from(self._buf, i * INDEX_ENTRY.size)[0]
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Recording:
+    """Read side of a recording, memory-mapped; seek() is a binary search
+    over the index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._data = _map(path)
+        self._index = _map(index_path(path))
+        header = FILE_HEADER.unpack_from(self._data, 0) if len(self._data) >= FILE_HEADER.size else None
+        if header != (FILE_MAGIC, FILE_VERSION):
+            raise ValueError(f"{path} is not a recording")
+        self._times = _IndexTimes(self._index)
+        first = next(self.records(), None)
+        self.start = first[1] if first else 0.0
+        self.end = self._last_time()
+
+    def _last_time(self):
+        # The last indexed record is close to the end; scan on from there
+        end = self.start
+        for _, t, _ in self.records(self._entry(len(self._times) - 1)[1] if len(self._times) else None):
+            end = t
+        return end
+
+    def _entry(self, i):
+        return INDEX_ENTRY.unpack_from(self._index, i * INDEX_ENTRY.size)
+
+    def seek(self, t):
+        """Offset of the last playback start point at or before time t (the
+        first one if t is earlier)."""
+        i = bisect.bisect_right(self._times, t) - 1
+        if i < 0:
+            return self._entry(0)[1] if len(self._times) else FILE_HEADER.size
+        return self._entry(i)[1]
+
+    def records(self, offset=None):
+        """(kind, time, payload) from `offset` on; payloads are memoryviews
+        into the mapped file. The record at `offset` may be a checkpoint,
+        later checkpoints are skipped."""
+        offset = FILE_HEADER.size if offset is None else offset
+        view = memoryview(self._data)
+        first = True
+        while offset + RECORD_HEADER.size <= len(view):
+            kind, t, length = RECORD_HEADER.unpack_from(view, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > len(view):
+                break   # cut short while being written
+            offset = start + length
+            if kind == CHECKPOINT and not first:
+                continue
+            first = False
+            payload = view[start:offset]
+            yield kind, t, json.loads(bytes(payload)) if kind in (CONTROL, REGION) else payload
+
+    def close(self):
+        for m in (self._data, self._index):
+            if isinstance(m, mmap.mmap):
+                m.close()
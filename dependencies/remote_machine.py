@@ -1,104 +1,523 @@
 import os
 import sys
 import asyncio
+import argparse
 import ssl
 import json
+import time
 import websockets
-import mss
-import cv2
-import numpy as np
-import pyautogui
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+from dependencies.capture import parse_roi, DEFAULT_MONITOR
+from dependencies.control_protocol import decode_batch
+from dependencies.datagram import DatagramServer, STREAM_TIMEOUT
+from dependencies.encoders import available_codecs, DEFAULT_CODEC
+from dependencies.hosts import Host, parse_display
+from dependencies.injection import MAX_INJECT_RATE
+from dependencies.metrics import pack_frame
+from dependencies.mux import Multiplexer, CONTROL, CURSOR, VIDEO, TRANSFER
+from dependencies.pacing import MAX_FPS
+from dependencies.pipeline import ViewerStream, LatestFrame, ENCODE_WORKERS
+from dependencies.profiles import DEFAULT_PROFILE
+from dependencies.recording import Recorder, recording_path
+from dependencies.synthetic import SCENES
+from dependencies.transfer import TransferEndpoint, TRANSFER_DIR
 
 KEYS_FOLDER = os.path.join(os.getcwd(), 'keys')
+hosts = {}   # name -> Host; a single one unless serving several displays
+record_dir = None   # --record: where viewer sessions are recorded
+transfer_dir = TRANSFER_DIR   # --transfer-dir: where files from viewers go
+udp_server = None   # DatagramServer, unless --udp-port 0
 
 
-async def stream_handler(ws):
-    client = id(ws)
-    print(f"[{datetime.now()}] VIDEO client connected: {client}")
+async def cursor_sender(ws, host):
+    """Forward pointer changes to one viewer until cancelled."""
+    cursor_tracker = host.cursor
+    mailbox = LatestFrame()
+    cursor_tracker.subscribe(mailbox)
+    shape_version = 0
     try:
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            while True:
-                img = np.array(sct.grab(monitor))
-                ret, buf = cv2.imencode(
-                    '.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 100])
-                if not ret:
-                    continue
-                await ws.send(buf.tobytes())
-                await asyncio.sleep(1/30)
+        while True:
+            await mailbox.get()
+            if cursor_tracker.shape_version != shape_version:
+                shape_version = cursor_tracker.shape_version
+                await ws.send(cursor_tracker.shape)
+            await ws.send(cursor_tracker.position)
     except websockets.ConnectionClosed:
         pass
     finally:
-        print(f"[{datetime.now()}] VIDEO client disconnected: {client}")
+        await cursor_tracker.unsubscribe(mailbox)
+
+
+async def stream_handler(ws, host, client, profile, codec=DEFAULT_CODEC, meta=False,
+                         monitor=DEFAULT_MONITOR, roi=None, cursor_ws=None, resume=None):
+    # `resume` is (session token, last frame seq received) from a viewer
+    # that is reconnecting
+    sessions, video_streams = host.sessions, host.video_streams
+    session = sessions.resume(*resume) if resume else None
+    if session is not None:
+        stream = session.stream
+        print(f"[{datetime.now()}] VIDEO client resumed: {client} "
+              f"(profile {stream.profile}, codec {stream.codec})")
+    else:
+        try:
+            stream = ViewerStream(host.video_hub, profile, codec, monitor, roi)
+        except ValueError as e:
+            print(f"[{datetime.now()}] ❌ VIDEO client {client}: {e}, closing")
+            await ws.close()
+            return
+        # Only viewers that understand framed messages can resume
+        session = sessions.create(stream) if meta else None
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+            stream.recorder = Recorder(recording_path(record_dir, host.name, client))
+        print(f"[{datetime.now()}] VIDEO client connected: {client} "
+              f"(profile {profile}, codec {codec}, {host.video_hub.viewers + 1} watching)")
+    video_streams[client] = stream
+    region = None
+    failed = False
+    # Only viewers that understand framed messages get the cursor channel
+    cursor_task = asyncio.create_task(cursor_sender(cursor_ws or ws, host)) if meta else None
+    try:
+        if session is not None:
+            await ws.send(json.dumps({"type": "session", "token": session.token}))
+        while True:
+            # Full keyframe first, dirty tiles afterwards
+            frame, data = await stream.next_payload()
+            if data is None:
+                failed = True
+                break
+            recorder = stream.recorder
+            # Recordings are stamped with when things were sent: a frame can
+            # be older than ones already recorded (an idle pipeline's cached
+            # frame, after joining or switching pipelines)
+            sent_at = time.time()
+            if stream.region != region:
+                region = stream.region
+                if meta:
+                    # Tell the viewer where these frames sit on the remote desktop
+                    await ws.send(json.dumps(dict(region, type="region")))
+                if recorder is not None:
+                    recorder.region(sent_at, region)
+            payload = data
+            if meta:
+                data = pack_frame(frame.seq, frame.captured, data)
+            start = time.perf_counter()
+            await ws.send(data)
+            stream.sent(len(data), time.perf_counter() - start)
+            if session is not None:
+                session.record(frame)
+            if recorder is not None:
+                recorder.video(sent_at, payload)
+                if frame.standalone and not frame.is_key and recorder.checkpoint_due(sent_at):
+                    # A place to start playback from, encoded by the recorder
+                    recorder.checkpoint(sent_at, frame.keyframe)
+    except websockets.ConnectionClosed:
+        pass
+    except asyncio.CancelledError:
+        if session is None or session.owner is asyncio.current_task():
+            raise
+        # The viewer reconnected and took the session over; end this
+        # connection normally
+    finally:
+        if cursor_task is not None:
+            cursor_task.cancel()
+        if session is not None and session.owner is not asyncio.current_task():
+            pass   # taken over: the stream belongs to the new connection now
+        else:
+            if video_streams.get(client) is stream:
+                del video_streams[client]
+            if session is None:
+                await stream.close()
+            elif failed:
+                await sessions.close(session)
+            else:
+                sessions.detach(session)
+        print(f"[{datetime.now()}] VIDEO client disconnected: {client} "
+              f"({stream.dropped} frames dropped)")
+
+
+# ─── Control event handlers ──────────────────────────────────────────────────
+
+def on_mouse_move(ev, host, client):
+    host.input.moveTo(ev["x"], ev["y"])
+
+
+def on_mouse_click(ev, host, client):
+    if ev["action"] == "down":
+        host.input.mouseDown(button=ev["button"])
+    else:
+        host.input.mouseUp(button=ev["button"])
+
+
+def on_key(ev, host, client):
+    key, action = ev["key"], ev["action"]
+    # DEBUG PRINT
+    print(
+        f"DEBUG REMOTE: Received key event: {{'key': '{key}', 'action': '{action}'}}")
+    if action == "down":
+        host.input.keyDown(key)
+    else:
+        host.input.keyUp(key)
+
+
+def on_mouse_scroll(ev, host, client):
+    direction = ev["direction"]
+    if direction == "up":
+        host.input.scroll(1)
+    elif direction == "down":
+        host.input.scroll(-1)
 
 
-async def control_handler(ws):
-    client = id(ws)
+def on_mouse_dblclick(ev, host, client):
+    btn = ev["button"]
+    x = ev.get("x")
+    y = ev.get("y")
+    if x is not None and y is not None:
+        host.input.click(x=x, y=y, button=btn, clicks=2)
+    else:
+        host.input.click(button=btn, clicks=2)
+
+
+def on_set_profile(ev, host, client):
+    stream = host.video_streams.get(client)
+    if stream is None:
+        return
+    profile = ev.get("profile")
+    if not isinstance(profile, str):
+        print(f"[{datetime.now()}] ❌ Ignoring set_profile for profile {profile!r}")
+        return
+    try:
+        stream.set_profile(profile)
+        print(f"[{datetime.now()}] Client {client} switched to profile {profile}")
+    except ValueError as e:   # unknown profile
+        print(f"[{datetime.now()}] ❌ {e}")
+
+
+def on_set_region(ev, host, client):
+    stream = host.video_streams.get(client)
+    if stream is None:
+        return
+    monitor, roi = ev.get("monitor", DEFAULT_MONITOR), ev.get("roi")
+    if not isinstance(monitor, int):
+        print(f"[{datetime.now()}] ❌ Ignoring set_region for monitor {monitor!r}")
+        return
+    if roi is not None and not (isinstance(roi, (list, tuple)) and len(roi) == 4
+                                and all(isinstance(v, int) for v in roi)):
+        print(f"[{datetime.now()}] ❌ Ignoring set_region with roi {roi!r}")
+        return
+    try:
+        # capture_region checks the monitor is in range
+        stream.set_region(monitor, tuple(roi) if roi is not None else None)
+    except ValueError as e:
+        print(f"[{datetime.now()}] ❌ {e}")
+
+
+def on_keyframe_request(ev, host, client):
+    stream = host.video_streams.get(client)
+    if stream is not None:
+        stream.request_keyframe()
+
+
+def on_udp_loss(ev, host, client):
+    if udp_server is not None:
+        udp_server.report(ev.get("token"), ev.get("lost"), ev.get("received"))
+
+
+EVENT_HANDLERS = {
+    "mouse_move": on_mouse_move,
+    "mouse_click": on_mouse_click,
+    "key": on_key,
+    "mouse_scroll": on_mouse_scroll,
+    "mouse_dblclick": on_mouse_dblclick,
+    "set_profile": on_set_profile,
+    "keyframe": on_keyframe_request,
+    "set_region": on_set_region,
+    "udp_loss": on_udp_loss,
+}
+
+# These run on the host's injection thread, the rest on the event loop
+INPUT_EVENTS = {"mouse_move", "mouse_click", "key", "mouse_scroll", "mouse_dblclick"}
+
+
+def parse_control_message(msg):
+    """Binary messages are batches of records; text messages are one JSON event."""
+    if isinstance(msg, bytes):
+        return decode_batch(msg)
+    try:
+        return [json.loads(msg)]
+    except json.JSONDecodeError:
+        print(f"[{datetime.now()}] ❌ JSON parse error for: {msg!r}")
+        return []
+
+
+async def send_pong(ws, t):
+    try:
+        await ws.send(json.dumps({"type": "pong", "t": t, "server_time": time.time()}))
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def control_handler(ws, host, client):
     print(f"[{datetime.now()}] CONTROL client connected: {client}")
+    control_stats = host.control_stats
+    loop = asyncio.get_running_loop()
+    udp_tasks = set()
     try:
+        # Frames may be scaled down, so tell the viewer the real screen size
+        width, height = host.input.size()
+        await ws.send(json.dumps({"type": "screen", "width": width, "height": height,
+                                  "protocols": ["json", "binary"],
+                                  "codecs": available_codecs(),
+                                  "monitors": host.video_hub.monitors}))
+
         async for msg in ws:
-            try:
-                ev = json.loads(msg)
-            except json.JSONDecodeError:
-                print(f"[{datetime.now()}] ❌ JSON parse error for: {msg!r}")
-                continue
-
-            et = ev.get("type")
-            if et == "mouse_move":
-                x, y = ev["x"], ev["y"]
-                pyautogui.moveTo(x, y)
-            elif et == "mouse_click":
-                btn, action = ev["button"], ev["action"]
-                if action == "down":
-                    pyautogui.mouseDown(button=btn)
-                else:
-                    pyautogui.mouseUp(button=btn)
-            elif et == "key":
-                key, action = ev["key"], ev["action"]
-                # DEBUG PRINT
-                print(
-                    f"DEBUG REMOTE: Received key event: {{'key': '{key}', 'action': '{action}'}}")
-                if action == "down":
-                    pyautogui.keyDown(key)
-                else:
-                    pyautogui.keyUp(key)
-            elif et == "mouse_scroll":
-                direction = ev["direction"]
-                if direction == "up":
-                    pyautogui.scroll(1)
-                elif direction == "down":
-                    pyautogui.scroll(-1)
-            elif et == "mouse_dblclick":
-                btn = ev["button"]
-                x = ev.get("x")
-                y = ev.get("y")
-                if x is not None and y is not None:
-                    pyautogui.click(x=x, y=y, button=btn, clicks=2)
+            control_stats.count("messages")
+            for ev in parse_control_message(msg):
+                et = ev.get("type")
+                if et == "ping":
+                    t = ev.get("t")
+                    if not isinstance(t, (int, float)):
+                        print(f"[{datetime.now()}] ❌ Ignoring ping with t {t!r}")
+                        continue
+                    # Answered after everything queued before it was injected,
+                    # so the viewer measures the full input round trip
+                    host.injector.call_soon(
+                        loop, lambda t=t: asyncio.ensure_future(send_pong(ws, t)))
+                    continue
+                if et == "udp_video":
+                    task = asyncio.create_task(udp_video_handler(ws, host, client, ev))
+                    udp_tasks.add(task)
+                    task.add_done_callback(udp_tasks.discard)
+                    continue
+                handle = EVENT_HANDLERS.get(et)
+                if handle is None:
+                    print(f"[{datetime.now()}] ❓ Unknown event type: {et!r}")
+                    continue
+                control_stats.count("events")
+                stream = host.video_streams.get(client)
+                if stream is not None and stream.recorder is not None:
+                    stream.recorder.control(time.time(), ev)
+                if et in INPUT_EVENTS:
+                    host.injector.put(handle, ev, host, client, coalesce=et == "mouse_move")
                 else:
-                    pyautogui.click(button=btn, clicks=2)
-            else:
-                print(f"[{datetime.now()}] ❓ Unknown event type: {et!r}")
+                    handle(ev, host, client)
     except websockets.ConnectionClosed:
         pass
     finally:
+        for task in udp_tasks:
+            task.cancel()
         print(f"[{datetime.now()}] CONTROL client disconnected: {client}")
 
 
+async def udp_video_handler(ws, host, client, ev):
+    """Video over datagrams, negotiated on the viewer's control connection
+    `ws`; the pointer and text notices go over `ws` too."""
+    if udp_server is None:
+        await ws.send(json.dumps({"type": "udp_video", "error": "disabled on this server"}))
+        return
+    stream = udp_server.open(ws)
+    try:
+        await ws.send(json.dumps({"type": "udp_video", "port": udp_server.port,
+                                  "token": stream.token.hex(), "key": stream.key.hex()}))
+        try:
+            await asyncio.wait_for(stream.ready.wait(), STREAM_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[{datetime.now()}] UDP VIDEO client {client}: no hello, giving up")
+            return
+        print(f"[{datetime.now()}] UDP VIDEO client {client} at {stream.addr[0]}:{stream.addr[1]}")
+        params = {k: str(v) for k, v in (ev.get("params") or {}).items()}
+        await video_handler(stream, host, client, params, cursor_ws=ws)
+    finally:
+        udp_server.close(stream)
+
+
+async def transfer_handler(ws, host, client):
+    print(f"[{datetime.now()}] TRANSFER client connected: {client}")
+    endpoint = TransferEndpoint(ws, transfer_dir, host.transfer_stats, clipboard=host.clipboard)
+    try:
+        await endpoint.run()
+    finally:
+        print(f"[{datetime.now()}] TRANSFER client disconnected: {client}")
+
+
+async def video_handler(ws, host, client, params, cursor_ws=None):
+    try:
+        monitor = int(params.get("monitor", DEFAULT_MONITOR))
+        roi = parse_roi(params.get("roi"))
+        seq = int(params["seq"]) if params.get("seq") else None
+    except ValueError as e:
+        print(f"[{datetime.now()}] ❌ VIDEO client {client}: {e}, closing")
+        await ws.close()
+        return
+    await stream_handler(ws, host, client, params.get("profile", DEFAULT_PROFILE),
+                         params.get("codec", DEFAULT_CODEC),
+                         meta=params.get("meta") == "1", monitor=monitor, roi=roi,
+                         cursor_ws=cursor_ws,
+                         resume=(params["session"], seq) if params.get("session") else None)
+
+
+async def mux_handler(ws, host, client, params):
+    """Video, cursor, control and transfers for one viewer over a single
+    connection."""
+    # The server only ever reads control and transfers
+    mux = Multiplexer(ws, inbound=(CONTROL, TRANSFER))
+    mux.start()
+    tasks = [
+        asyncio.create_task(control_handler(mux.channel(CONTROL), host, client)),
+        asyncio.create_task(video_handler(mux.channel(VIDEO), host, client, params,
+                                          cursor_ws=mux.channel(CURSOR))),
+    ]
+    transfer = asyncio.create_task(transfer_handler(mux.channel(TRANSFER), host, client))
+    try:
+        # Either side ending (viewer gone, bad video request) ends both
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks + [transfer]:
+            task.cancel()
+        await asyncio.gather(*tasks, transfer, return_exceptions=True)
+        await mux.close()
+
+
 async def handler(ws):
-    path = ws.request.path
-    if path == "/video":
-        await stream_handler(ws)
-    elif path == "/control":
-        await control_handler(ws)
+    url = urlsplit(ws.request.path)
+    path = url.path
+    params = {k: v[0] for k, v in parse_qs(url.query).items()}
+    # Viewers tag both channels with the same id so control events can reach
+    # their video stream; older viewers fall back to one id per socket.
+    client = params.get("client", str(id(ws)))
+    # /<host>/<channel>; the host can be left out when there's only one
+    parts = path.strip("/").split("/")
+    if len(parts) == 1 and len(hosts) == 1:
+        host, channel = next(iter(hosts.values())), parts[0]
+    elif len(parts) == 2:
+        host, channel = hosts.get(parts[0]), parts[1]
+    else:
+        host, channel = None, None
+    if host is None:
+        print(f"[{datetime.now()}] No such host in path: {path}, closing")
+        await ws.close()
+    elif channel == "video":
+        await video_handler(ws, host, client, params)
+    elif channel == "control":
+        await control_handler(ws, host, client)
+    elif channel == "mux":
+        await mux_handler(ws, host, client, params)
+    elif channel == "transfer":
+        await transfer_handler(ws, host, client)
     else:
         print(f"[{datetime.now()}] Invalid path: {path}, closing")
         await ws.close()
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="AnyDesk clone remote machine server")
+    parser.add_argument("bind_ip", nargs="?", default="0.0.0.0")
+    parser.add_argument("port", nargs="?", type=int, default=8765)
+    parser.add_argument("max_fps", nargs="?", type=float, default=MAX_FPS,
+                        help="frame rate ceiling while the screen is changing")
+    parser.add_argument("--encode-workers", type=int, default=ENCODE_WORKERS,
+                        help="number of frame encode threads")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="seconds between JSON stats lines, 0 to disable")
+    parser.add_argument("--stats-file", default=None,
+                        help="append stats lines to this file instead of stdout")
+    parser.add_argument("--max-inject-rate", type=float, default=MAX_INJECT_RATE,
+                        help="input events injected per second per desktop, 0 for no limit "
+                             "(queued mouse moves are merged while waiting)")
+    parser.add_argument("--display", action="append", default=[], metavar="[NAME=]:N",
+                        help="serve this X display as host NAME (default: the display "
+                             "number); repeat for several desktops in one process")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="record every viewer's session to DIR, for "
+                             "python -m dependencies.player")
+    parser.add_argument("--transfer-dir", default=TRANSFER_DIR, metavar="DIR",
+                        help="where files sent by viewers are saved")
+    parser.add_argument("--udp-port", type=int, default=None,
+                        help="UDP port for viewers' datagram video (default: same number "
+                             "as the websocket port, 0 to disable)")
+    parser.add_argument("--udp-loss", type=float, default=0.0, metavar="SHARE",
+                        help="drop this share of outgoing UDP packets, for testing")
+    # Load testing (tests/soak.py): no real screen or input needed
+    parser.add_argument("--synthetic", choices=list(SCENES), default=None, metavar="SCENE",
+                        help="serve a generated scene instead of the screen and ignore "
+                             f"input ({', '.join(SCENES)})")
+    parser.add_argument("--synthetic-size", type=parse_size, default=(1920, 1080), metavar="WxH")
+    parser.add_argument("--change-fps", type=float, default=30.0,
+                        help="how often the synthetic scene changes per second")
+    return parser.parse_args()
+
+
+def parse_size(text):
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad size {text!r}, expected WxH")
+    return width, height
+
+
+async def stats_logger(interval, path):
+    while True:
+        await asyncio.sleep(interval)
+        line = {"time": datetime.now().isoformat()}
+        if len(hosts) == 1:
+            line.update(next(iter(hosts.values())).snapshot())
+        else:
+            line["hosts"] = {name: host.snapshot() for name, host in hosts.items()}
+        line = json.dumps(line)
+        if path:
+            with open(path, "a") as f:
+                f.write(line + "\n")
+        else:
+            print(line)
+
+
 async def main():
-    bind_ip = sys.argv[1] if len(sys.argv) > 1 else "0.0.0.0"
-    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    global record_dir, transfer_dir, udp_server
+    args = parse_args()
+    record_dir, transfer_dir = args.record, args.transfer_dir
+    bind_ip, port = args.bind_ip, args.port
+    encode_pool = ThreadPoolExecutor(args.encode_workers, thread_name_prefix="encode")
+    synthetic = None
+    if args.synthetic:
+        from dependencies import capture
+        from dependencies.synthetic import SyntheticScreen, NullInput
+        width, height = args.synthetic_size
+        capture.screen_source = lambda display: SyntheticScreen(
+            args.synthetic, width, height, args.change_fps)
+        synthetic = lambda: NullInput(width, height)
+    # Input backends are imported only when needed: pyautogui is slow to
+    # import and python-xlib only matters with --display
+    try:
+        for spec in args.display:
+            name, display = parse_display(spec)
+            if name in hosts:
+                raise ValueError(f"host name {name!r} used twice")
+            if synthetic:
+                injector_backend = synthetic()
+            else:
+                from dependencies.xinput import XDisplayInput
+                injector_backend = XDisplayInput(display)
+            hosts[name] = Host(name, display, injector_backend, encode_pool, args.max_fps,
+                               args.max_inject_rate)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not hosts:
+        if synthetic:
+            injector_backend = synthetic()
+        else:
+            import pyautogui
+            pyautogui.FAILSAFE = False
+            pyautogui.PAUSE = 0.001
+            injector_backend = pyautogui
+        hosts["default"] = Host("default", None, injector_backend, encode_pool, args.max_fps,
+                                args.max_inject_rate)
+    if synthetic:
+        for host in hosts.values():
+            host.clipboard = None
 
     ssl_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     try:
@@ -109,14 +528,36 @@ async def main():
         print("You can generate self-signed certificates using OpenSSL (e.g., openssl req -x509 -newkey rsa:4096 -nodes -out cert.pem -keyout key.pem -days 365)")
         sys.exit(1)
 
-    print(f"[{datetime.now()}] Starting server on {bind_ip}:{port}")
-    async with websockets.serve(handler, bind_ip, port, ssl=ssl_ctx):
-        await asyncio.Future()
+    print(f"[{datetime.now()}] Starting server on {bind_ip}:{port} "
+          f"(max {args.max_fps:g} fps, {args.encode_workers} encode workers, "
+          f"codecs: {', '.join(available_codecs())})")
+    if args.display:
+        for name, host in hosts.items():
+            print(f"[{datetime.now()}] Serving display {host.display} at /{name}/")
+    if args.synthetic:
+        print(f"[{datetime.now()}] Serving the synthetic {args.synthetic!r} scene "
+              f"({'x'.join(map(str, args.synthetic_size))}, changing {args.change_fps:g}/s); "
+              f"input is ignored")
+    # Kept so it can be cancelled on shutdown; the loop only holds tasks weakly
+    stats_task = None
+    if args.stats_interval > 0:
+        stats_task = asyncio.create_task(stats_logger(args.stats_interval, args.stats_file))
+    if args.udp_port != 0:
+        udp_port = args.udp_port or port
+        try:
+            _, udp_server = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: DatagramServer(args.udp_loss), local_addr=(bind_ip, udp_port))
+            print(f"[{datetime.now()}] Datagram video on UDP port {udp_server.port}")
+        except OSError as e:
+            print(f"[{datetime.now()}] ❌ No datagram video, UDP port {udp_port}: {e}")
+    try:
+        async with websockets.serve(handler, bind_ip, port, ssl=ssl_ctx):
+            await asyncio.Future()
+    finally:
+        if stats_task is not None:
+            stats_task.cancel()
 
 if __name__ == "__main__":
-    pyautogui.FAILSAFE = False
-    pyautogui.PAUSE = 0.001
-
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+
+from dependencies.cursor import default_shape
+from dependencies.delta import is_delta, apply_deltas
+from dependencies.encoders import is_av
+
+# ─── Viewer-side decode and render ───────────────────────────────────────────
+#
+# Kept free of any window/keyboard dependencies so it can run headless
+# (e.g. in tests/benchmark.py).
+
+
+def decode_pending(framebuffer, pending, av_decoder=None):
+    """Bring `framebuffer` up to date with the pending messages; returns the
+    new framebuffer, or None if there is nothing new to show.
+
+    Inter-frame codec messages go through `av_decoder` (an AvDecoder), which
+    raises ValueError when the viewer needs a fresh keyframe.
+    """
+    if is_av(pending[0]):
+        if av_decoder is None:
+            raise ValueError("no decoder for inter-frame video")
+        return av_decoder.decode(pending)
+    if not is_delta(pending[0]):
+        img = cv2.imdecode(np.frombuffer(pending[0], np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        apply_deltas(img, pending[1:])
+        return img
+    return framebuffer if apply_deltas(framebuffer, pending) else None
+
+
+class Letterbox:
+    """Scales frames into a preallocated window-sized buffer with black bars.
+
+    The geometry is only recomputed when the frame or window size changes;
+    otherwise each frame is resized straight into a view of the buffer, so
+    rendering allocates nothing. The geometry attributes are also what maps
+    window clicks back onto the frame.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.window = None
+        self.output = None
+        self.view = None
+        self.new_w, self.new_h = 0, 0
+        self.pad_horiz, self.pad_vert = 0, 0
+
+    def render(self, frame, win_w, win_h):
+        h, w = frame.shape[:2]
+        if self.key != (w, h, win_w, win_h):
+            self._layout(w, h, win_w, win_h)
+        cv2.resize(frame, (self.new_w, self.new_h), dst=self.view, interpolation=cv2.INTER_LINEAR)
+        return self.output
+
+    def _layout(self, w, h, win_w, win_h):
+        if w / h > win_w / win_h:
+            new_w, new_h = win_w, max(1, int(win_w * h / w))
+        else:
+            new_w, new_h = max(1, int(win_h * w / h)), win_h
+        pad_horiz = (win_w - new_w) // 2
+        pad_vert = (win_h - new_h) // 2
+        self.output = np.zeros((win_h, win_w, 3), np.uint8)
+        self.view = self.output[pad_vert:pad_vert + new_h, pad_horiz:pad_horiz + new_w]
+        self.new_w, self.new_h = new_w, new_h
+        self.pad_horiz, self.pad_vert = pad_horiz, pad_vert
+        self.key = (w, h, win_w, win_h)
+        self.window = (win_w, win_h)
+
+
+class CursorOverlay:
+    """Draws the remote pointer onto a Letterbox's output.
+
+    The pixels under the pointer are kept, so it can be moved by restoring
+    them and drawing again, without re-rendering the frame. Call invalidate()
+    whenever the frame under it was redrawn.
+    """
+
+    def __init__(self):
+        self.shape = default_shape()   # (BGRA image, hot_x, hot_y)
+        self._scaled = None            # (scale, image, hot_x, hot_y)
+        self._saved = None             # (y, x, pixels under the pointer)
+
+    def set_shape(self, image, hot_x, hot_y):
+        self.shape = (image, hot_x, hot_y)
+        self._scaled = None
+
+    def invalidate(self):
+        self._saved = None
+
+    def erase(self, output):
+        if self._saved is not None:
+            y, x, patch = self._saved
+            output[y:y + patch.shape[0], x:x + patch.shape[1]] = patch
+            self._saved = None
+
+    def _shape_at(self, scale):
+        if self._scaled is None or self._scaled[0] != scale:
+            img, hot_x, hot_y = self.shape
+            h, w = img.shape[:2]
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            self._scaled = (scale, cv2.resize(img, size, interpolation=cv2.INTER_AREA),
+                            round(hot_x * scale), round(hot_y * scale))
+        return self._scaled[1:]
+
+    def draw(self, output, letterbox, region, pos):
+        """Draw the pointer at remote desktop position `pos`, where the frame
+        shows `region` (left, top, width, height) of the remote desktop."""
+        left, top, width, height = region
+        lb = letterbox
+        if lb.new_w == 0 or width == 0:
+            return
+        scale = lb.new_w / width
+        img, hot_x, hot_y = self._shape_at(scale)
+        x = lb.pad_horiz + round((pos[0] - left) * scale) - hot_x
+        y = lb.pad_vert + round((pos[1] - top) * lb.new_h / height) - hot_y
+        # Clip to the frame area, the bars are never redrawn
+        x0, y0 = max(x, lb.pad_horiz), max(y, lb.pad_vert)
+        x1 = min(x + img.shape[1], lb.pad_horiz + lb.new_w)
+        y1 = min(y + img.shape[0], lb.pad_vert + lb.new_h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        dst = output[y0:y1, x0:x1]
+        self._saved = (y0, x0, dst.copy())
+        src = img[y0 - y:y1 - y, x0 - x:x1 - x]
+        alpha = src[..., 3:4].astype(np.float32) / 255
+        dst[:] = (src[..., :3] * alpha + dst * (1 - alpha)).astype(np.uint8)
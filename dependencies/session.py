@@ -0,0 +1,124 @@
+import asyncio
+import secrets
+import ssl
+from collections import deque
+from datetime import datetime
+
+# ─── Resumable sessions ──────────────────────────────────────────────────────
+#
+# A viewer that connects with `meta=1` is told a session token. If its
+# connection drops, the server keeps the viewer's stream (subscription,
+# profile, region, encoder state) for SESSION_TTL seconds. Reconnecting with
+# `session=<token>&seq=<last frame seq received>` picks that stream up again,
+# and the viewer gets a delta against the frame it already has rather than a
+# fresh keyframe.
+#
+# A viewer often reconnects before the server has noticed its old connection
+# is dead (a Wi-Fi blip or a new IP address, with pings taking ~40 s to time
+# out), so a valid token also takes a session over from the connection that
+# still has it.
+
+SESSION_TTL    = 30.0   # seconds a dropped viewer's stream is kept
+SESSION_FRAMES = 4      # recently sent frames remembered as resume points
+
+
+class Session:
+    def __init__(self, token, stream):
+        self.token = token
+        self.stream = stream
+        self.sent = deque(maxlen=SESSION_FRAMES)   # (pipeline, frame)
+        self.attached = True
+        self.owner = asyncio.current_task()   # the handler serving it
+        self._expiry = None
+
+    def record(self, frame):
+        """Remember a frame the viewer was sent, as a point to resume from."""
+        self.sent.append((self.stream.sub.pipeline, frame))
+
+    def base_for(self, seq):
+        """The sent frame the viewer last received, if it's still known and
+        from the pipeline the stream is on now."""
+        pipeline = self.stream.sub.pipeline if self.stream.sub else None
+        for sent_by, frame in reversed(self.sent):
+            if sent_by is pipeline and frame.seq == seq:
+                return frame
+        return None
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+
+    def create(self, stream):
+        session = Session(secrets.token_urlsafe(16), stream)
+        self._sessions[session.token] = session
+        return session
+
+    def resume(self, token, seq):
+        """Reattach a session to the calling handler, or None if there's no
+        such session (unknown or expired). A handler that still has it is
+        cancelled, and must leave the session alone from then on."""
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session.attached:
+            print(f"[{datetime.now()}] Session {session.token[:8]}… taken over "
+                  f"from its old connection")
+            session.owner.cancel()
+        else:
+            session._expiry.cancel()
+        session.attached = True
+        session.owner = asyncio.current_task()
+        base = session.base_for(seq) if seq is not None else None
+        if base is not None:
+            session.stream.resume_from(base)
+        else:
+            session.stream.request_keyframe()
+        return session
+
+    def detach(self, session):
+        """The viewer went away; keep its stream around for a while."""
+        session.attached = False
+        session._expiry = asyncio.get_running_loop().call_later(
+            self.ttl, lambda: asyncio.create_task(self._expire(session)))
+
+    async def _expire(self, session):
+        if session.attached or self._sessions.get(session.token) is not session:
+            return
+        del self._sessions[session.token]
+        await session.stream.close()
+        print(f"[{datetime.now()}] Session {session.token[:8]}… expired")
+
+    async def close(self, session):
+        self._sessions.pop(session.token, None)
+        await session.stream.close()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client TLS context that offers the previous connection's session on
+    the next handshake, so a reconnect skips the full key exchange.
+
+    asyncio has no per-connection session argument, but it creates every TLS
+    connection through wrap_bio, so the session is supplied there.
+    """
+
+    last = None   # SSLObject of the most recent connection
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side and self.last is not None:
+            session = self.last.session
+        try:
+            sslobj = super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+        except ValueError:   # session unusable with this context
+            sslobj = super().wrap_bio(incoming, outgoing, server_side, server_hostname)
+        self.last = sslobj
+        return sslobj
+
+
+def client_ssl_context():
+    """Like ssl._create_unverified_context(), with session reuse."""
+    ctx = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
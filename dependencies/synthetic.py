@@ -0,0 +1,178 @@
+import time
+
+import cv2
+import numpy as np
+
+# ─── Synthetic screen content ────────────────────────────────────────────────
+#
+# Deterministic BGRA frame sequences that look enough like a desktop to
+# exercise the encoder: mostly flat UI, sharp text and a moving region.
+# Each scene is a generator function taking (width, height, seed). Like
+# mss, generators reuse one buffer between frames, so callers that keep a
+# frame around must copy it (capture.to_bgr does).
+
+
+def _desktop(width, height, rng):
+    img = np.empty((height, width, 4), np.uint8)
+    ramp = np.linspace(90, 160, height, dtype=np.uint8)[:, None]
+    img[..., 0] = ramp
+    img[..., 1] = ramp // 2 + 40
+    img[..., 2] = 40
+    img[..., 3] = 255
+    # A few flat "windows" with title bars
+    for _ in range(4):
+        w, h = rng.integers(width // 5, width // 2), rng.integers(height // 5, height // 2)
+        x, y = rng.integers(0, width - w), rng.integers(0, height - h)
+        img[y:y + h, x:x + w, :3] = 235
+        img[y:y + 28, x:x + w, :3] = (120, 80, 40)
+    img[height - 40:, :, :3] = 30   # taskbar
+    return img
+
+
+def _text_page(width, height, rng):
+    page = np.full((height, width, 4), 255, np.uint8)
+    words = ["def", "return", "frame", "encode", "async", "await", "import",
+             "self", "numpy", "tile", "delta", "profile", "viewer", "0x7f"]
+    for y in range(22, height, 22):
+        line = " ".join(rng.choice(words, rng.integers(3, 12)))
+        cv2.putText(page, line, (12, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                    (20, 20, 20, 255), 1, cv2.LINE_AA)
+    return page
+
+
+def static(width, height, seed=0):
+    """An idle desktop: identical frames except a blinking text cursor."""
+    rng = np.random.default_rng(seed)
+    img = _desktop(width, height, rng)
+    caret = (slice(height // 2, height // 2 + 18), slice(width // 2, width // 2 + 2))
+    n = 0
+    while True:
+        img[caret[0], caret[1], :3] = 0 if (n // 15) % 2 else 235
+        yield img
+        n += 1
+
+
+def scrolling_text(width, height, seed=0, speed=6):
+    """A full-screen text document scrolling by `speed` pixels per frame."""
+    rng = np.random.default_rng(seed)
+    page = _text_page(width, height * 3, rng)
+    img = np.empty((height, width, 4), np.uint8)
+    offset = 0
+    while True:
+        rows = (np.arange(height) + offset) % page.shape[0]
+        np.take(page, rows, axis=0, out=img)
+        yield img
+        offset += speed
+
+
+def video(width, height, seed=0):
+    """A desktop with a 16:9 player window showing constantly moving content."""
+    rng = np.random.default_rng(seed)
+    img = _desktop(width, height, rng)
+    pw, ph = width // 2, width // 2 * 9 // 16
+    px, py = (width - pw) // 2, (height - ph) // 2
+    yy, xx = np.mgrid[0:ph, 0:pw].astype(np.float32)
+    t = 0.0
+    while True:
+        r = 115 + 115 * np.sin(xx / 37 + t)
+        g = 115 + 115 * np.sin(yy / 23 - t * 1.3)
+        b = 115 + 115 * np.sin((xx + yy) / 51 + t * 0.7)
+        noise = rng.integers(0, 24, (ph, pw), np.uint8)
+        img[py:py + ph, px:px + pw, 0] = b.astype(np.uint8) + noise
+        img[py:py + ph, px:px + pw, 1] = g.astype(np.uint8)
+        img[py:py + ph, px:px + pw, 2] = r.astype(np.uint8)
+        yield img
+        t += 0.15
+
+
+SCENES = {
+    "static": static,
+    "scrolling_text": scrolling_text,
+    "video": video,
+}
+
+
+def recorded(paths):
+    """Frames loaded from image files (e.g. screenshots), looped forever."""
+    frames = [cv2.cvtColor(cv2.imread(p, cv2.IMREAD_COLOR), cv2.COLOR_BGR2BGRA) for p in paths]
+    while True:
+        yield from frames
+
+
+# ─── Stand-ins for a real desktop ────────────────────────────────────────────
+#
+# `remote_machine --synthetic SCENE` serves these instead of the screen and
+# pyautogui, so load tests (tests/soak.py) need no desktop and move no mouse.
+
+class _Shot:
+    def __init__(self, img):
+        self.raw = img
+        self.height, self.width = img.shape[:2]
+
+
+class SyntheticScreen:
+    """Stands in for an mss instance: a single monitor showing `scene`,
+    whose content changes at most `change_fps` times a second."""
+
+    def __init__(self, scene="static", width=1920, height=1080, change_fps=30.0):
+        mon = {"left": 0, "top": 0, "width": width, "height": height}
+        self.monitors = [mon, dict(mon)]   # 0 is all monitors, like mss
+        self._frames = SCENES[scene](width, height)
+        self._img = next(self._frames)
+        self._interval = 1 / change_fps if change_fps > 0 else float("inf")
+        self._changed = time.perf_counter()
+
+    def grab(self, region):
+        now = time.perf_counter()
+        if now - self._changed >= self._interval:
+            self._img = next(self._frames)
+            self._changed = now
+        top, left = region["top"], region["left"]
+        img = self._img[top:top + region["height"], left:left + region["width"]]
+        return _Shot(np.ascontiguousarray(img))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullInput:
+    """Stands in for pyautogui: takes the same calls and injects nothing,
+    only keeping track of where the pointer would be."""
+
+    def __init__(self, width=1920, height=1080):
+        self._size = (width, height)
+        self._pos = (width // 2, height // 2)
+
+    def moveTo(self, x, y):
+        self._pos = (int(x), int(y))
+
+    def mouseDown(self, button="left"):
+        pass
+
+    def mouseUp(self, button="left"):
+        pass
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        if x is not None and y is not None:
+            self.moveTo(x, y)
+
+    def scroll(self, clicks):
+        pass
+
+    def keyDown(self, key):
+        pass
+
+    def keyUp(self, key):
+        pass
+
+    def position(self):
+        return self._pos
+
+    def size(self):
+        return self._size
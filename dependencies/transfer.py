@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+from datetime import datetime
+import websockets
+
+try:
+    import pyperclip
+except ImportError:   # no clipboard sync, file transfer still works
+    pyperclip = None
+
+# ─── Clipboard and file transfer ─────────────────────────────────────────────
+#
+# The transfer channel (mux channel TRANSFER, or its own /transfer
+# connection) is symmetric; both ends run a TransferEndpoint:
+#
+#   {"type": "clipboard", "text"}              our clipboard text changed
+#   {"type": "offer", "id", "name", "size"}    we have a file for you
+#   {"type": "accept", "id", "offset"}         send it, I have `offset` bytes
+#   {"type": "reject", "id", "reason"}         I can't take it
+#   "FC" id (16 bytes) offset (u64) data       a chunk of the file
+#   {"type": "ack", "id", "offset"}            I have written up to `offset`
+#
+# A file's id comes from its name, size and modification time, and the
+# receiver keeps what it got so far in DIR/.ID.part, so a transfer cut off
+# by a dropped connection picks up where it stopped when it is offered
+# again. The sender keeps at most TRANSFER_WINDOW bytes unacknowledged and
+# reads CHUNK bytes at a time, so files are never loaded whole. Over /mux
+# the channel has the lowest priority: input, pointer and video go first.
+#
+# Clipboard images arrive as PNG files in DIR, since there's no portable
+# way to put an image on the clipboard. The clipboard is polled by one
+# ClipboardWatcher per desktop, shared by every endpoint on it, because
+# reading it shells out on Linux.
+
+CHUNK_MAGIC     = b"FC"
+CHUNK_HEADER    = struct.Struct("<2s16sQ")
+CHUNK           = 64 * 1024
+TRANSFER_WINDOW = 1024 * 1024   # bytes in flight per file
+CLIPBOARD_POLL  = 0.5           # seconds between clipboard checks
+TRANSFER_DIR    = "received"
+
+
+def file_id(name, size, stamp):
+    return hashlib.sha1(f"{name}\0{size}\0{stamp}".encode()).hexdigest()[:16]
+
+
+class Outgoing:
+    """Something waiting to be sent: `open()` returns a binary file object
+    positioned at the start."""
+
+    def __init__(self, name, size, id, open):
+        self.name = name
+        self.size = size
+        self.id = id
+        self.open = open
+
+
+def outgoing_file(path):
+    st = os.stat(path)
+    name = os.path.basename(path)
+    return Outgoing(name, st.st_size, file_id(name, st.st_size, st.st_mtime_ns),
+                    lambda: open(path, "rb"))
+
+
+def outgoing_data(name, data):
+    return Outgoing(name, len(data), file_id(name, len(data), hashlib.sha1(data).hexdigest()),
+                    lambda: io.BytesIO(data))
+
+
+def unique_path(directory, name):
+    base, ext = os.path.splitext(name)
+    path, n = os.path.join(directory, name), 1
+    while os.path.exists(path):
+        path, n = os.path.join(directory, f"{base} ({n}){ext}"), n + 1
+    return path
+
+
+def report(verb, name, nbytes, seconds):
+    mib = nbytes / (1024 * 1024)
+    print(f"[{datetime.now()}] {verb} {name}: {mib:.1f} MiB in {seconds:.1f}s "
+          f"({mib / max(seconds, 1e-6):.1f} MiB/s)")
+
+
+# These run on executor threads: pyperclip shells out on Linux, and images
+# take a while to hash and compress
+
+def read_clipboard():
+    """(text, image, image digest) currently on the clipboard; any may be
+    None. The digest is cheap to compare; the image is only turned into a
+    PNG once it's known to be new."""
+    text = None
+    try:
+        text = pyperclip.paste()
+    except pyperclip.PyperclipException:
+        pass
+    try:
+        from PIL import Image, ImageGrab
+        image = ImageGrab.grabclipboard()
+    except (ImportError, NotImplementedError, OSError):
+        return text, None, None
+    if not isinstance(image, Image.Image):   # nothing, or a list of file names
+        return text, None, None
+    return text, image, hashlib.sha1(image.tobytes()).digest()
+
+
+def to_png(image):
+    buf = io.BytesIO()
+    image.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def write_clipboard(text):
+    try:
+        pyperclip.copy(text)
+    except pyperclip.PyperclipException as e:
+        print(f"[{datetime.now()}] ❌ Can't set the clipboard: {e}")
+
+
+class ClipboardWatcher:
+    """Polls the local clipboard while any endpoint is attached, and hands
+    changes to all of them."""
+
+    def __init__(self):
+        self.endpoints = set()
+        self._task = None
+        self._text = None
+        self._image = None   # digest
+
+    def attach(self, endpoint):
+        self.endpoints.add(endpoint)
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    def detach(self, endpoint):
+        self.endpoints.discard(endpoint)
+        if not self.endpoints and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def write(self, text, source):
+        """Put text from `source`'s peer on the clipboard, and pass it on to
+        the other endpoints."""
+        self._text = text   # so it isn't picked up as a local change
+        await asyncio.get_running_loop().run_in_executor(None, write_clipboard, text)
+        await self._send_text(text, self.endpoints - {source})
+
+    @staticmethod
+    async def _send_text(text, endpoints):
+        await asyncio.gather(*(ep.send_clipboard(text) for ep in endpoints),
+                             return_exceptions=True)
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        # What's on the clipboard when the first endpoint attaches stays
+        # put; only changes made after that are sent
+        self._text, _, self._image = await loop.run_in_executor(None, read_clipboard)
+        while True:
+            await asyncio.sleep(CLIPBOARD_POLL)
+            text, image, digest = await loop.run_in_executor(None, read_clipboard)
+            if text and text != self._text:
+                self._text = text
+                await self._send_text(text, set(self.endpoints))
+            if digest is not None and digest != self._image:
+                self._image = digest
+                png = await loop.run_in_executor(None, to_png, image)
+                item = outgoing_data(f"clipboard-{datetime.now():%Y%m%d-%H%M%S}.png", png)
+                for endpoint in self.endpoints:
+                    endpoint.send(item)
+
+
+class _Incoming:
+    def __init__(self, file, part, name, size, offset):
+        self.file = file
+        self.part = part
+        self.name = name
+        self.size = size
+        self.written = offset
+        self.acked = offset
+        self.resumed_at = offset
+        self.started = time.perf_counter()
+
+
+class TransferEndpoint:
+    """One end of a transfer channel.
+
+    Files to send are taken from `outbox` (a list of Outgoing), which the
+    caller may keep across reconnects so unfinished ones are offered again.
+    Received files go to `directory`. `stats` counts bytes each way.
+    Clipboard sync goes through `clipboard`, a ClipboardWatcher, if given.
+    """
+
+    def __init__(self, ws, directory, stats, outbox=None, clipboard=None):
+        self.ws = ws
+        self.directory = directory
+        self.stats = stats
+        self.outbox = outbox if outbox is not None else []
+        self.clipboard = clipboard if pyperclip is not None else None
+        self._acked = {}      # id -> offset the receiver has, None until accepted
+        self._errors = {}     # id -> why the receiver rejected it
+        self._ack_changed = asyncio.Event()
+        self._outbox_changed = asyncio.Event()
+        self._incoming = {}   # id -> _Incoming
+
+    def send(self, item):
+        """Queue an Outgoing; may be called while the endpoint runs."""
+        self.outbox.append(item)
+        self._outbox_changed.set()
+
+    async def send_clipboard(self, text):
+        await self.ws.send(json.dumps({"type": "clipboard", "text": text}))
+
+    async def run(self):
+        """Serve the channel until the connection closes."""
+        tasks = [asyncio.create_task(self._send_outbox())]
+        if self.clipboard is not None:
+            self.clipboard.attach(self)
+        try:
+            async for msg in self.ws:
+                if isinstance(msg, str):
+                    await self._handle_json(msg)
+                elif msg[:2] == CHUNK_MAGIC:
+                    await self._receive_chunk(msg)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if self.clipboard is not None:
+                self.clipboard.detach(self)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for inc in self._incoming.values():
+                inc.file.close()   # the .part file stays for a resume
+            self._incoming.clear()
+
+    async def _handle_json(self, msg):
+        try:
+            ev = json.loads(msg)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(ev, dict):
+            return
+        et, id = ev.get("type"), ev.get("id")
+        if et == "clipboard":
+            if self.clipboard is not None and isinstance(ev.get("text"), str):
+                await self.clipboard.write(ev["text"], self)
+        elif et == "offer":
+            await self._accept(ev)
+        elif not isinstance(id, str) or id not in self._acked:
+            return
+        elif et in ("accept", "ack"):
+            offset = ev.get("offset")
+            if isinstance(offset, int) and offset >= 0:
+                self._acked[id] = offset
+                self._ack_changed.set()
+        elif et == "reject":
+            self._errors[id] = str(ev.get("reason", "rejected"))
+            self._ack_changed.set()
+
+    # ── Sending ──
+
+    async def _send_outbox(self):
+        while True:
+            if not self.outbox:
+                self._outbox_changed.clear()
+                await self._outbox_changed.wait()
+                continue
+            item = self.outbox[0]
+            try:
+                await self._send(item)
+            except OSError as e:
+                print(f"[{datetime.now()}] ❌ Sending {item.name} failed: {e}")
+            # A dropped connection leaves it queued for the next one
+            self.outbox.remove(item)
+
+    async def _wait_acked(self, id, ready):
+        while True:
+            if id in self._errors:
+                raise OSError(self._errors.pop(id))
+            if self._acked[id] is not None and ready(self._acked[id]):
+                return self._acked[id]
+            self._ack_changed.clear()
+            await self._ack_changed.wait()
+
+    async def _send(self, item):
+        loop = asyncio.get_running_loop()
+        self._acked[item.id] = None
+        try:
+            await self.ws.send(json.dumps({"type": "offer", "id": item.id,
+                                           "name": item.name, "size": item.size}))
+            offset = start = await self._wait_acked(item.id, lambda acked: True)
+            started = time.perf_counter()
+            f = await loop.run_in_executor(None, item.open)
+            try:
+                await loop.run_in_executor(None, f.seek, offset)
+                while offset < item.size:
+                    await self._wait_acked(item.id, lambda acked: offset - acked < TRANSFER_WINDOW)
+                    data = await loop.run_in_executor(None, f.read, min(CHUNK, item.size - offset))
+                    if not data:
+                        raise OSError("file shrank while being sent")
+                    await self.ws.send(CHUNK_HEADER.pack(CHUNK_MAGIC, item.id.encode(), offset) + data)
+                    offset += len(data)
+                    self.stats.count("transfer_sent_bytes", len(data))
+            finally:
+                f.close()
+            await self._wait_acked(item.id, lambda acked: acked >= item.size)
+            report("Sent", item.name, item.size - start, time.perf_counter() - started)
+        finally:
+            del self._acked[item.id]
+
+    # ── Receiving ──
+
+    async def _reject(self, id, reason):
+        await self.ws.send(json.dumps({"type": "reject", "id": id, "reason": reason}))
+
+    async def _accept(self, ev):
+        id, size = str(ev.get("id", "")), ev.get("size")
+        name = os.path.basename(str(ev.get("name", "")))
+        if name in ("", ".", ".."):
+            name = id
+        if len(id) != 16 or not all(c in "0123456789abcdef" for c in id) \
+                or not isinstance(size, int) or size < 0:
+            await self._reject(id, "bad offer")
+            return
+        part = os.path.join(self.directory, f".{id}.part")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(part, "ab")
+            if f.tell() > size:   # not the file we were sent before
+                f.truncate(0)
+                f.seek(0)
+        except OSError as e:
+            await self._reject(id, str(e))
+            return
+        if id in self._incoming:
+            self._incoming.pop(id).file.close()
+        inc = self._incoming[id] = _Incoming(f, part, name, size, f.tell())
+        if inc.written:
+            print(f"[{datetime.now()}] Resuming {name} at {inc.written} of {size} bytes")
+        await self.ws.send(json.dumps({"type": "accept", "id": id, "offset": inc.written}))
+        if inc.written >= size:
+            await self._finish(id)
+
+    async def _receive_chunk(self, msg):
+        if len(msg) < CHUNK_HEADER.size:
+            return
+        _, id, offset = CHUNK_HEADER.unpack_from(msg, 0)
+        id = id.decode(errors="replace")
+        inc = self._incoming.get(id)
+        if inc is None or offset != inc.written:
+            return   # from an offer we've since dropped
+        data = memoryview(msg)[CHUNK_HEADER.size:]
+        await asyncio.get_running_loop().run_in_executor(None, inc.file.write, data)
+        inc.written += len(data)
+        self.stats.count("transfer_received_bytes", len(data))
+        if inc.written - inc.acked >= TRANSFER_WINDOW // 2 or inc.written >= inc.size:
+            inc.acked = inc.written
+            await self.ws.send(json.dumps({"type": "ack", "id": id, "offset": inc.written}))
+        if inc.written >= inc.size:
+            await self._finish(id)
+
+    async def _finish(self, id):
+        inc = self._incoming.pop(id)
+        inc.file.close()
+        path = unique_path(self.directory, inc.name)
+        os.replace(inc.part, path)
+        report("Received", path, inc.size - inc.resumed_at, time.perf_counter() - inc.started)
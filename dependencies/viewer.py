@@ -1,93 +1,491 @@
 import sys
 import threading
 import asyncio
-import ssl
 import json
-import queue
 import cv2
-import numpy as np
 import websockets
 from datetime import datetime
 from pynput import keyboard
 import time
 import string
+import uuid
+from urllib.parse import urlencode, urlsplit
 
 from dependencies.get_local_ip import get_private_ip_and_subnet # New import for string.printable
+from dependencies.capture import DEFAULT_MONITOR
+from dependencies.cursor import is_cursor, unpack_cursor
+from dependencies.datagram import DatagramReceiver, HELLO_INTERVAL, INCOMPLETE_TIMEOUT
+from dependencies.encoders import is_keyframe, available_codecs, AvDecoder, DEFAULT_CODEC
+from dependencies.render import decode_pending, Letterbox, CursorOverlay
+from dependencies.profiles import AUTO, AUTO_LADDER
+from dependencies.control_protocol import encode_event, coalesce_into
+from dependencies.metrics import Stats, ClockSync, unpack_frame
+from dependencies.mux import Multiplexer, CONTROL, CURSOR, VIDEO, TRANSFER
+from dependencies.session import client_ssl_context
+from dependencies.transfer import TransferEndpoint, ClipboardWatcher, outgoing_file, TRANSFER_DIR
+
+# ─── Frame Mailbox ───────────────────────────────────────────────────────────
+
+class FrameMailbox:
+    """Undecoded video messages waiting for the render loop.
+
+    Only what the next render needs is kept: a keyframe makes everything
+    queued before it obsolete, so those messages are dropped without ever
+    being decoded. Deltas after it are kept because they patch the frame.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = []
+        self.dropped = 0    # frames received but never shown
+
+    def put(self, data, captured=None):
+        with self._cond:
+            if is_keyframe(data):
+                self.dropped += len(self._pending)
+                self._pending.clear()
+            self._pending.append((data, captured))
+            self._cond.notify()
+
+    def wake(self):
+        """Make a waiting take() return early, e.g. to redraw the cursor."""
+        with self._cond:
+            self._cond.notify()
+
+    def take(self, timeout):
+        """Return all pending (message, capture time) pairs, oldest first and
+        a keyframe only ever in front, waiting up to `timeout` for one."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, []
+        if pending:
+            self.dropped += len(pending) - 1
+        return pending
+
+    def __len__(self):
+        return len(self._pending)
 
 # ─── Globals ─────────────────────────────────────────────────────────────────
 
-frame_q        = queue.Queue()     # incoming video frames
+frame_mailbox  = FrameMailbox()    # incoming video messages, decoded on render
 ctrl_ws        = None              # control WebSocket
 control_ready  = threading.Event() # set when control channel is open
 network_loop   = None              # the asyncio loop in the network thread
+client_id      = uuid.uuid4().hex  # ties our video and control channels together
+profile        = AUTO              # encoder profile requested from the server
+codec          = DEFAULT_CODEC     # video codec requested from the server
+KEYFRAME_RETRY = 1.0               # min seconds between keyframe requests
+# "mux" carries video, cursor and control over one connection, "split" uses
+# a separate /video and /control connection (for servers without /mux), and
+# "udp" is split with video over datagrams, falling back to /video if the
+# server doesn't offer it or nothing arrives
+TRANSPORTS     = ("mux", "split", "udp")
+transport      = "mux"
+UDP_OFFER_TIMEOUT = 2.0            # seconds to wait for the server's answer
+UDP_FIRST_PACKET  = 3.0            # seconds to wait for video before falling back
+UDP_STALL         = 3.0            # seconds without packets before falling back
+udp_offer      = None              # future for the server's udp_video answer
+last_loss_request = 0.0
+
+# Reconnecting: dropped connections are retried with exponential backoff,
+# reusing the TLS session, and the server resumes our stream from the last
+# frame we got (session token and seq), so no keyframe is needed
+tls_context    = client_ssl_context()
+session_token  = None              # from the server, once streaming
+last_seq       = None              # seq of the last video frame received
+RECONNECT_MIN  = 0.25              # seconds before the first retry
+RECONNECT_MAX  = 5.0
+RECONNECT_RESET = 10.0             # connected this long: start backoff over
+
+# Binary control batching: input records are collected and sent together,
+# with consecutive mouse moves collapsed to the latest position
+BATCH_INTERVAL = 1/60              # how long mouse moves may wait for a flush
+binary_control = False             # server advertised the binary protocol
+pending_batch  = []                # packed records waiting to be sent
+batch_lock     = threading.Lock()
+flush_scheduled = False
+
+# F8 cycles through these profiles locally instead of being sent to the remote
+PROFILE_CYCLE  = [AUTO] + AUTO_LADDER + ["text"]
+PROFILE_KEY    = keyboard.Key.f8
+
+# Metrics: F9 toggles the on-screen overlay (also not sent to the remote)
+STATS_KEY      = keyboard.Key.f9
+STATS_INTERVAL = 1.0               # seconds between overlay updates
+PING_INTERVAL  = 1.0               # seconds between input round-trip probes
+net_stats      = Stats()           # updated on the network thread
+render_stats   = Stats()           # updated on the render loop
+clock          = ClockSync()       # input RTT and server clock offset
+show_stats     = False
 
 # For mouse mapping
 remote_w, remote_h = None, None
-pad_vert, pad_horiz, new_w, new_h = 0, 0, 0, 0
+remote_region  = None              # (left, top, width, height) the frames show
+letterbox      = Letterbox()       # current frame-to-window geometry
+last_remote_pos = None             # last pointer position sent, remote coords
+
+# Remote pointer, drawn locally: it follows our own mouse right away and
+# takes the server's position again once we stop moving it
+cursor         = CursorOverlay()
+cursor_pos     = None              # remote coords
+cursor_dirty   = False             # needs redrawing
+local_move_time = 0.0
+CURSOR_HOLD    = 0.25              # seconds our moves win over server positions
+
+# Capture region: F7 cycles monitors (0 = all of them), F10 zooms in on the
+# area around the pointer so only that part is captured and encoded
+MONITOR_KEY    = keyboard.Key.f7
+ZOOM_KEY       = keyboard.Key.f10
+ZOOM_FACTOR    = 2
+monitors       = []                # remote mss monitor list, from the server
+monitor        = DEFAULT_MONITOR
+zoomed         = False
+
+# Clipboard text is kept in sync both ways; F6 picks files to send to the
+# remote. Files not fully sent when the connection drops are offered again
+# after reconnecting, and continue where they stopped
+SEND_FILE_KEY  = keyboard.Key.f6
+outgoing_files = []                # transfer.Outgoing, not yet fully sent
+transfer_endpoint = None           # while connected
+clipboard      = ClipboardWatcher()
 
 # Track currently pressed modifier keys to ensure proper down/up sequencing
 currently_pressed_modifiers = set()
 
 # ─── Asyncio Coroutines ──────────────────────────────────────────────────────
 
+def stream_params():
+    params = {"client": client_id, "profile": profile, "codec": codec, "monitor": monitor, "meta": 1}
+    if session_token is not None:
+        params["session"] = session_token
+        if last_seq is not None:
+            params["seq"] = last_seq
+    return params
+
+def stream_query():
+    return urlencode(stream_params())
+
+async def mux_loop(uri):
+    print(f"[{datetime.now()}] Connecting to {uri}/mux …")
+    async with websockets.connect(f"{uri}/mux?{stream_query()}", ssl=tls_context) as ws:
+        print(f"[{datetime.now()}] Connected to {uri}/mux")
+        mux = Multiplexer(ws)
+        mux.start()
+        try:
+            await asyncio.gather(
+                receive_video(mux.channel(VIDEO)),
+                receive_cursor(mux.channel(CURSOR)),
+                run_control(mux.channel(CONTROL)),
+                run_transfer(mux.channel(TRANSFER)),
+            )
+        finally:
+            await mux.close()
+
+async def split_loop(uri, video=None):
+    """Separate video, control and transfer connections; returns when video
+    or control drops."""
+    video = video or video_loop
+    tasks = [asyncio.create_task(video(uri)), asyncio.create_task(control_loop(uri))]
+    transfer = asyncio.create_task(transfer_loop(uri))
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks + [transfer]:
+            task.cancel()
+        await asyncio.gather(*tasks, transfer, return_exceptions=True)
+    for task in done:
+        task.result()  # re-raise a connection error
+
+async def udp_loop(uri):
+    await split_loop(uri, udp_video_loop)
+
+async def udp_video_loop(uri):
+    """Video over datagrams, negotiated on the control connection; falls
+    back to the /video websocket."""
+    global udp_offer
+    loop = asyncio.get_running_loop()
+    while not control_ready.is_set():
+        await asyncio.sleep(0.05)
+    udp_offer = loop.create_future()
+    send_json({"type": "udp_video", "params": stream_params()})
+    try:
+        offer = await asyncio.wait_for(udp_offer, UDP_OFFER_TIMEOUT)
+    except asyncio.TimeoutError:
+        offer = {"error": "no answer"}
+    if "error" in offer:
+        print(f"[{datetime.now()}] UDP video unavailable ({offer['error']}), using /video")
+        await video_loop(uri)
+        return
+    receiver = DatagramReceiver(bytes.fromhex(offer["token"]), bytes.fromhex(offer["key"]),
+                                handle_video_message, request_keyframe_after_loss)
+    udp, _ = await loop.create_datagram_endpoint(
+        lambda: receiver, remote_addr=(urlsplit(uri).hostname, offer["port"]))
+    print(f"[{datetime.now()}] VIDEO over UDP port {offer['port']}")
+    try:
+        started = time.monotonic()
+        while True:
+            # Video stops for good if the server's stream ends or the path
+            # changes under us (NAT rebinding); /video still works then
+            last = receiver.last_packet
+            if last is None and time.monotonic() - started > UDP_FIRST_PACKET:
+                print(f"[{datetime.now()}] No UDP video arriving, using /video")
+                break
+            if last is not None and time.monotonic() - last > UDP_STALL:
+                print(f"[{datetime.now()}] UDP video stopped, using /video")
+                break
+            receiver.hello()
+            if control_ready.is_set():
+                # Lets the server slow down when packets are being lost
+                send_json({"type": "udp_loss", "token": offer["token"],
+                           "lost": receiver.lost, "received": receiver.received})
+            for _ in range(int(HELLO_INTERVAL / INCOMPLETE_TIMEOUT)):
+                await asyncio.sleep(INCOMPLETE_TIMEOUT)
+                receiver.check()
+            net_stats.gauge("udp_lost", receiver.lost)
+    finally:
+        udp.close()
+    await video_loop(uri)
+
+def request_keyframe_after_loss():
+    global last_loss_request
+    now = time.perf_counter()
+    if control_ready.is_set() and now - last_loss_request > KEYFRAME_RETRY:
+        last_loss_request = now
+        send_json({"type": "keyframe"})
+
 async def video_loop(uri):
-    ssl_ctx = ssl._create_unverified_context()
-    async with websockets.connect(uri + "/video", ssl=ssl_ctx) as vws:
+    async with websockets.connect(f"{uri}/video?{stream_query()}", ssl=tls_context) as vws:
         print(f"[{datetime.now()}] VIDEO connected to {uri}/video")
-        try:
-            while True:
-                data = await vws.recv()
-                img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-                if img is not None:
-                    frame_q.put(img)
-        except websockets.ConnectionClosed:
-            print(f"[{datetime.now()}] VIDEO connection closed")
+        await receive_video(vws)
+
+async def receive_cursor(ws):
+    async for data in ws:
+        handle_cursor_message(data)
+
+async def receive_video(vws):
+    try:
+        while True:
+            data = await vws.recv()
+            if isinstance(data, str):
+                handle_server_message(data)
+                continue
+            if is_cursor(data):
+                handle_cursor_message(data)
+                continue
+            handle_video_message(data)
+    except websockets.ConnectionClosed:
+        print(f"[{datetime.now()}] VIDEO connection closed")
+
+def handle_video_message(data):
+    global last_seq
+    net_stats.count("frames")
+    net_stats.count("bytes", len(data))
+    seq, captured, data = unpack_frame(data)
+    last_seq = seq
+    # Decoding happens in the render loop, only for what gets shown
+    frame_mailbox.put(data, captured)
 
 async def control_loop(uri):
-    global ctrl_ws
-    ssl_ctx = ssl._create_unverified_context()
     print(f"[{datetime.now()}] Connecting CONTROL to {uri}/control …")
-    ctrl_ws = await websockets.connect(uri + "/control", ssl=ssl_ctx)
-    print(f"[{datetime.now()}] CONTROL connected")
+    async with websockets.connect(f"{uri}/control?client={client_id}", ssl=tls_context) as ws:
+        print(f"[{datetime.now()}] CONTROL connected")
+        await run_control(ws)
+
+async def run_control(ws):
+    global ctrl_ws
+    ctrl_ws = ws
     control_ready.set()
+    pinger = asyncio.create_task(ping_loop())
     try:
-        await ctrl_ws.wait_closed()
+        async for msg in ctrl_ws:
+            if isinstance(msg, bytes) and is_cursor(msg):
+                handle_cursor_message(msg)   # pointer comes this way with UDP video
+            else:
+                handle_server_message(msg)
+    except websockets.ConnectionClosed:
+        pass
     finally:
+        control_ready.clear()
+        pinger.cancel()
         print(f"[{datetime.now()}] CONTROL closed")
 
+async def transfer_loop(uri):
+    async with websockets.connect(f"{uri}/transfer?client={client_id}", ssl=tls_context) as ws:
+        print(f"[{datetime.now()}] TRANSFER connected")
+        await run_transfer(ws)
+
+async def run_transfer(ws):
+    global transfer_endpoint
+    transfer_endpoint = TransferEndpoint(ws, TRANSFER_DIR, net_stats, outgoing_files, clipboard)
+    try:
+        await transfer_endpoint.run()
+    finally:
+        transfer_endpoint = None
+
+async def ping_loop():
+    while True:
+        send_json({"type": "ping", "t": time.time()})
+        await asyncio.sleep(PING_INTERVAL)
+
+def handle_server_message(msg):
+    global remote_w, remote_h, binary_control, remote_region, monitors, session_token
+    try:
+        ev = json.loads(msg)
+    except json.JSONDecodeError:
+        return
+    if ev.get("type") == "screen":
+        # Frames may arrive scaled down; map the mouse to the real screen size
+        remote_w, remote_h = ev["width"], ev["height"]
+        binary_control = "binary" in ev.get("protocols", [])
+        monitors = ev.get("monitors", [])
+    elif ev.get("type") == "session":
+        session_token = ev["token"]
+    elif ev.get("type") == "region":
+        remote_region = (ev["left"], ev["top"], ev["width"], ev["height"])
+    elif ev.get("type") == "udp_video":
+        if udp_offer is not None and not udp_offer.done():
+            udp_offer.set_result(ev)
+    elif ev.get("type") == "pong":
+        net_stats.time("input_rtt", clock.pong(ev["t"], ev["server_time"]))
+
+def handle_cursor_message(data):
+    global cursor_pos, cursor_dirty
+    try:
+        kind, value = unpack_cursor(data)
+    except ValueError:
+        return
+    if kind == "shape":
+        cursor.set_shape(*value)
+    elif time.perf_counter() - local_move_time < CURSOR_HOLD:
+        return  # our own position is newer than what the server saw
+    else:
+        cursor_pos = value
+    cursor_dirty = True
+    frame_mailbox.wake()
+
 # ─── Network Thread Setup ────────────────────────────────────────────────────
 
-def start_network(ip, port):
+def start_network(ip, port, host=None):
     global network_loop
-    uri = f"wss://{ip}:{port}"
+    # A server with several desktops serves each under /<host>/
+    uri = f"wss://{ip}:{port}" + (f"/{host}" if host else "")
     network_loop = asyncio.new_event_loop()
     asyncio.set_event_loop(network_loop)
-    network_loop.run_until_complete(asyncio.gather(
-        video_loop(uri),
-        control_loop(uri)
-    ))
+    connect = {"mux": mux_loop, "split": split_loop, "udp": udp_loop}[transport]
+    delay = RECONNECT_MIN
+    while True:
+        started = time.perf_counter()
+        try:
+            network_loop.run_until_complete(connect(uri))
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+            print(f"[{datetime.now()}] Connection failed: {e}")
+        if time.perf_counter() - started > RECONNECT_RESET:
+            delay = RECONNECT_MIN
+        print(f"[{datetime.now()}] Reconnecting in {delay:.2f}s …")
+        time.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX)
 
 # ─── Control Sender ─────────────────────────────────────────────────────────
 
 def send_event(evt: dict):
+    global flush_scheduled
     if not control_ready.is_set():
         return
-    asyncio.run_coroutine_threadsafe(
-        ctrl_ws.send(json.dumps(evt)),
-        network_loop
-    )
+    record = encode_event(evt) if binary_control else None
+    if record is None:
+        network_loop.call_soon_threadsafe(send_json, evt)
+        return
+    # Clicks and keys go out right away, even with a flush for moves still
+    # pending; moves wait up to one batch interval
+    urgent = evt["type"] != "mouse_move"
+    with batch_lock:
+        coalesce_into(pending_batch, record)
+        if flush_scheduled and not urgent:
+            return
+        flush_scheduled = True
+    if urgent:
+        network_loop.call_soon_threadsafe(flush_batch)
+    else:
+        network_loop.call_soon_threadsafe(network_loop.call_later, BATCH_INTERVAL, flush_batch)
+
+# These two run on the network loop
+
+def flush_batch():
+    global flush_scheduled
+    with batch_lock:
+        data = b"".join(pending_batch)
+        pending_batch.clear()
+        flush_scheduled = False
+    if data:
+        network_loop.create_task(ctrl_ws.send(data))
+
+def send_json(evt):
+    flush_batch()  # keep ordering with records already batched
+    network_loop.create_task(ctrl_ws.send(json.dumps(evt)))
+
+# ─── Letterboxed Rendering ───────────────────────────────────────────────────
+
+WINDOW_NAME    = "Remote Desktop"
+DEFAULT_WINDOW = (1920, 1080)   # used until the window reports its real size
+
+def window_size():
+    try:
+        _, _, w, h = cv2.getWindowImageRect(WINDOW_NAME)
+    except cv2.error:
+        w = h = 0
+    return (w, h) if w > 0 and h > 0 else DEFAULT_WINDOW
+
+# ─── Stats Overlay ───────────────────────────────────────────────────────────
+
+def stats_lines():
+    net, render = net_stats.snapshot(), render_stats.snapshot()
+    return [
+        f"profile {profile}  recv {net.get('frames_per_s', 0):.1f} fps  "
+        f"{net.get('bytes_per_s', 0) / 1024:.0f} KiB/s",
+        f"shown {render.get('shown_per_s', 0):.1f} fps  "
+        f"decode {render.get('decode_ms', 0):.1f} ms  render {render.get('render_ms', 0):.1f} ms",
+        f"latency {render.get('latency_ms', 0):.0f} ms  "
+        f"input rtt {net.get('input_rtt_ms', 0):.0f} ms",
+        f"dropped {frame_mailbox.dropped}  queued {len(frame_mailbox)}",
+        f"transfer up {net.get('transfer_sent_bytes_per_s', 0) / 1024:.0f} KiB/s  "
+        f"down {net.get('transfer_received_bytes_per_s', 0) / 1024:.0f} KiB/s  "
+        f"files queued {len(outgoing_files)}",
+    ]
+
+def draw_overlay(img, lines):
+    for i, line in enumerate(lines):
+        org = (10, 24 + 22 * i)
+        cv2.putText(img, line, org, cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(img, line, org, cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 255, 0), 1, cv2.LINE_AA)
+
+def toggle_stats():
+    global show_stats
+    show_stats = not show_stats
+
+def draw_cursor(output):
+    global cursor_dirty
+    cursor_dirty = False
+    if cursor_pos is not None and remote_w is not None:
+        cursor.draw(output, letterbox, remote_region or (0, 0, remote_w, remote_h), cursor_pos)
 
 # ─── Mouse Callback (window‑local) ───────────────────────────────────────────
 
 def on_mouse(event, x, y, flags, param):
-    global remote_w, remote_h, pad_vert, pad_horiz, new_w, new_h
-    x_img = x - pad_horiz
-    y_img = y - pad_vert
-    if 0 <= x_img < new_w and 0 <= y_img < new_h:
-        remote_x = int(x_img * remote_w / new_w)
-        remote_y = int(y_img * remote_h / new_h)
+    global last_remote_pos, cursor_pos, cursor_dirty, local_move_time
+    lb = letterbox
+    x_img = x - lb.pad_horiz
+    y_img = y - lb.pad_vert
+    if 0 <= x_img < lb.new_w and 0 <= y_img < lb.new_h:
+        left, top, rw, rh = remote_region or (0, 0, remote_w, remote_h)
+        remote_x = left + int(x_img * rw / lb.new_w)
+        remote_y = top + int(y_img * rh / lb.new_h)
+        last_remote_pos = (remote_x, remote_y)
         if not control_ready.is_set(): return
         if event == cv2.EVENT_MOUSEMOVE:
+            # Move our copy of the pointer now rather than a round trip later
+            cursor_pos, cursor_dirty = last_remote_pos, True
+            local_move_time = time.perf_counter()
             send_event({"type":"mouse_move",  "x":remote_x, "y":remote_y})
         elif event == cv2.EVENT_LBUTTONDOWN:
             send_event({"type":"mouse_click","button":"left","action":"down"})
@@ -150,9 +548,83 @@ def get_pyautogui_key_name(key):
             print(f"Unhandled special key detected by pynput: {key}")
             return None # Return None for truly unhandled keys
 
+def cycle_profile():
+    global profile
+    i = PROFILE_CYCLE.index(profile) if profile in PROFILE_CYCLE else -1
+    profile = PROFILE_CYCLE[(i + 1) % len(PROFILE_CYCLE)]
+    print(f"[{datetime.now()}] Requesting encoder profile: {profile}")
+    send_event({"type": "set_profile", "profile": profile})
+
+def request_region(roi=None):
+    send_event({"type": "set_region", "monitor": monitor, "roi": roi})
+
+def cycle_monitor():
+    global monitor, zoomed
+    if len(monitors) < 2:
+        return
+    # 1..N are the individual monitors, 0 is all of them together
+    monitor = (monitor + 1) % len(monitors)
+    zoomed = False
+    print(f"[{datetime.now()}] Requesting monitor {monitor}")
+    request_region()
+
+def toggle_zoom():
+    global zoomed
+    if zoomed or not monitors or last_remote_pos is None:
+        zoomed = False
+        request_region()
+        return
+    mon = monitors[monitor]
+    w, h = mon["width"] // ZOOM_FACTOR, mon["height"] // ZOOM_FACTOR
+    x = min(max(0, last_remote_pos[0] - mon["left"] - w // 2), mon["width"] - w)
+    y = min(max(0, last_remote_pos[1] - mon["top"] - h // 2), mon["height"] - h)
+    zoomed = True
+    print(f"[{datetime.now()}] Requesting region {w}x{h}+{x}+{y} of monitor {monitor}")
+    request_region([x, y, w, h])
+
+def pick_files():
+    # Runs on its own thread so the dialog doesn't block input or rendering
+    import tkinter
+    from tkinter import filedialog
+    root = tkinter.Tk()
+    root.withdraw()
+    paths = filedialog.askopenfilenames(title="Send files to the remote")
+    root.destroy()
+    if paths and network_loop is not None:
+        network_loop.call_soon_threadsafe(queue_files, paths)
+
+def queue_files(paths):
+    # On the network loop
+    for path in paths:
+        try:
+            item = outgoing_file(path)
+        except OSError as e:
+            print(f"[{datetime.now()}] ❌ Can't send {path}: {e}")
+            continue
+        print(f"[{datetime.now()}] Sending {item.name} ({item.size} bytes)")
+        if transfer_endpoint is not None:
+            transfer_endpoint.send(item)
+        else:
+            outgoing_files.append(item)   # goes out once we're connected
+
+def send_files():
+    threading.Thread(target=pick_files, daemon=True).start()
+
+# Keys handled by the viewer itself and never sent to the remote
+LOCAL_KEYS = {
+    SEND_FILE_KEY: send_files,
+    MONITOR_KEY: cycle_monitor,
+    PROFILE_KEY: cycle_profile,
+    STATS_KEY: toggle_stats,
+    ZOOM_KEY: toggle_zoom,
+}
+
 def on_press(key):
     if not control_ready.is_set():
         return
+    if key in LOCAL_KEYS:
+        LOCAL_KEYS[key]()
+        return
     
     pyautogui_key = get_pyautogui_key_name(key)
     
@@ -170,6 +642,8 @@ def on_press(key):
 def on_release(key):
     if not control_ready.is_set():
         return
+    if key in LOCAL_KEYS:
+        return
     
     pyautogui_key = get_pyautogui_key_name(key)
     
@@ -190,54 +664,111 @@ def on_release(key):
 # ─── Main ────────────────────────────────────────────────────────────────────
 
 def main():
-    local_ip,subnet = get_private_ip_and_subnet()
-    ip   = sys.argv[1] if len(sys.argv)>1 else local_ip
+    global profile, codec, monitor, transport
+    if sys.argv[1:2] == ["--wait"]:
+        # Started ahead of time by the launcher, so all the imports are
+        # already done by the time it says where to connect
+        line = sys.stdin.readline()
+        if not line:
+            return
+        sys.argv[1:] = line.split()
+    ip   = sys.argv[1] if len(sys.argv)>1 else get_private_ip_and_subnet()[0]
     port = sys.argv[2] if len(sys.argv)>2 else "8000"
-
-    t = threading.Thread(target=start_network, args=(ip, port), daemon=True)
+    profile = sys.argv[3] if len(sys.argv)>3 else AUTO
+    codec   = sys.argv[4] if len(sys.argv)>4 else DEFAULT_CODEC
+    monitor = int(sys.argv[5]) if len(sys.argv)>5 else DEFAULT_MONITOR
+    transport = sys.argv[6] if len(sys.argv)>6 else "mux"
+    host    = sys.argv[7] if len(sys.argv)>7 else None
+    if transport not in TRANSPORTS:
+        print(f"Unknown transport {transport!r}, expected one of {', '.join(TRANSPORTS)}")
+        sys.exit(1)
+    if codec not in available_codecs():
+        print(f"Codec {codec!r} needs PyAV, which is not installed; using {DEFAULT_CODEC}")
+        codec = DEFAULT_CODEC
+
+    t = threading.Thread(target=start_network, args=(ip, port, host), daemon=True)
     t.start()
 
-    cv2.namedWindow("Remote Desktop", cv2.WINDOW_NORMAL)
-    cv2.setMouseCallback("Remote Desktop", on_mouse)
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(WINDOW_NAME, *DEFAULT_WINDOW)
+    cv2.setMouseCallback(WINDOW_NAME, on_mouse)
 
     keyboard_listener = keyboard.Listener(on_press=on_press, on_release=on_release)
     keyboard_listener.start()
 
-    desired_width = 1920
-    desired_height = 1080
-    global remote_w, remote_h, pad_vert, pad_horiz, new_w, new_h
+    global remote_w, remote_h
+    framebuffer = None  # last full remote frame, patched by deltas
+    av_decoder = AvDecoder()
+    last_key_request = 0.0
+    awaiting_key = False   # after a decode error, until a keyframe arrives
+    overlay = []
+    next_stats = time.perf_counter() + STATS_INTERVAL
     while True:
-        try:
-            frame = frame_q.get(timeout=0.05) 
-        except queue.Empty:
+        pointer_moved = cursor_dirty and letterbox.output is not None
+        pending = frame_mailbox.take(timeout=0 if pointer_moved else 0.05)
+        if pending and awaiting_key:
+            if is_keyframe(pending[0][0]):
+                awaiting_key = False
+            else:
+                # Deltas against a picture we failed to decode would leave a
+                # mix of old and new tiles on screen
+                frame_mailbox.dropped += 1   # take() counted all but the last
+                pending = []
+                now = time.perf_counter()
+                if now - last_key_request > KEYFRAME_RETRY:
+                    send_event({"type": "keyframe"})
+                    last_key_request = now
+        if pending:
+            start = time.perf_counter()
+            try:
+                frame = decode_pending(framebuffer, [data for data, _ in pending], av_decoder)
+            except ValueError as e:
+                frame = None
+                awaiting_key = True
+                if start - last_key_request > KEYFRAME_RETRY:
+                    print(f"[{datetime.now()}] Video {e}, requesting a keyframe")
+                    send_event({"type": "keyframe"})
+                    last_key_request = start
+            render_stats.time("decode", time.perf_counter() - start)
+            if frame is not None:
+                framebuffer = frame
+                captured = pending[-1][1]
+                if captured is not None and clock.rtt is not None:
+                    render_stats.time("latency", time.time() + clock.offset - captured)
+        else:
             if not t.is_alive():
                 print("Network thread died, exiting viewer.")
                 break
             frame = None
 
+        if time.perf_counter() >= next_stats:
+            next_stats += STATS_INTERVAL
+            overlay = stats_lines()
+            if show_stats and frame is None:
+                frame = framebuffer  # refresh the overlay on an idle screen
+
+        win_w, win_h = window_size()
+        if frame is None and framebuffer is not None and (win_w, win_h) != letterbox.window:
+            frame = framebuffer  # window was resized, redraw the idle screen
+
         if frame is not None:
             h, w = frame.shape[:2]
             if remote_w is None or remote_h is None:
                 remote_w, remote_h = w, h
-            aspect_original = w / h
-            aspect_desired = desired_width / desired_height
-
-            if aspect_original > aspect_desired:
-                new_w = desired_width
-                new_h = int(desired_width / aspect_original)
-                resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-                pad_vert = (desired_height - new_h) // 2
-                pad_horiz = 0
-                output = cv2.copyMakeBorder(resized, pad_vert, desired_height - new_h - pad_vert, 0, 0, cv2.BORDER_CONSTANT, value=[0,0,0])
-            else:
-                new_h = desired_height
-                new_w = int(desired_height * aspect_original)
-                resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-                pad_horiz = (desired_width - new_w) // 2
-                pad_vert = 0
-                output = cv2.copyMakeBorder(resized, 0, 0, pad_horiz, desired_width - new_w - pad_horiz, cv2.BORDER_CONSTANT, value=[0,0,0])
-
-            cv2.imshow("Remote Desktop", output)
+            start = time.perf_counter()
+            output = letterbox.render(frame, win_w, win_h)
+            cursor.invalidate()
+            if show_stats:
+                draw_overlay(letterbox.view, overlay)
+            draw_cursor(output)
+            cv2.imshow(WINDOW_NAME, output)
+            render_stats.time("render", time.perf_counter() - start)
+            render_stats.count("shown")
+        elif cursor_dirty and letterbox.output is not None:
+            # Pointer-only change: move it over the frame already on screen
+            cursor.erase(letterbox.output)
+            draw_cursor(letterbox.output)
+            cv2.imshow(WINDOW_NAME, letterbox.output)
 
         key_press = cv2.waitKey(1) & 0xFF
         if key_press == 27:
@@ -251,7 +782,7 @@ def main():
     if keyboard_listener.is_alive():
         keyboard_listener.stop()
         keyboard_listener.join()
-    print("Viewer exiting…")
+    print(f"Viewer exiting… ({frame_mailbox.dropped} frames dropped)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
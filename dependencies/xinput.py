@@ -0,0 +1,96 @@
+import threading
+
+try:
+    from Xlib import X, XK
+    from Xlib import display as xdisplay
+    from Xlib.ext import xtest
+except ImportError:   # python-xlib is only needed to serve several displays
+    xdisplay = None
+
+# ─── Input for a given X display ─────────────────────────────────────────────
+#
+# pyautogui injects into whichever display $DISPLAY named when it was
+# imported, so a server with several desktops needs its own injector per
+# display. XDisplayInput offers the pyautogui calls remote_machine makes,
+# with the same key and button names, sent through the XTEST extension.
+
+# pyautogui key names whose X keysym name differs
+KEYSYM_NAMES = {
+    "enter": "Return", "return": "Return", "backspace": "BackSpace", "tab": "Tab",
+    "escape": "Escape", "esc": "Escape", "space": "space", "delete": "Delete",
+    "home": "Home", "end": "End", "pageup": "Prior", "pagedown": "Next",
+    "up": "Up", "down": "Down", "left": "Left", "right": "Right",
+    "control": "Control_L", "ctrl": "Control_L", "alt": "Alt_L",
+    "shift": "Shift_L", "win": "Super_L", "insert": "Insert",
+}
+BUTTONS = {"left": 1, "middle": 2, "right": 3}
+SCROLL_UP, SCROLL_DOWN = 4, 5
+
+
+class XDisplayInput:
+    """pyautogui-style input injection into the X display `name` (":1")."""
+
+    def __init__(self, name):
+        if xdisplay is None:
+            raise ValueError("python-xlib is required to serve more than one display")
+        self.name = name
+        self._display = xdisplay.Display(name)
+        # One connection, used from the event loop and the cursor thread
+        self._lock = threading.Lock()
+
+    def _keycode(self, key):
+        if len(key) == 1:
+            # Latin-1 keysyms are the code points; the rest are offset
+            keysym = ord(key) if ord(key) < 0x100 else 0x01000000 + ord(key)
+        elif key.startswith("f") and key[1:].isdigit():
+            keysym = XK.string_to_keysym(key.upper())
+        else:
+            keysym = XK.string_to_keysym(KEYSYM_NAMES.get(key, key))
+        return self._display.keysym_to_keycode(keysym) if keysym else 0
+
+    def _fake(self, event, detail=0, **kwargs):
+        with self._lock:
+            xtest.fake_input(self._display, event, detail, **kwargs)
+            self._display.sync()
+
+    def moveTo(self, x, y):
+        self._fake(X.MotionNotify, x=int(x), y=int(y))
+
+    def mouseDown(self, button="left"):
+        self._fake(X.ButtonPress, BUTTONS[button])
+
+    def mouseUp(self, button="left"):
+        self._fake(X.ButtonRelease, BUTTONS[button])
+
+    def click(self, x=None, y=None, button="left", clicks=1):
+        if x is not None and y is not None:
+            self.moveTo(x, y)
+        for _ in range(clicks):
+            self.mouseDown(button)
+            self.mouseUp(button)
+
+    def scroll(self, clicks):
+        button = SCROLL_UP if clicks > 0 else SCROLL_DOWN
+        for _ in range(abs(clicks)):
+            self._fake(X.ButtonPress, button)
+            self._fake(X.ButtonRelease, button)
+
+    def keyDown(self, key):
+        # Like pyautogui, keys this display has no keycode for are ignored
+        code = self._keycode(key)
+        if code:
+            self._fake(X.KeyPress, code)
+
+    def keyUp(self, key):
+        code = self._keycode(key)
+        if code:
+            self._fake(X.KeyRelease, code)
+
+    def position(self):
+        with self._lock:
+            pointer = self._display.screen().root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def size(self):
+        screen = self._display.screen()
+        return screen.width_in_pixels, screen.height_in_pixels
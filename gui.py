@@ -1,20 +1,32 @@
 import tkinter as tk
 from tkinter import messagebox
-import socket
 import subprocess
+import threading
 import sys
 import os
-import cv2
 
 from dependencies.get_local_ip import get_private_ip_and_subnet
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class LauncherGUI(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("AnyDesk Clone Launcher")
-        self.geometry("300x250")
+        self.geometry("300x280")
         self.resizable(False, False)
-        self.local_ip, subnet = get_private_ip_and_subnet()
+        # Finding the local IP can take a moment (or time out offline), so it
+        # runs in the background and the fields are filled in when it's known
+        self.local_ip = ""
+        self.ip_ready = threading.Event()
+        threading.Thread(target=self.detect_ip, daemon=True).start()
+        self.after(50, self.fill_detected_ip)
+
+        # A viewer started ahead of time, with its imports done, waiting on
+        # stdin for where to connect
+        self.prewarm_var = tk.BooleanVar(value=True)
+        self.warm_viewer = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         # Role selection
         self.role_var = tk.StringVar(value="client")
         self.client_radio = tk.Radiobutton(self, text="Connect to Remote", variable=self.role_var,
@@ -32,6 +44,23 @@ class LauncherGUI(tk.Tk):
         self.server_process = None
         self.render_frame()
 
+    def detect_ip(self):
+        ip, subnet = get_private_ip_and_subnet()
+        self.local_ip = ip or ""
+        self.ip_ready.set()
+
+    def fill_detected_ip(self):
+        if not self.ip_ready.is_set():
+            self.after(50, self.fill_detected_ip)
+            return
+        for name in ("ip_entry", "override_entry"):
+            entry = getattr(self, name, None)
+            if entry is not None and entry.winfo_exists() and not entry.get():
+                entry.insert(0, self.local_ip)
+        label = getattr(self, "local_ip_label", None)
+        if label is not None and label.winfo_exists():
+            label.config(text=f"Local IP: {self.local_ip or 'unknown'}")
+
     def render_frame(self):
         for widget in self.frm.winfo_children():
             widget.destroy()
@@ -48,16 +77,20 @@ class LauncherGUI(tk.Tk):
             self.port_entry.insert(0, "8000")
             self.port_entry.grid(row=1, column=1)
 
+            tk.Checkbutton(self.frm, text="Pre-start viewer", variable=self.prewarm_var,
+                           command=self.prewarm_viewer).grid(row=2, column=0, columnspan=2)
+
             self.connect_btn = tk.Button(self.frm, text="Connect",
                       command=self.start_client)
-            self.connect_btn.grid(row=2, column=0, columnspan=2, pady=10)
+            self.connect_btn.grid(row=3, column=0, columnspan=2, pady=10)
+            self.prewarm_viewer()
         else:
-            local_ip = self.get_local_ip()
-            tk.Label(self.frm, text=f"Local IP: {local_ip}").pack()
+            self.local_ip_label = tk.Label(self.frm, text=f"Local IP: {self.local_ip or 'detecting…'}")
+            self.local_ip_label.pack()
 
             tk.Label(self.frm, text="Override IP (optional):").pack(pady=(5,0))
             self.override_entry = tk.Entry(self.frm)
-            self.override_entry.insert(0, local_ip)
+            self.override_entry.insert(0, self.local_ip)
             self.override_entry.pack()
 
             tk.Label(self.frm, text="Port:").pack(pady=(5,0))
@@ -77,24 +110,36 @@ class LauncherGUI(tk.Tk):
         self.client_radio.config(state="normal")
         self.server_radio.config(state="normal")
 
-    def get_local_ip(self):
+    def prewarm_viewer(self):
+        if not self.prewarm_var.get():
+            self.discard_warm_viewer()
+            return
+        if self.warm_viewer is not None and self.warm_viewer.poll() is None:
+            return
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-        except:
-            ip = self.local_ip
-        return ip
+            self.warm_viewer = subprocess.Popen(
+                [sys.executable, "-m", "dependencies.viewer", "--wait"],
+                cwd=BASE_DIR, stdin=subprocess.PIPE)
+        except OSError:
+            self.warm_viewer = None
+
+    def discard_warm_viewer(self):
+        if self.warm_viewer is not None and self.warm_viewer.poll() is None:
+            self.warm_viewer.terminate()
+        self.warm_viewer = None
 
     def start_client(self):
         ip = self.ip_entry.get().strip()
         port = self.port_entry.get().strip()
-        base = os.path.dirname(os.path.abspath(__file__))
-        viewer_path = os.path.join(base, "viewer.py")
-        cmd = [sys.executable, viewer_path, ip, port]
+        warm, self.warm_viewer = self.warm_viewer, None
         try:
-            self.viewer_process = subprocess.Popen(cmd, cwd=base)
+            if warm is not None and warm.poll() is None:
+                warm.stdin.write(f"{ip} {port}\n".encode())
+                warm.stdin.close()
+                self.viewer_process = warm
+            else:
+                cmd = [sys.executable, "-m", "dependencies.viewer", ip, port]
+                self.viewer_process = subprocess.Popen(cmd, cwd=BASE_DIR)
             self.show_client_connected(ip, port)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start viewer:\n{e}")
@@ -136,11 +181,11 @@ class LauncherGUI(tk.Tk):
     def start_server(self):
         ip = self.override_entry.get().strip()
         port = self.port_entry.get().strip()
-        base = os.path.dirname(os.path.abspath(__file__))
-        server_path = os.path.join(base, "remote_machine.py")
-        cmd = [sys.executable, server_path, ip, port]
+        # A pre-started viewer isn't needed on this machine
+        self.discard_warm_viewer()
+        cmd = [sys.executable, "-m", "dependencies.remote_machine", ip, port]
         try:
-            self.server_process = subprocess.Popen(cmd, cwd=base, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.server_process = subprocess.Popen(cmd, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             self.show_server_running(ip, port)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start server:\n{e}")
@@ -164,6 +209,10 @@ class LauncherGUI(tk.Tk):
             self.server_process = None
         self.show_initial_page()
 
+    def on_close(self):
+        self.discard_warm_viewer()
+        self.destroy()
+
 if __name__ == '__main__':
     app = LauncherGUI()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""Offline benchmark for the capture -> encode -> transport -> decode -> render path.
+
+Runs headless: frames come from dependencies.synthetic (or image files via
+--frames), are encoded exactly like remote_machine does, sent over a loopback
+websocket and decoded/rendered exactly like the viewer does. Each frame goes
+through the stages one after another, so wall and CPU time are attributed to
+a single stage.
+
+    python -m tests.benchmark                      # all scenes, default profile
+    python -m tests.benchmark --scene video --profile low --count 600
+    python -m tests.benchmark --codec h264
+    python -m tests.benchmark --frames shots/*.png --compare bench_results/old.json
+
+Results are saved as JSON under bench_results/ and compared with the
+previous run.
+"""
+import os
+import json
+import glob
+import time
+import asyncio
+import argparse
+import platform
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import websockets
+
+from dependencies.capture import FramePool, to_bgr
+from dependencies.encoders import create_encoder, available_codecs, AvDecoder, DEFAULT_CODEC
+from dependencies.metrics import pack_frame, unpack_frame
+from dependencies.pipeline import ENCODE_WORKERS
+from dependencies.profiles import PROFILES, DEFAULT_PROFILE
+from dependencies.render import decode_pending, Letterbox
+from dependencies.synthetic import SCENES, recorded
+
+RESULTS_DIR = "bench_results"
+STAGES = ["capture", "encode", "transport", "decode", "render"]
+
+
+class StageTimer:
+    def __init__(self):
+        self.wall = {s: [] for s in STAGES}
+        self.cpu = {s: [] for s in STAGES}
+
+    def run(self, stage, fn, *args):
+        w, c = time.perf_counter(), time.process_time()
+        result = fn(*args)
+        self.add(stage, time.perf_counter() - w, time.process_time() - c)
+        return result
+
+    def add(self, stage, wall, cpu):
+        self.wall[stage].append(wall)
+        self.cpu[stage].append(cpu)
+
+
+def _ms(values):
+    return round(float(np.mean(values)) * 1000, 3) if values else 0.0
+
+
+async def loopback():
+    """A websocket server and client connected to each other on 127.0.0.1."""
+    conn = asyncio.get_running_loop().create_future()
+
+    async def handler(ws):
+        conn.set_result(ws)
+        await ws.wait_closed()
+
+    server = await websockets.serve(handler, "127.0.0.1", 0, max_size=None, compression=None)
+    port = server.sockets[0].getsockname()[1]
+    client = await websockets.connect(f"ws://127.0.0.1:{port}", max_size=None, compression=None)
+    return server, await conn, client
+
+
+async def run_scene(frames, count, profile, codec, pool, window):
+    server, sender, receiver = await loopback()
+    timer = StageTimer()
+    latencies, sizes = [], []
+    framebuffer = None
+    encoder = create_encoder(codec, profile, pool)
+    decoder = AvDecoder()
+    letterbox = Letterbox()
+    frame_pool = FramePool()
+    held = None   # captured frame the encoder still diffs against
+
+    def capture(bgra):
+        # Same conversion as ScreenGrabber, minus the mss grab
+        return to_bgr(bgra, profile.size_for(bgra.shape[1], bgra.shape[0]), frame_pool)
+
+    start = time.perf_counter()
+    try:
+        for seq in range(1, count + 1):
+            t0 = time.perf_counter()
+            img = timer.run("capture", capture, next(frames))
+            data = timer.run("encode", encoder.encode, img)
+            for buf in (held, img):
+                if buf is not None and not encoder.holds(buf):
+                    frame_pool.release(buf)
+            held = img if encoder.holds(img) else held
+            if data is None:
+                continue   # unchanged screen, nothing goes on the wire
+
+            w, c = time.perf_counter(), time.process_time()
+            await sender.send(pack_frame(seq, time.time(), data))
+            _, _, payload = unpack_frame(await receiver.recv())
+            timer.add("transport", time.perf_counter() - w, time.process_time() - c)
+
+            frame = timer.run("decode", decode_pending, framebuffer, [payload], decoder)
+            if frame is None:
+                continue
+            framebuffer = frame
+            timer.run("render", letterbox.render, frame, *window)
+            latencies.append(time.perf_counter() - t0)
+            sizes.append(len(data))
+    finally:
+        encoder.close()
+        await receiver.close()
+        server.close()
+        await server.wait_closed()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames": count,
+        "sent": len(sizes),
+        "fps": round(count / elapsed, 2),
+        "bytes_per_frame": round(float(np.mean(sizes)), 1) if sizes else 0.0,
+        "bytes_per_s": round(sum(sizes) / elapsed, 1),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3) if latencies else 0.0,
+        "latency_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3) if latencies else 0.0,
+        "stage_wall_ms": {s: _ms(timer.wall[s]) for s in STAGES},
+        "stage_cpu_ms": {s: _ms(timer.cpu[s]) for s in STAGES},
+    }
+
+
+def print_results(results, baseline=None):
+    keys = ["fps", "bytes_per_frame", "latency_p50_ms", "latency_p99_ms"]
+    for scene, r in results["scenes"].items():
+        print(f"\n{scene}: {r['sent']}/{r['frames']} frames sent")
+        base = (baseline or {}).get("scenes", {}).get(scene)
+        for k in keys:
+            line = f"  {k:<16} {r[k]:>12,.2f}"
+            if base and base.get(k):
+                line += f"   ({(r[k] - base[k]) / base[k] * 100:+.1f}% vs baseline)"
+            print(line)
+        print("  stage            wall ms     cpu ms")
+        for s in STAGES:
+            print(f"  {s:<12} {r['stage_wall_ms'][s]:>10.3f} {r['stage_cpu_ms'][s]:>10.3f}")
+
+
+def latest_result(directory):
+    files = sorted(glob.glob(os.path.join(directory, "bench-*.json")))
+    return files[-1] if files else None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scene", choices=list(SCENES) + ["all"], default="all")
+    parser.add_argument("--frames", nargs="+", help="image files to use instead of a synthetic scene")
+    parser.add_argument("--count", type=int, default=300, help="frames per scene")
+    parser.add_argument("--size", default="1920x1080", help="synthetic capture size")
+    parser.add_argument("--window", default="1920x1080", help="viewer window size")
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--codec", choices=available_codecs(), default=DEFAULT_CODEC)
+    parser.add_argument("--encode-workers", type=int, default=ENCODE_WORKERS)
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for result files")
+    parser.add_argument("--compare", help="result file to compare against (default: latest in --out)")
+    parser.add_argument("--no-save", action="store_true")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    width, height = map(int, args.size.split("x"))
+    window = tuple(map(int, args.window.split("x")))
+    profile = PROFILES[args.profile]
+
+    if args.frames:
+        sources = {"recorded": lambda: recorded(args.frames)}
+    else:
+        names = list(SCENES) if args.scene == "all" else [args.scene]
+        sources = {n: (lambda n=n: SCENES[n](width, height)) for n in names}
+
+    results = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(),
+                 "cpus": os.cpu_count()},
+        "args": {"count": args.count, "size": args.size, "window": args.window,
+                 "profile": args.profile, "codec": args.codec,
+                 "encode_workers": args.encode_workers},
+        "scenes": {},
+    }
+    with ThreadPoolExecutor(args.encode_workers, thread_name_prefix="encode") as pool:
+        for name, source in sources.items():
+            print(f"[{datetime.now()}] Running {name} ({args.count} frames)…")
+            results["scenes"][name] = await run_scene(source(), args.count, profile, args.codec,
+                                                      pool, window)
+
+    baseline_path = args.compare or latest_result(args.out)
+    baseline = None
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print(f"\nComparing with {baseline_path}")
+    print_results(results, baseline)
+
+    if not args.no_save:
+        os.makedirs(args.out, exist_ok=True)
+        path = os.path.join(args.out, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
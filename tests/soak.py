@@ -0,0 +1,373 @@
+"""Soak/load test for remote_machine with simulated viewers.
+
+Starts remote_machine with --synthetic (a generated scene instead of the
+screen, input ignored) and connects N simulated viewers over /mux. Each one
+receives video and pointer updates and sends a human-like input stream
+(pointer moves and drags, clicks, typing, scrolling) plus pings. Every
+--interval seconds it reports server CPU, memory and threads alongside
+per-viewer fps, bandwidth, capture-to-receive latency and input round trip.
+
+    python -m tests.soak                                    # 10 viewers, 10 minutes
+    python -m tests.soak --viewers 50 --ramp 10 --scene video --duration 14400
+    python -m tests.soak --server-pid 1234 --port 8765      # a server already running
+
+Viewers join one every --ramp seconds, and the summary shows fps by number
+of viewers connected, so the point where the server stops keeping up is
+visible. It also gives the server's memory growth per hour after --warmup,
+which is what gives a leak away on long runs. Samples are saved as JSON
+lines under bench_results/, next to the server's own stats and log.
+
+The server needs cert.pem and key.pem in the repository root, as usual.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime
+import numpy as np
+import psutil
+import websockets
+
+from dependencies.control_protocol import encode_event
+from dependencies.encoders import available_codecs, AvDecoder, DEFAULT_CODEC
+from dependencies.metrics import Stats, unpack_frame
+from dependencies.mux import Multiplexer, CONTROL, CURSOR, VIDEO
+from dependencies.profiles import PROFILES, DEFAULT_PROFILE
+from dependencies.render import decode_pending
+from dependencies.session import client_ssl_context
+from dependencies.synthetic import SCENES
+
+BASE_DIR        = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR     = "bench_results"
+PING_INTERVAL   = 1.0
+MOVE_INTERVAL   = 1 / 60   # pointer updates while "moving the mouse"
+RECONNECT_DELAY = 1.0
+SERVER_START    = 30.0     # seconds to wait for the server to listen
+
+KEYS = list("abcdefghijklmnopqrstuvwxyz      ") + ["enter", "backspace", "shift"]
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+class SimViewer:
+    """One simulated viewer; reconnects whenever its connection drops."""
+
+    def __init__(self, n, uri, profile, codec, decode=False):
+        self.name = f"viewer{n}"
+        self.uri = uri
+        self.query = f"client={uuid.uuid4().hex}&profile={profile}&codec={codec}&meta=1"
+        self.decode = decode
+        self.rng = random.Random(n)
+        self.stats = Stats()
+        self.latencies = []   # capture-to-receive seconds since the last sample
+        self.rtts = []        # input round trips since the last sample
+        self.connected = False
+        self.disconnects = 0
+        self.error = None
+        self._ctx = client_ssl_context()
+
+    async def run(self):
+        while True:
+            try:
+                async with websockets.connect(f"{self.uri}/mux?{self.query}", ssl=self._ctx) as ws:
+                    mux = Multiplexer(ws, inbound=(VIDEO, CURSOR, CONTROL))
+                    mux.start()
+                    self.connected = True
+                    try:
+                        await asyncio.gather(self._video(mux.channel(VIDEO)),
+                                             self._cursor(mux.channel(CURSOR)),
+                                             self._control(mux.channel(CONTROL)))
+                    finally:
+                        self.connected = False
+                        await mux.close()
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                self.error = str(e)
+            self.disconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def sample(self):
+        snap = self.stats.snapshot()
+        latencies, self.latencies = self.latencies, []
+        rtts, self.rtts = self.rtts, []
+        return {
+            "connected": self.connected,
+            "fps": snap.get("frames_per_s", 0.0),
+            "kib_per_s": round(snap.get("bytes_per_s", 0.0) / 1024, 1),
+            "cursor_per_s": snap.get("cursor_per_s", 0.0),
+            "decode_ms": snap.get("decode_ms"),
+            "latency_p50_ms": percentile(latencies, 50),
+            "latency_p99_ms": percentile(latencies, 99),
+            "input_rtt_p50_ms": percentile(rtts, 50),
+            "disconnects": self.disconnects,
+        }
+
+    async def _video(self, ws):
+        loop = asyncio.get_running_loop()
+        decoder, framebuffer = AvDecoder(), None
+        try:
+            while True:
+                data = await ws.recv()
+                if isinstance(data, str):
+                    continue   # session and region notices
+                received = time.time()
+                _, captured, payload = unpack_frame(data)
+                self.stats.count("frames")
+                self.stats.count("bytes", len(data))
+                if captured is not None:
+                    # Same machine, so the server's clock is ours
+                    self.latencies.append(received - captured)
+                if self.decode:
+                    start = time.perf_counter()
+                    try:
+                        frame = await loop.run_in_executor(
+                            None, decode_pending, framebuffer, [payload], decoder)
+                    except ValueError:
+                        frame = None   # waits for the next keyframe
+                    if frame is not None:
+                        framebuffer = frame
+                    self.stats.time("decode", time.perf_counter() - start)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _cursor(self, ws):
+        async for _ in ws:
+            self.stats.count("cursor")
+
+    async def _control(self, ws):
+        try:
+            screen = json.loads(await ws.recv())
+            tasks = [asyncio.create_task(self._ping(ws)),
+                     asyncio.create_task(self._input(ws, screen["width"], screen["height"],
+                                                     "binary" in screen.get("protocols", [])))]
+            try:
+                async for msg in ws:
+                    ev = json.loads(msg) if isinstance(msg, str) else {}
+                    if ev.get("type") == "pong":
+                        self.rtts.append(time.time() - ev["t"])
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _ping(self, ws):
+        while True:
+            await ws.send(json.dumps({"type": "ping", "t": time.time()}))
+            await asyncio.sleep(PING_INTERVAL)
+
+    async def _input(self, ws, width, height, binary):
+        """Roughly what a person does: move and drag the pointer, click,
+        type in bursts, scroll, and pause."""
+        rng = self.rng
+        pos = [width // 2, height // 2]
+
+        async def send(ev):
+            record = encode_event(ev) if binary else None
+            await ws.send(record if record is not None else json.dumps(ev))
+
+        async def move_to(x, y, seconds):
+            steps = max(1, int(seconds / MOVE_INTERVAL))
+            sx, sy = pos
+            for i in range(1, steps + 1):
+                t = i / steps
+                t = t * t * (3 - 2 * t)   # ease in and out
+                pos[:] = int(sx + (x - sx) * t), int(sy + (y - sy) * t)
+                await send({"type": "mouse_move", "x": pos[0], "y": pos[1]})
+                await asyncio.sleep(MOVE_INTERVAL)
+
+        while True:
+            action = rng.choices(["move", "drag", "click", "type", "scroll", "idle"],
+                                 [30, 5, 20, 20, 10, 15])[0]
+            if action in ("move", "drag"):
+                target = rng.randrange(width), rng.randrange(height)
+                if action == "drag":
+                    await send({"type": "mouse_click", "button": "left", "action": "down"})
+                await move_to(*target, rng.uniform(0.2, 1.2))
+                if action == "drag":
+                    await send({"type": "mouse_click", "button": "left", "action": "up"})
+            elif action == "click":
+                button = "right" if rng.random() < 0.1 else "left"
+                if rng.random() < 0.15:
+                    await send({"type": "mouse_dblclick", "button": button, "x": pos[0], "y": pos[1]})
+                else:
+                    await send({"type": "mouse_click", "button": button, "action": "down"})
+                    await asyncio.sleep(rng.uniform(0.05, 0.12))
+                    await send({"type": "mouse_click", "button": button, "action": "up"})
+            elif action == "type":
+                for _ in range(rng.randint(5, 40)):
+                    key = rng.choice(KEYS)
+                    await send({"type": "key", "key": key, "action": "down"})
+                    await asyncio.sleep(rng.uniform(0.04, 0.09))
+                    await send({"type": "key", "key": key, "action": "up"})
+                    await asyncio.sleep(rng.uniform(0.03, 0.15))
+            elif action == "scroll":
+                direction = rng.choice(["up", "down"])
+                for _ in range(rng.randint(3, 10)):
+                    await send({"type": "mouse_scroll", "direction": direction})
+                    await asyncio.sleep(0.1)
+            await asyncio.sleep(rng.uniform(0.1, 0.5) if action != "idle" else rng.uniform(0.5, 3))
+
+
+def server_sample(proc):
+    with proc.oneshot():
+        sample = {
+            "cpu_percent": proc.cpu_percent(None),
+            "rss_mib": round(proc.memory_info().rss / (1024 * 1024), 1),
+            "threads": proc.num_threads(),
+        }
+        if hasattr(proc, "num_fds"):
+            sample["fds"] = proc.num_fds()
+    return sample
+
+
+def summarize(samples, warmup):
+    line = lambda fps: f"{min(fps):.1f} min / {np.mean(fps):.1f} avg fps" if fps else "no frames"
+    print("\nfps per viewer by viewers connected:")
+    by_count = {}
+    for s in samples:
+        fps = [v["fps"] for v in s["viewers"].values() if v["connected"]]
+        if fps:
+            by_count.setdefault(len(fps), []).extend(fps)
+    for count in sorted(by_count):
+        print(f"  {count:>4}  {line(by_count[count])}")
+
+    settled = [s for s in samples if s["elapsed"] >= warmup]
+    if len(settled) >= 2:
+        t = [s["elapsed"] / 3600 for s in settled]
+        rss = [s["server"]["rss_mib"] for s in settled]
+        slope = np.polyfit(t, rss, 1)[0]
+        print(f"\nserver rss {rss[0]:.1f} -> {rss[-1]:.1f} MiB after warmup "
+              f"({slope:+.1f} MiB/h), peak cpu "
+              f"{max(s['server']['cpu_percent'] for s in settled):.0f}%")
+    disconnects = sum(v["disconnects"] for v in samples[-1]["viewers"].values()) if samples else 0
+    print(f"disconnects: {disconnects}")
+
+
+def wait_for_port(port, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            return False
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--viewers", type=int, default=10)
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds between viewers joining")
+    parser.add_argument("--duration", type=float, default=600, help="seconds to run")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between reports")
+    parser.add_argument("--warmup", type=float, default=60,
+                        help="seconds left out of the memory growth figure")
+    parser.add_argument("--scene", choices=list(SCENES), default="scrolling_text")
+    parser.add_argument("--size", default="1920x1080", help="synthetic screen size")
+    parser.add_argument("--change-fps", type=float, default=30.0,
+                        help="how often the scene changes per second")
+    parser.add_argument("--max-fps", type=float, default=30.0)
+    parser.add_argument("--profile", choices=list(PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--codec", choices=available_codecs(), default=DEFAULT_CODEC)
+    parser.add_argument("--decode", action="store_true",
+                        help="also decode every frame, as a real viewer would (costs CPU here)")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--server-pid", type=int,
+                        help="measure this running server instead of starting one")
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for result files")
+    parser.add_argument("--verbose", action="store_true", help="print every viewer each report")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    stamp = f"{datetime.now():%Y%m%d-%H%M%S}"
+    os.makedirs(args.out, exist_ok=True)
+    samples_path = os.path.join(args.out, f"soak-{stamp}.jsonl")
+
+    server = log = None
+    if args.server_pid:
+        proc = psutil.Process(args.server_pid)
+    else:
+        log = open(os.path.join(args.out, f"soak-{stamp}-server.log"), "w")
+        cmd = [sys.executable, "-m", "dependencies.remote_machine", "127.0.0.1", str(args.port),
+               str(args.max_fps), "--synthetic", args.scene, "--synthetic-size", args.size,
+               "--change-fps", str(args.change_fps), "--stats-interval", str(args.interval),
+               "--stats-file", os.path.abspath(os.path.join(args.out, f"soak-{stamp}-server.jsonl"))]
+        server = subprocess.Popen(cmd, cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+        if not wait_for_port(args.port, server, SERVER_START):
+            server.kill()
+            print(f"Server did not start, see {log.name}")
+            sys.exit(1)
+        proc = psutil.Process(server.pid)
+    proc.cpu_percent(None)   # starts the measurement
+
+    uri = f"wss://127.0.0.1:{args.port}"
+    viewers = [SimViewer(n, uri, args.profile, args.codec, args.decode) for n in range(args.viewers)]
+    tasks = []
+    samples = []
+    print(f"[{datetime.now()}] Soaking server pid {proc.pid} with {args.viewers} viewers "
+          f"for {args.duration:g}s ({args.scene}, {args.size}, {args.profile}/{args.codec})")
+    start = time.monotonic()
+    next_viewer = next_sample = start
+    try:
+        with open(samples_path, "w") as out:
+            while time.monotonic() - start < args.duration:
+                now = time.monotonic()
+                if len(tasks) < len(viewers) and now >= next_viewer:
+                    tasks.append(asyncio.create_task(viewers[len(tasks)].run()))
+                    next_viewer = now + args.ramp
+                if now >= next_sample + args.interval:
+                    next_sample = now
+                    if not proc.is_running() or (server and server.poll() is not None):
+                        print(f"[{datetime.now()}] ❌ Server exited")
+                        break
+                    sample = {"time": datetime.now().isoformat(timespec="seconds"),
+                              "elapsed": round(now - start, 1),
+                              "server": server_sample(proc),
+                              "viewers": {v.name: v.sample() for v in viewers[:len(tasks)]}}
+                    samples.append(sample)
+                    out.write(json.dumps(sample) + "\n")
+                    out.flush()
+                    report(sample, args.verbose)
+                await asyncio.sleep(0.1)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if server is not None:
+            server.terminate()
+            server.wait()
+            log.close()
+    summarize(samples, args.warmup)
+    print(f"\nSaved {samples_path}")
+
+
+def report(sample, verbose):
+    srv, viewers = sample["server"], sample["viewers"]
+    connected = [v for v in viewers.values() if v["connected"]]
+    fps = [v["fps"] for v in connected]
+    lat = [v["latency_p50_ms"] for v in connected if v["latency_p50_ms"] is not None]
+    rtt = [v["input_rtt_p50_ms"] for v in connected if v["input_rtt_p50_ms"] is not None]
+    print(f"[{sample['time']}] {sample['elapsed']:>7.0f}s  viewers {len(connected)}/{len(viewers)}  "
+          f"cpu {srv['cpu_percent']:.0f}%  rss {srv['rss_mib']:.1f} MiB  threads {srv['threads']}  "
+          f"fps {min(fps, default=0):.1f}-{max(fps, default=0):.1f}  "
+          f"latency {np.median(lat) if lat else 0:.0f} ms  input rtt {np.median(rtt) if rtt else 0:.0f} ms")
+    if verbose:
+        for name, v in viewers.items():
+            print(f"    {name:<10} {json.dumps(v)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Binary control records: round trips, coalescing and bad input.
+
+    python -m unittest tests.test_control_protocol
+"""
+import unittest
+
+from dependencies.control_protocol import (
+    encode_event, decode_batch, coalesce_into, RECORD, MOUSE_CLICK, MOUSE_DBLCLICK, KEY,
+    DOWN, NAMED_KEY_BASE, NAMED_KEYS,
+)
+
+EVENTS = [
+    {"type": "mouse_move", "x": 10, "y": -20},
+    {"type": "mouse_click", "button": "right", "action": "down"},
+    {"type": "mouse_click", "button": "left", "action": "up"},
+    {"type": "mouse_dblclick", "button": "middle", "x": 5, "y": 6},
+    {"type": "mouse_dblclick", "button": "left"},
+    {"type": "mouse_scroll", "direction": "up"},
+    {"type": "mouse_scroll", "direction": "down"},
+    {"type": "key", "key": "a", "action": "down"},
+    {"type": "key", "key": "é", "action": "up"},
+    {"type": "key", "key": "f12", "action": "down"},
+]
+
+
+class RoundTrip(unittest.TestCase):
+    def test_events_survive_a_batch(self):
+        data = b"".join(encode_event(ev) for ev in EVENTS)
+        self.assertEqual(decode_batch(data), EVENTS)
+
+    def test_no_binary_form(self):
+        self.assertIsNone(encode_event({"type": "set_profile", "profile": "low"}))
+        self.assertIsNone(encode_event({"type": "key", "key": "notakey", "action": "down"}))
+
+    def test_trailing_partial_record_is_ignored(self):
+        data = encode_event(EVENTS[0]) + b"\x01\x02"
+        self.assertEqual(decode_batch(data), EVENTS[:1])
+
+
+class BadRecords(unittest.TestCase):
+    def test_invalid_records_are_dropped(self):
+        good = encode_event(EVENTS[7])
+        data = b"".join([
+            RECORD.pack(MOUSE_CLICK, 7, 0, 0),                        # no such button
+            RECORD.pack(MOUSE_DBLCLICK, 0x3f, 0, 0),
+            RECORD.pack(KEY, DOWN, -1, 0),                            # negative code
+            RECORD.pack(KEY, DOWN, 0x110000, 0),                      # past Unicode
+            RECORD.pack(KEY, DOWN, NAMED_KEY_BASE + len(NAMED_KEYS), 0),
+            good,
+        ])
+        self.assertEqual(decode_batch(data), [EVENTS[7]])
+
+    def test_unknown_type_is_reported(self):
+        self.assertEqual(decode_batch(RECORD.pack(99, 0, 0, 0)), [{"type": "unknown:99"}])
+
+
+class Coalescing(unittest.TestCase):
+    def test_moves_merge_but_not_across_other_events(self):
+        move = lambda x: encode_event({"type": "mouse_move", "x": x, "y": 0})
+        click = encode_event(EVENTS[1])
+        batch = []
+        for record in (move(1), move(2), click, move(3), move(4)):
+            coalesce_into(batch, record)
+        self.assertEqual(batch, [move(2), click, move(4)])
+
+
+if __name__ == "__main__":
+    unittest.main()
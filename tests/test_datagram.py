@@ -0,0 +1,209 @@
+"""Datagram video on loopback: reassembly, stale-message dropping, keyframe
+gating after loss, simulated packet loss and rate back-off.
+
+    python -m unittest tests.test_datagram
+"""
+import asyncio
+import random
+import time
+import unittest
+
+from dependencies import datagram
+from dependencies.datagram import (
+    DatagramServer, DatagramReceiver, PacketCipher, PACKET, PACKET_PAYLOAD, VIDEO_MAGIC,
+    INCOMPLETE_TIMEOUT, UDP_MIN_RATE, BURST,
+)
+from dependencies.metrics import pack_frame, unpack_frame
+
+KEY, DELTA = b"KEYFRAME", b"DT"   # anything not starting with DT is a keyframe
+
+
+def message(seq, kind, size=100):
+    return pack_frame(seq, time.time(), kind + bytes([seq % 256]) * size)
+
+
+class FakeControl:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, data):
+        self.sent.append(data)
+
+
+class Recorder:
+    """on_message/on_loss callbacks for a DatagramReceiver."""
+
+    def __init__(self):
+        self.messages = []
+        self.losses = 0
+
+    def on_message(self, data):
+        self.messages.append(data)
+
+    def on_loss(self):
+        self.losses += 1
+
+    @property
+    def seqs(self):
+        return [unpack_frame(m)[0] for m in self.messages]
+
+
+class Loopback(unittest.IsolatedAsyncioTestCase):
+    async def connect(self, loss=0.0):
+        loop = asyncio.get_running_loop()
+        self.server_transport, self.server = await loop.create_datagram_endpoint(
+            lambda: DatagramServer(loss), local_addr=("127.0.0.1", 0))
+        self.stream = self.server.open(FakeControl())
+        self.stream.rate = 1e12   # no pacing waits in tests
+        self.stream.max_rate = 1e12
+        self.got = Recorder()
+        self.receiver = DatagramReceiver(self.stream.token, self.stream.key,
+                                         self.got.on_message, self.got.on_loss)
+        self.receiver_transport, _ = await loop.create_datagram_endpoint(
+            lambda: self.receiver, remote_addr=("127.0.0.1", self.server.port))
+        self.receiver.hello()
+        await asyncio.wait_for(self.stream.ready.wait(), 2)
+
+    async def asyncTearDown(self):
+        self.receiver_transport.close()
+        self.server_transport.close()
+
+    async def settle(self):
+        """Let everything in flight arrive, and incomplete messages expire."""
+        await asyncio.sleep(INCOMPLETE_TIMEOUT * 2)
+        self.receiver.check()
+
+    async def test_messages_arrive_whole_and_in_order(self):
+        await self.connect()
+        sizes = [0, 10, PACKET_PAYLOAD, PACKET_PAYLOAD * 5 + 7, 100_000]
+        sent = [message(i + 1, KEY if i == 0 else DELTA, size) for i, size in enumerate(sizes)]
+        for data in sent:
+            await self.stream.send(data)
+        await self.settle()
+        self.assertEqual(self.got.messages, sent)
+        self.assertEqual((self.got.losses, self.receiver.lost), (0, 0))
+        self.assertEqual(self.receiver.received, len(sent))
+
+    async def test_sends_are_paced_in_bursts(self):
+        await self.connect()
+        burst = BURST * PACKET_PAYLOAD
+        self.stream.rate = burst / 0.05   # a burst every 50 ms
+        start = time.monotonic()
+        await self.stream.send(message(1, KEY, burst * 3 - 100))
+        await self.stream.send(message(2, DELTA, 10))
+        # Bursts two to four each waited for the one before
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+        await self.settle()
+        self.assertEqual(self.got.seqs, [1, 2])
+
+    async def test_text_goes_over_control(self):
+        await self.connect()
+        await self.stream.send('{"type": "region"}')
+        self.assertEqual(self.stream.control.sent, ['{"type": "region"}'])
+
+    async def test_simulated_loss_only_shows_keyframes_until_whole(self):
+        random.seed(1)
+        await self.connect(loss=0.05)
+        count = 200
+        for seq in range(1, count + 1):
+            kind = KEY if seq % 20 == 1 else DELTA
+            await self.stream.send(message(seq, kind, PACKET_PAYLOAD * 3))
+            await asyncio.sleep(0)
+        await self.settle()
+        self.assertGreater(self.receiver.lost, 0)
+        self.assertGreater(self.got.losses, 0)
+        self.assertLessEqual(self.receiver.received + self.receiver.lost, count)
+        # Every delivered delta follows the message right before it, so the
+        # picture is never built on a frame the viewer didn't get
+        previous = None
+        for seq in self.got.seqs:
+            if seq % 20 != 1:
+                self.assertEqual(seq, previous + 1)
+            previous = seq
+
+    async def test_hellos_from_elsewhere_need_the_key(self):
+        await self.connect()
+        addr = self.stream.addr
+        forged = DatagramReceiver(self.stream.token, b"\0" * 32, None, None)
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: forged, remote_addr=("127.0.0.1", self.server.port))
+        try:
+            forged._counter = 1000
+            forged.hello()
+            await asyncio.sleep(0.05)
+        finally:
+            transport.close()
+        self.assertEqual(self.stream.addr, addr)
+
+
+class Reassembly(unittest.TestCase):
+    """Drives DatagramReceiver directly with hand-made packets."""
+
+    def setUp(self):
+        self.key = b"k" * 32
+        self.cipher = PacketCipher(self.key)
+        self.got = Recorder()
+        self.receiver = DatagramReceiver(b"t" * 8, self.key, self.got.on_message, self.got.on_loss)
+
+    def packets(self, msg_id, data):
+        count = max(1, -(-len(data) // PACKET_PAYLOAD))
+        return [self.cipher.seal(PACKET.pack(VIDEO_MAGIC, msg_id, i, count),
+                                 data[i * PACKET_PAYLOAD:(i + 1) * PACKET_PAYLOAD])
+                for i in range(count)]
+
+    def feed(self, packets):
+        for p in packets:
+            self.receiver.datagram_received(p, None)
+
+    def test_out_of_order_and_duplicate_packets(self):
+        data = message(1, KEY, PACKET_PAYLOAD * 3)
+        packets = self.packets(1, data)
+        self.feed(packets[::-1] + packets)
+        self.assertEqual(self.got.messages, [data])
+
+    def test_stale_message_is_dropped_and_deltas_wait_for_a_keyframe(self):
+        key1, delta2, delta3, key4 = (message(1, KEY), message(2, DELTA, PACKET_PAYLOAD * 2),
+                                      message(3, DELTA), message(4, KEY))
+        self.feed(self.packets(1, key1))
+        self.feed(self.packets(2, delta2)[:1])   # second packet lost
+        self.feed(self.packets(3, delta3))       # completes first: 2 can't any more
+        self.assertEqual(self.receiver.lost, 1)
+        self.assertEqual(self.got.messages, [key1])   # 3 patches a picture we lack
+        self.assertGreaterEqual(self.got.losses, 2)
+        self.feed(self.packets(2, delta2)[1:])   # too late
+        self.feed(self.packets(4, key4))
+        self.assertEqual(self.got.messages, [key1, key4])
+
+    def test_incomplete_message_times_out(self):
+        self.feed(self.packets(1, message(1, KEY)))
+        self.feed(self.packets(2, message(2, DELTA, PACKET_PAYLOAD * 2))[:1])
+        self.receiver._partial[2][2] -= INCOMPLETE_TIMEOUT * 2
+        self.receiver.check()
+        self.assertEqual((self.receiver.lost, self.got.losses), (1, 1))
+        self.assertEqual(self.receiver._partial, {})
+
+    def test_tampered_packets_are_ignored(self):
+        packet = bytearray(self.packets(1, message(1, KEY))[0])
+        packet[PACKET.size] ^= 1
+        self.feed([bytes(packet)])
+        self.assertEqual((self.receiver.packets, self.got.messages), (0, []))
+
+
+class RateControl(unittest.TestCase):
+    def test_backs_off_on_loss_and_recovers(self):
+        stream = datagram.DatagramVideo(None, b"t" * 8, b"k" * 32, None)
+        full = stream.rate
+        stream.report(10, 90)
+        self.assertLess(stream.rate, full)
+        for n in range(1, 50):
+            stream.report(10 + n * 100, 90)   # heavy loss
+        self.assertEqual(stream.rate, UDP_MIN_RATE)
+        lost, received = stream._reported
+        for n in range(1, 200):
+            stream.report(lost, received + n * 100)
+        self.assertEqual(stream.rate, full)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Multiplexer over an in-memory websocket pair: chunking, priorities,
+inbound channels, size limits and closing.
+
+    python -m unittest tests.test_mux
+"""
+import asyncio
+import unittest
+
+import websockets
+
+from dependencies.mux import (
+    Multiplexer, CONTROL, CURSOR, VIDEO, TRANSFER, MUX_HEADER, FIN, TOO_BIG,
+)
+
+
+class FakeWebSocket:
+    """One end of an in-memory connection; `sent` keeps every message."""
+
+    def __init__(self):
+        self.peer = None
+        self.sent = []
+        self._inbox = asyncio.Queue()
+        self._closed = False
+
+    @staticmethod
+    def pair():
+        a, b = FakeWebSocket(), FakeWebSocket()
+        a.peer, b.peer = b, a
+        return a, b
+
+    async def send(self, data):
+        if self._closed:
+            raise websockets.ConnectionClosed(None, None)
+        self.sent.append(data)
+        self.peer._inbox.put_nowait(data)
+        await asyncio.sleep(0)
+
+    async def recv(self):
+        data = await self._inbox.get()
+        if data is None:
+            raise websockets.ConnectionClosed(None, None)
+        return data
+
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
+        for ws in (self, self.peer):
+            if not ws._closed:
+                ws._closed = True
+                ws._inbox.put_nowait(None)
+
+
+class MuxTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        a, b = FakeWebSocket.pair()
+        self.a, self.b = Multiplexer(a, chunk_size=100), Multiplexer(b, chunk_size=100)
+        self.a.start()
+        self.b.start()
+
+    async def asyncTearDown(self):
+        await self.a.close()
+        await self.b.close()
+
+    async def test_messages_arrive_whole_on_their_channel(self):
+        big = bytes(range(256)) * 10
+        await self.a.send(VIDEO, big)
+        await self.a.send(CONTROL, '{"type": "key"}')
+        await self.a.send(TRANSFER, b"")
+        self.assertEqual(await self.b.recv(VIDEO), big)
+        self.assertEqual(await self.b.recv(CONTROL), '{"type": "key"}')
+        self.assertEqual(await self.b.recv(TRANSFER), b"")
+        # Split into chunk_size pieces, FIN only on the last
+        video = [m for m in self.a.ws.sent if m[0] == VIDEO]
+        self.assertEqual(len(video), 26)
+        self.assertEqual([m[1] & FIN for m in video], [0] * 25 + [FIN])
+
+    async def test_higher_priority_channels_overtake_queued_video(self):
+        video = asyncio.create_task(self.a.send(VIDEO, b"v" * 5000))
+        await asyncio.sleep(0)   # let a few video chunks out
+        await asyncio.gather(self.a.send(CURSOR, b"pointer"), self.a.send(CONTROL, "click"))
+        await video
+        order = [MUX_HEADER.unpack_from(m, 0)[0] for m in self.a.ws.sent]
+        last_video = len(order) - 1 - order[::-1].index(VIDEO)
+        self.assertLess(order.index(CONTROL), order.index(CURSOR))
+        self.assertLess(order.index(CURSOR), last_video)
+
+    async def test_recv_after_close_raises_connection_closed(self):
+        await self.a.ws.close()
+        for _ in range(2):   # stays closed
+            with self.assertRaises(websockets.ConnectionClosed):
+                await self.b.recv(CONTROL)
+        with self.assertRaises(websockets.ConnectionClosed):
+            await self.b.send(CONTROL, "late")
+
+    async def test_send_sees_a_disconnect_while_its_chunk_is_written(self):
+        async def dropped(data):   # the reader hasn't noticed yet
+            raise websockets.ConnectionClosed(None, None)
+        self.a.ws.send = dropped
+        with self.assertRaises(websockets.ConnectionClosed):
+            await asyncio.wait_for(self.a.send(CONTROL, "click"), 1)
+
+    async def test_close_fails_sends_still_queued(self):
+        sending = asyncio.create_task(self.a.send(VIDEO, b"v" * 5000))
+        await asyncio.sleep(0)
+        await self.a.close()
+        with self.assertRaises(websockets.ConnectionClosed):
+            await asyncio.wait_for(sending, 1)
+
+    async def test_channels_not_read_here_are_dropped(self):
+        a, b = FakeWebSocket.pair()
+        sender, server = Multiplexer(a), Multiplexer(b, inbound=(CONTROL,))
+        sender.start()
+        server.start()
+        try:
+            await sender.send(VIDEO, b"unwanted")
+            await sender.send(CONTROL, "wanted")
+            self.assertEqual(await server.recv(CONTROL), "wanted")
+            self.assertNotIn(VIDEO, server._partial)
+            with self.assertRaises(ValueError):
+                await server.recv(VIDEO)
+        finally:
+            await sender.close()
+            await server.close()
+
+    async def test_oversized_message_closes_the_connection(self):
+        a, b = FakeWebSocket.pair()
+        sender, server = Multiplexer(a, chunk_size=100), Multiplexer(b, max_message=1000)
+        sender.start()
+        server.start()
+        try:
+            with self.assertRaises(websockets.ConnectionClosed):
+                await asyncio.wait_for(sender.send(VIDEO, b"x" * 5000), 1)
+            self.assertEqual(b.close_code, TOO_BIG)
+            with self.assertRaises(websockets.ConnectionClosed):
+                await server.recv(VIDEO)
+        finally:
+            await sender.close()
+            await server.close()
+
+    async def test_recv_after_reader_cancelled_raises_connection_closed(self):
+        self.b._reader.cancel()
+        with self.assertRaises(websockets.ConnectionClosed):
+            await self.b.recv(VIDEO)
+
+
+if __name__ == "__main__":
+    unittest.main()
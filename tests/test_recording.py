@@ -0,0 +1,126 @@
+"""Session recordings: writing, reopening, the index and seeking.
+
+    python -m unittest tests.test_recording
+"""
+import os
+import tempfile
+import unittest
+
+from dependencies.recording import (
+    Recorder, Recording, index_path, INDEX_ENTRY, VIDEO, CHECKPOINT, CONTROL, REGION,
+    CHECKPOINT_INTERVAL,
+)
+
+KEY, DELTA = b"KEYFRAME", b"DT"   # anything not starting with DT is a keyframe
+
+
+class RecordingTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "session.rec")
+        self.recorder = Recorder(self.path)
+        self.recordings = []
+
+    def tearDown(self):
+        self.recorder.close()
+        self.recorder.join()
+        for recording in self.recordings:
+            recording.close()
+        self.dir.cleanup()
+
+    def reopen(self):
+        self.recorder.close()
+        self.recorder.join()
+        recording = Recording(self.path)
+        self.recordings.append(recording)
+        return recording
+
+    def index_times(self):
+        with open(index_path(self.path), "rb") as f:
+            return [t for t, _ in INDEX_ENTRY.iter_unpack(f.read())]
+
+    def record_stream(self, start, seconds, fps=1):
+        """A delta stream from a keyframe, with checkpoints as the server
+        writes them. Kept under QUEUE_LIMIT records, so none are dropped
+        however slowly the writer thread gets going."""
+        for i in range(int(seconds * fps)):
+            t = start + i / fps
+            if i == 0:
+                self.recorder.video(t, KEY + b"%d" % i)
+                continue
+            self.recorder.video(t, DELTA + b"%d" % i)
+            if self.recorder.checkpoint_due(t):
+                self.recorder.checkpoint(t, lambda i=i: KEY + b"checkpoint %d" % i)
+
+    def test_session_reopens_with_its_records(self):
+        self.recorder.region(100.0, {"left": 0, "top": 0, "width": 8, "height": 8})
+        self.recorder.video(100.0, KEY)
+        self.recorder.control(100.5, {"type": "key", "key": "a", "action": "down"})
+        self.recorder.video(101.0, DELTA + b"1")
+        recording = self.reopen()
+        self.assertEqual((recording.start, recording.end), (100.0, 101.0))
+        records = [(kind, t, bytes(p) if kind == VIDEO else p)
+                   for kind, t, p in recording.records()]
+        self.assertEqual(records, [
+            (REGION, 100.0, {"left": 0, "top": 0, "width": 8, "height": 8}),
+            (VIDEO, 100.0, KEY),
+            (CONTROL, 100.5, {"type": "key", "key": "a", "action": "down"}),
+            (VIDEO, 101.0, DELTA + b"1"),
+        ])
+
+    def test_checkpoints_every_interval(self):
+        self.record_stream(0.0, CHECKPOINT_INTERVAL * 3 + 1)
+        recording = self.reopen()
+        self.assertEqual(self.index_times(), [0.0, CHECKPOINT_INTERVAL,
+                                              CHECKPOINT_INTERVAL * 2, CHECKPOINT_INTERVAL * 3])
+        # Normal playback skips the checkpoints
+        kinds = {kind for kind, _, _ in recording.records()}
+        self.assertEqual(kinds, {VIDEO})
+
+    def test_seek_starts_at_the_last_start_point_before(self):
+        self.record_stream(0.0, CHECKPOINT_INTERVAL * 2 + 1)
+        recording = self.reopen()
+        for t, start in [(-5.0, 0.0), (0.0, 0.0), (CHECKPOINT_INTERVAL - 0.1, 0.0),
+                         (CHECKPOINT_INTERVAL, CHECKPOINT_INTERVAL),
+                         (CHECKPOINT_INTERVAL * 2 + 0.5, CHECKPOINT_INTERVAL * 2),
+                         (1e9, CHECKPOINT_INTERVAL * 2)]:
+            records = recording.records(recording.seek(t))
+            kind, first, payload = next(records)
+            self.assertEqual(first, start, t)
+            self.assertFalse(bytes(payload).startswith(DELTA))
+            # From there on, deltas only, in order
+            times = [first] + [rt for _, rt, _ in records]
+            self.assertEqual(times, sorted(times))
+
+    def test_times_never_go_back(self):
+        # A viewer joins an idle pipeline late: its cached frame is older than
+        # the region notice sent just before it
+        self.recorder.region(102.0, {"left": 0, "top": 0, "width": 8, "height": 8})
+        self.recorder.video(100.0, KEY)
+        self.recorder.video(102.5, DELTA)
+        # Then switches to another idle pipeline, whose frame is older still
+        self.recorder.region(103.0, {"left": 8, "top": 0, "width": 8, "height": 8})
+        self.recorder.video(90.0, KEY)
+        self.recorder.video(104.0, DELTA)
+        self.recorder.checkpoint(95.0, lambda: KEY)
+        recording = self.reopen()
+        times = self.index_times()
+        self.assertEqual(times, sorted(times))
+        self.assertLessEqual(recording.start, recording.end)
+        times = [t for _, t, _ in recording.records()]
+        self.assertEqual(times, sorted(times))
+        kind, t, payload = next(recording.records(recording.seek(103.5)))
+        self.assertEqual((kind, t, bytes(payload)), (VIDEO, 103.0, KEY))
+
+    def test_checkpoint_that_fails_to_encode_is_left_out(self):
+        self.recorder.video(0.0, KEY)
+        self.recorder.video(1.0, DELTA)
+        self.recorder.checkpoint(1.0, lambda: 1 / 0)
+        self.recorder.video(2.0, DELTA)
+        recording = self.reopen()
+        self.assertEqual(self.index_times(), [0.0])
+        self.assertNotIn(CHECKPOINT, [kind for kind, _, _ in recording.records()])
+
+
+if __name__ == "__main__":
+    unittest.main()